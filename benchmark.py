@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+"""Rough benchmarks for the table classes.
+
+Run as a script to print timings, e.g.
+    python benchmark.py
+"""
+from __future__ import print_function
+import timeit
+
+import simpletable
+import simplecoltable
+
+
+def timed(func, repeat=3, number=1):
+    """returns the best time of calling func"""
+    return min(timeit.repeat(func, repeat=repeat, number=number))
+
+def report(label, seconds, baseline=None):
+    line = '%-50s %10.4fs' %(label, seconds)
+    if baseline:
+        line += '   (x%.1f)' %(baseline / seconds)
+    print(line)
+
+
+def bench_columnlookup(width=300, length=10):
+    """column access by name on a wide Table, compared to a linear scan of the headers"""
+    headers = ['col%d' %i for i in range(width)]
+    tab = simpletable.Table(([i]*width for i in range(length)), headers=headers)
+    
+    def scan():
+        for h in headers:
+            pos = tab.headers.index(h)
+            [row[pos] for row in tab]
+    def lookup():
+        for h in headers:
+            tab[h]
+    
+    print('column lookup on a %d column Table' %width)
+    base = timed(scan, number=100)
+    report('headers.index() per column', base)
+    report('Table[column] per column', timed(lookup, number=100), base)
+
+
+def bench_rowiteration(length=200000):
+    """full scans of a ColTable, compared to building an OrderedDict per row"""
+    tab = simplecoltable.ColTable([('a',list(range(length))),('b',[1.0]*length),('c',['x']*length)])
+    
+    def ordereddicts():
+        for i in range(len(tab)):
+            simplecoltable.OrderedDict((name,col[i]) for name,col in tab.cols.items())['b']
+    def rowviews():
+        for row in tab:
+            row['b']
+    def tuples():
+        for row in tab.itertuples():
+            row[1]
+    
+    print('scanning a %d row ColTable' %length)
+    base = timed(ordereddicts)
+    report('OrderedDict per row', base)
+    report('RowView per row', timed(rowviews), base)
+    report('itertuples()', timed(tuples), base)
+
+
+def bench_filter(length=500000):
+    """filtering a ColTable, compared to a row by row loop"""
+    cols = [('a',list(range(length))),('b',[float(i % 1000) for i in range(length)])]
+    tab = simplecoltable.ColTable(cols)
+    typed = simplecoltable.ColTable(cols, dtypes={'a':'l','b':'d'})
+    
+    def rowloop():
+        simplecoltable.ColTable(simplecoltable.rows2dict(tab.headers,[row.astuple() for row in tab if row['b'] > 500]))
+    
+    print('filtering a %d row ColTable' %length)
+    base = timed(rowloop)
+    report('row by row loop and rebuild', base)
+    report('filter() on list columns', timed(lambda: tab.filter('b','>',500.0)), base)
+    report('filter() on typed columns', timed(lambda: typed.filter('b','>',500.0)), base)
+
+
+def bench_join(sizes=(10**5, 10**6)):
+    """hash joins of tables with a unique key on the right, compared to a nested loop"""
+    def tables(length):
+        left = simplecoltable.ColTable([('key',[i % (length // 2) for i in range(length)]),('a',[1.0]*length)])
+        right = simplecoltable.ColTable([('key',list(range(length // 2))),('b',['x']*(length // 2))])
+        return left, right
+    
+    def nestedloop():
+        return [(l.astuple(),r.astuple()) for l in left for r in right if l['key'] == r['key']]
+    
+    length = 1000
+    left, right = tables(length)
+    print('joining tables')
+    base = timed(nestedloop, repeat=1)
+    report('nested loop, %d rows' %length, base)
+    report('join(), %d rows' %length, timed(lambda: left.join(right,'key')), base)
+    for length in sizes:
+        left, right = tables(length)
+        for how in ('inner','left'):
+            report('join(how=%r), %d rows' %(how,length), timed(lambda: left.join(right,'key',how=how), repeat=1))
+        report('Table construction + join(), %d rows' %length, timed(lambda: simpletable.Table(left.itertuples(),headers=left.headers).join(right,'key'), repeat=1))
+
+
+def bench_sort(length=300000):
+    """sorting by two columns, compared to sorting the rows and rebuilding the table"""
+    import random
+    import operator
+    rng = random.Random(0)
+    cols = [('a',[rng.randrange(100) for i in range(length)]),('b',[rng.random() for i in range(length)]),('c',['x']*length)]
+    tab = simplecoltable.ColTable(cols)
+    typed = simplecoltable.ColTable(cols, dtypes={'a':'l','b':'d'})
+    
+    def naive():
+        rows = sorted(tab.itertuples(), key=operator.itemgetter(0,1))
+        simplecoltable.ColTable(simplecoltable.rows2dict(tab.headers,rows))
+    def rowtable():
+        rows = simpletable.Table((list(r) for r in tab.itertuples()),headers=tab.headers)
+        return lambda: rows.sort_by('a','b')
+    
+    print('sorting a %d row table by two columns' %length)
+    base = timed(naive)
+    report('sorted(rows) and rebuild', base)
+    report('copy + ColTable.sort_by(), list columns', timed(lambda: tab[:].sort_by('a','b')), base)
+    report('copy + ColTable.sort_by(), typed columns', timed(lambda: typed[:].sort_by('a','b')), base)
+    report('Table.sort_by()', timed(rowtable(), repeat=1), base)
+
+
+def bench_extend(length=300000):
+    """adding many rows with extend(), compared to append() per row"""
+    rows = [(i, float(i), 'x') for i in range(length)]
+    headers = ['a','b','c']
+    
+    def appends(cls):
+        def run():
+            tab = cls(headers=headers) if cls is simpletable.Table else cls((h,[]) for h in headers)
+            for row in rows:
+                tab.append(row)
+        return run
+    def extend(cls):
+        def run():
+            tab = cls(headers=headers) if cls is simpletable.Table else cls((h,[]) for h in headers)
+            tab.extend(iter(rows))
+        return run
+    
+    print('adding %d rows' %length)
+    for cls in (simpletable.Table, simplecoltable.ColTable):
+        base = timed(appends(cls))
+        report('%s.append() per row' %cls.__name__, base)
+        report('%s.extend()' %cls.__name__, timed(extend(cls)), base)
+
+
+def bench_rows2cols(width=200, length=5000):
+    """transposing wide rows into columns, compared to the previous approach of
+    checking the widths and then making a pass over the rows for each column"""
+    class Counted(list):
+        """list which counts how many times it is iterated over"""
+        passes = 0
+        def __iter__(self):
+            Counted.passes += 1
+            return list.__iter__(self)
+    
+    def multipass(iterable):
+        widths = (len(row) for row in iterable)
+        width = next(widths)
+        if not all(w == width for w in widths): raise ValueError
+        return [[row[i] for row in iterable] for i in range(width)]
+    
+    rows = Counted([i]*width for i in range(length))
+    print('transposing %d rows of width %d' %(length, width))
+    for label,func in (('check then one pass per column',multipass),('rows2cols()',simplecoltable.rows2cols)):
+        Counted.passes = 0
+        func(rows)
+        passes = Counted.passes
+        seconds = timed(lambda: func(rows))
+        if func is multipass: base = seconds
+        report('%s (%d passes)' %(label,passes), seconds, None if func is multipass else base)
+
+
+def bench_paging(length=1000000, page=1000):
+    """paging through a ColTable in windows with slices (copies) and views"""
+    tab = simplecoltable.ColTable([('a',list(range(length))),('b',[1.0]*length),('c',['x']*length)])
+    starts = range(0, length, length // 100)
+    
+    def slices():
+        for i in starts: tab[i:i+page]
+    def views():
+        for i in starts: tab.view(slice(i,i+page))
+    def wholeslices():
+        tab[:]
+    def wholeviews():
+        tab.view()
+    
+    print('100 windows of %d rows from a %d row ColTable' %(page,length))
+    base = timed(slices)
+    report('slicing', base)
+    report('view()', timed(views), base)
+    base = timed(wholeslices)
+    report('slice of the whole table', base)
+    report('view() of the whole table', timed(wholeviews), base)
+
+
+def bench_conversion(length=300000):
+    """converting between Table and ColTable, compared to going through rows2dict()"""
+    headers = ['a','b','c','d']
+    tab = simpletable.Table(([i,float(i),'x',i % 7] for i in range(length)), headers=headers)
+    coltab = tab.to_coltable()
+    
+    def viarows2dict():
+        simplecoltable.ColTable(simplecoltable.rows2dict(tab.headers,tab))
+    def viazip():
+        simpletable.Table([list(row) for row in zip(*coltab.cols.values())], headers=coltab.headers)
+    def roundtrip():
+        tab.to_coltable().to_table()
+    
+    print('converting %d rows between Table and ColTable' %length)
+    base = timed(viarows2dict)
+    report('ColTable(rows2dict(...))', base)
+    report('Table.to_coltable()', timed(tab.to_coltable), base)
+    base = timed(viazip)
+    report('Table(list(row) for row in zip(*cols))', base)
+    report('ColTable.to_table()', timed(coltab.to_table), base)
+    report('round trip', timed(roundtrip))
+
+
+def bench_compact(length=300000):
+    """memory and column access of a Table with list rows and with compact tuple rows"""
+    headers = ['a','b','c','d','e']
+    def rows():
+        for i in range(length):
+            row = []
+            for v in (i, float(i), 'x', i % 7, None): row.append(v)
+            yield row
+    tab = simpletable.Table(rows(), headers=headers)
+    compact = simpletable.Table(rows(), headers=headers, compact=True)
+    
+    print('a %d row Table with list rows and compact rows' %length)
+    print('%-50s %10.1fMB' %('list rows memory_usage()', tab.memory_usage() / 1e6))
+    print('%-50s %10.1fMB' %('compact rows memory_usage()', compact.memory_usage() / 1e6))
+    base = timed(lambda: tab['b'])
+    report('Table[column] with list rows', base)
+    report('Table[column] with compact rows', timed(lambda: compact['b']), base)
+    values = list(range(length))
+    base = timed(lambda: tab.__setitem__('d', values))
+    report('column assignment with list rows', base)
+    report('column assignment with compact rows', timed(lambda: compact.__setitem__('d', values)), base)
+
+
+def bench_columnchanges(width=50, length=20000, changed=10):
+    """dropping and adding several columns of a Table one at a time and in a single pass"""
+    headers = ['c%d' %i for i in range(width)]
+    def table(compact=False):
+        return simpletable.Table(([i]*width for i in range(length)), headers=headers, compact=compact)
+    drop = headers[::width // changed][:changed]
+    new = dict(('n%d' %i, list(range(length))) for i in range(changed))
+    
+    print('changing %d of the columns of a %d column, %d row Table' %(changed, width, length))
+    tabs = [table() for i in range(3)]
+    base = timed(lambda: [tab.__delitem__(h) for tab in [tabs.pop()] for h in drop])
+    report('del Table[column] for each column', base)
+    tabs = [table() for i in range(3)]
+    report('Table.drop_columns()', timed(lambda: tabs.pop().drop_columns(drop)), base)
+    tabs = [table() for i in range(3)]
+    base = timed(lambda: [tab.__setitem__(k, v) for tab in [tabs.pop()] for k,v in new.items()])
+    report('Table[column] = values for each column', base)
+    tabs = [table() for i in range(3)]
+    report('Table.add_columns()', timed(lambda: tabs.pop().add_columns(new)), base)
+    tabs = [table(True) for i in range(3)]
+    base = timed(lambda: [tab.__delitem__(h) for tab in [tabs.pop()] for h in drop])
+    report('del Table[column] for each column, compact rows', base)
+    tabs = [table(True) for i in range(3)]
+    report('Table.drop_columns(), compact rows', timed(lambda: tabs.pop().drop_columns(drop)), base)
+
+
+def bench_blocks(width=10, length=300000, inserts=1000):
+    """inserting rows near the front of a ColTable with list and BlockList columns"""
+    headers = ['c%d' %i for i in range(width)]
+    def table(blocksize=None):
+        tab = simplecoltable.ColTable((h, list(range(length))) for h in headers)
+        if blocksize:
+            tab.setblocks(blocksize=blocksize)
+        return tab
+    row = [0]*width
+    def insert(tab):
+        for i in range(inserts):
+            tab.insert(i % 100, row)
+    
+    print('inserting %d rows near the front of a %d column, %d row ColTable' %(inserts, width, length))
+    tab = table()
+    base = timed(lambda: insert(tab), repeat=1)
+    report('ColTable.insert() with list columns', base)
+    tab = table(4096)
+    report('ColTable.insert() with BlockList columns', timed(lambda: insert(tab), repeat=1), base)
+    report('ColTable[i] with BlockList columns', timed(lambda: [tab[i]['c0'] for i in range(0, length, 100)], repeat=1))
+
+
+if __name__ == "__main__":
+    bench_columnlookup()
+    bench_rowiteration()
+    bench_filter()
+    bench_join()
+    bench_sort()
+    bench_extend()
+    bench_rows2cols()
+    bench_paging()
+    bench_conversion()
+    bench_compact()
+    bench_columnchanges()
+    bench_blocks()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+"""A column based table for data larger than memory. Rows are stored in
+ColTable chunks of a fixed number of rows which are saved to disk as they fill
+up and are only loaded when they are used.
+
+Copyright (C) 2016 Robert Steed
+"""
+from collections import OrderedDict
+import csv
+import itertools
+import os
+import shutil
+import tempfile
+import weakref
+
+import simplecsv
+from simplecoltable import ColTable, _extendcols, _take
+from simplecolumns import ReadOnlyColumn
+
+
+class ChunkedColTable(object):
+    """A table with the read interface of a ColTable (headers, len(), indexing by
+    row, slice or column, iteration and select()) whose rows are stored in chunks
+    of chunksize rows. Each full chunk is saved to its own sub-directory with
+    ColTable.save() and is reopened when it is needed, only the `resident` most
+    recently used chunks are kept open. The last chunk stays in memory until it
+    is full.
+
+    Rows can only be added to the table (append() and extend()), saved chunks are
+    never changed. Columns are returned as read-only ChunkedColumns which load
+    the chunks as they are accessed.
+    """
+    def __init__(self, headers, directory=None, chunksize=100000, resident=4, dtypes=None, mmap=True):
+        """
+        headers - column names
+        directory - where the chunks are saved, if None a temporary directory is
+                    used which is removed by close()
+        chunksize - number of rows in each chunk
+        resident - number of saved chunks kept open at once
+        dtypes - optional mapping of column names to array.array typecodes, these
+                 columns are stored as typed arrays
+        mmap - memory-map the saved chunks when they are opened, see ColTable.open()
+        """
+        if chunksize < 1: raise ValueError('chunksize must be at least 1')
+        self.title = 'unnamed'
+        self._headers = list(headers)
+        if len(set(self._headers)) != len(self._headers): raise ValueError('duplicate column names')
+        self._dtypes = dict(dtypes or {})
+        self.chunksize = chunksize
+        self.resident = resident
+        self.mmap = mmap
+        self._store = _ChunkStore(directory).acquire()
+        self._stores = [self._store] #holding the saved chunks, including those shared by select()
+        self.directory = self._store.directory
+        self._chunkdirs = [] #saved chunks
+        self._cache = OrderedDict() #chunk number: ColTable, least recently used first
+        self._tail = self._newchunk()
+
+    @classmethod
+    def from_csv(cls, path_or_file, columns=None, headers=None, directory=None, chunksize=100000, resident=4, mmap=True, **fmtparams):
+        """create a table from csv data in a single pass, holding at most one
+        chunk of rows in memory.
+
+        path_or_file - filename or open file object
+        columns - optional iterable of columns to keep, requested ordering is preserved
+        headers - column names, if not given then they are read from the first row
+        fmtparams - passed on to csv.reader
+        the other arguments are as for ChunkedColTable()"""
+        with simplecsv.csvsource(path_or_file) as csvfile:
+            reader = csv.reader(csvfile, **fmtparams)
+            if headers is None:
+                headers = next(reader, [])
+            headers = list(headers)
+            positions = simplecsv.positions(headers, columns)
+            tab = cls([headers[p] for p in positions],directory,chunksize,resident,None,mmap)
+            while True:
+                rows = list(itertools.islice(reader,tab.chunksize - len(tab._tail)))
+                if not rows: break
+                _extendcols(list(tab._tail.cols.values()),rows,len(headers),positions,len(rows))
+                tab._spill()
+        return tab
+
+    def _newchunk(self):
+        return ColTable([(h,[]) for h in self._headers],dtypes=dict((k,v) for k,v in self._dtypes.items() if k in self._headers))
+
+    def _spill(self):
+        """save the last chunk if it is full"""
+        if len(self._tail) < self.chunksize: return
+        path = os.path.join(self.directory,'chunk%d' %len(self._chunkdirs))
+        self._tail.save(path)
+        self._chunkdirs.append(path)
+        self._tail = self._newchunk()
+
+    def _chunk(self, n):
+        """returns chunk n as a ColTable, opening it if necessary"""
+        if n == len(self._chunkdirs):
+            return self._tail
+        try:
+            chunk = self._cache.pop(n)
+        except KeyError:
+            chunk = ColTable.open(self._chunkdirs[n],mmap=self.mmap)
+            if list(chunk.cols) != self._headers:
+                chunk = chunk.select(self._headers,view=True)
+            while len(self._cache) >= self.resident > 0:
+                self._cache.popitem(last=False)
+        if self.resident > 0:
+            self._cache[n] = chunk
+        return chunk
+
+    def chunks(self):
+        """iterate over the chunks as ColTables, a convenient way of processing the
+        table a chunk at a time"""
+        return (self._chunk(n) for n in range(len(self._chunkdirs) + 1) if n < len(self._chunkdirs) or len(self._tail))
+
+    @property
+    def headers(self):
+        return list(self._headers)
+
+    @property
+    def width(self):
+        return len(self._headers)
+
+    def __len__(self):
+        """number of rows in the dataset"""
+        return len(self._chunkdirs)*self.chunksize + len(self._tail)
+
+    def __repr__(self):
+        return '<ChunkedColTable(title = %r, rows = %d, chunks = %d, headers = %r)>' %(self.title,len(self),len(self._chunkdirs) + 1,self._headers)
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            length = len(self)
+            if key < 0: key += length
+            if not 0 <= key < length: raise IndexError('row index out of range')
+            n,i = divmod(key,self.chunksize)
+            return self._chunk(n)[i]
+        elif isinstance(key, slice): #return a ColTable of the rows
+            return self._rows(range(len(self))[key])
+        elif key in self._headers:
+            return ChunkedColumn(self,key)
+        else:
+            raise KeyError('column does not exist')
+
+    def _rows(self, positions, headers=None):
+        """returns a ColTable of the rows at positions, one chunk at a time"""
+        headers = self._headers if headers is None else headers
+        cols = OrderedDict((h,[]) for h in headers)
+        for n,group in itertools.groupby(positions,lambda pos: pos//self.chunksize):
+            chunk = self._chunk(n)
+            offset = n*self.chunksize
+            local = [pos - offset for pos in group]
+            for h in headers:
+                cols[h].extend(_take(chunk.cols[h],local))
+        tab = ColTable._fromcols(cols,self.title)
+        tab.settypes(dict((k,v) for k,v in self._dtypes.items() if k in cols))
+        return tab
+
+    def __iter__(self):
+        """iterate over the rows, as RowViews of each chunk"""
+        for chunk in self.chunks():
+            for row in chunk:
+                yield row
+
+    def itertuples(self, named=False, name='Row'):
+        """iterate over the rows as tuples, see ColTable.itertuples()"""
+        for chunk in self.chunks():
+            for row in chunk.itertuples(named,name):
+                yield row
+
+    def filter(self, column, op, value=None):
+        """returns a ColTable of the rows whose column satisfies op (see ColTable.mask()),
+        processed one chunk at a time"""
+        result = self._tail.select(self._headers)[0:0]
+        for chunk in self.chunks():
+            part = chunk.filter(column,op,value)
+            for h,col in result.cols.items():
+                col.extend(part.cols[h])
+        result.title = self.title
+        return result
+
+    def select(self, headers, directory=None):
+        """retrieve only selected columns from the dataset. Data is returned as another
+        ChunkedColTable which shares the saved chunks of this table (rows added to
+        this table afterwards are not included); they are kept until both tables
+        are closed.
+
+        headers - iterable of columns to return, requested ordering is preserved
+        directory - where the new table saves its chunks, see ChunkedColTable()"""
+        headers = list(headers)
+        for h in headers:
+            if h not in self._headers: raise KeyError('column does not exist')
+        tab = ChunkedColTable(headers,directory,self.chunksize,self.resident,self._dtypes,self.mmap)
+        tab.title = self.title
+        tab._chunkdirs = list(self._chunkdirs)
+        tab._stores.extend(store.acquire() for store in self._stores)
+        tab._tail = self._tail.select(headers)
+        return tab
+
+    def append(self, row):
+        """append a row to the table"""
+        self._tail.append(row)
+        self._spill()
+
+    def extend(self, rows):
+        """extend the table by appending rows from an iterable (which can be a generator)
+        of sequences or mappings, holding at most one chunk of rows in memory. If a
+        row is bad, the rows of its chunk are not added before the exception is raised."""
+        rows = iter(rows)
+        while True:
+            chunk = list(itertools.islice(rows,self.chunksize - len(self._tail)))
+            if not chunk: break
+            self._tail.extend(chunk,len(chunk))
+            self._spill()
+
+    def close(self):
+        """forget the saved chunks, the directory is removed if it was a temporary
+        directory created by this table (once any tables selected from this one are
+        closed too). Temporary directories are also removed when the tables using
+        them are garbage collected."""
+        self._cache.clear()
+        for store in self._stores:
+            store.release()
+        self._stores = []
+        self._chunkdirs = []
+        self._tail = self._newchunk()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _ChunkStore(object):
+    """The directory where a ChunkedColTable saves its chunks, held by the table and
+    by any tables selected from it. A temporary directory is removed once every
+    table holding it has released it (or been garbage collected)."""
+    def __init__(self, directory=None):
+        self.temporary = directory is None
+        self.directory = tempfile.mkdtemp(prefix='chunkedtable') if directory is None else directory
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self.holders = 0
+        self._remove = weakref.finalize(self,shutil.rmtree,self.directory,True) if self.temporary else None
+
+    def acquire(self):
+        self.holders += 1
+        return self
+
+    def release(self):
+        self.holders -= 1
+        if self.holders == 0 and self._remove is not None:
+            self._remove()
+
+
+class ChunkedColumn(ReadOnlyColumn):
+    """A read-only column of a ChunkedColTable, the chunks are loaded as they are
+    accessed. copy() returns the whole column as a list."""
+    __slots__ = ('table','name')
+
+    def __init__(self, table, name):
+        self.table = table
+        self.name = name
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, key):
+        if isinstance(key,slice):
+            return self.table._rows(range(len(self))[key],[self.name]).cols[self.name]
+        return self.table[key][self.name]
+
+    def __iter__(self):
+        for chunk in self.table.chunks():
+            for value in chunk.cols[self.name]:
+                yield value
+
+    def copy(self):
+        return list(self)
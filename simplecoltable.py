@@ -6,9 +6,35 @@ anything hashable that isn't an integer).
 Copyright (C) 2016 Robert Steed
 """
 #from ordereddict import OrderedDict
-from collections import OrderedDict
-from collections import Mapping #Hashable, Sequence, Iterable
+from collections import OrderedDict, namedtuple
+try:
+    from collections.abc import Mapping #Hashable, Sequence, Iterable
+except ImportError:
+    from collections import Mapping
+import array
+import concurrent.futures
+import contextlib
 import copy
+import csv
+import functools
+import itertools
+import json
+import mmap
+import operator
+import os
+import sys
+try:
+    import numpy
+except ImportError:
+    numpy = None
+try:
+    from multiprocessing import shared_memory
+except ImportError: #python < 3.8
+    shared_memory = None
+
+import simplecsv
+import simpleindex
+from simplecolumns import ReadOnlyColumn, ColumnView, MappedColumn, MappedStrings, CategoricalColumn, CompressedColumn, BlockList
 #import warnings
 
 #TO DO
@@ -29,21 +55,157 @@ class ColTable(object):
     shape but it is possible to mutate a column's data and corrupt the table.
     The method validate() checks that all columns have the same length.
 
+    Columns can be stored as typed arrays (array.array) rather than lists, see
+    the 'dtypes' keyword and the method settypes(). Each value then costs only
+    its raw size rather than a python object and the row methods continue to work.
+    
     Warning: ColTable does not coerce the data into lists although the methods
-    insert(), append() and pop() assume that all of the columns are lists.
-    Also assignment by integer index won't work if any of the columns have an
-    immutable datatype. Columns are not coerced so that the user can keep them
-    as tuples, numpy arrays ...
+    insert(), append() and pop() assume that all of the columns are lists or
+    array.arrays. Also assignment by integer index won't work if any of the
+    columns have an immutable datatype. Columns are not coerced so that the user
+    can keep them as tuples, numpy arrays ...
+    
+    Tables can share storage with another table using view() or select(view=True).
+    Their columns are read-only ColumnViews which are copied before they are
+    changed (copy-on-write).
+    
+    Columns can be indexed with create_index() so that lookup() finds rows
+    without scanning the table.
+    
+    Tables produced by the table's own methods (slices, selects, joins...) are
+    not validated again. Setting ColTable.debug = True validates every table
+    as it is created.
     """    
+    debug = False
+    
     def __init__(self, *args, **kwargs):
         """Takes the same input as a dict type but each value should be a
         sequence of the same length.
+        
+        dtypes - optional keyword, mapping of column names to array.array typecodes.
+                 These columns are stored as typed arrays. A typecode of 'category'
+                 stores the column as a CategoricalColumn.
+        copy - optional keyword, if False the table takes ownership of the given
+               columns rather than copying them (default True)
+        validate - optional keyword, if False the column lengths aren't checked
+                   (default True)
         """
         self.title = 'unnamed'
+        dtypes = kwargs.pop('dtypes',{})
+        copycols = kwargs.pop('copy',True)
+        check = kwargs.pop('validate',True)
         cols = OrderedDict(*args,**kwargs)
         # shallow copy each column's collection so that original dataset is not mutated so easily:
-        self.cols = OrderedDict((k,copy.copy(v)) for k,v in cols.items()) 
-        self.validate()
+        self.cols = OrderedDict((k,_typedcol(dtypes[k],v) if k in dtypes else copy.copy(v) if copycols else v) for k,v in cols.items())
+        self._indexes = {}
+        if check or self.debug:
+            self.validate()
+
+    @classmethod
+    def from_csv(cls, path_or_file, columns=None, chunksize=10000, headers=None, types=None, **fmtparams):
+        """create a table from csv data in a single pass. Rows are read in chunks
+        and transposed straight into the column lists so the rows are never all
+        held in memory at once.
+        
+        path_or_file - filename or open file object
+        columns - optional iterable of columns to keep, requested ordering is preserved
+        chunksize - number of rows read before they are added to the columns
+        headers - column names, if not given then they are read from the first row
+        types - optional mapping of column names to types (see astype()), each
+                chunk of these columns is converted as it is read. If 'infer' then
+                infer_types() is called on the loaded table (a second pass over
+                the columns, the types can't be known until all rows are read).
+        fmtparams - passed on to csv.reader"""
+        with simplecsv.csvsource(path_or_file) as csvfile:
+            reader = csv.reader(csvfile, **fmtparams)
+            if headers is None:
+                headers = next(reader, [])
+            headers = list(headers)
+            positions = simplecsv.positions(headers, columns)
+            totypes = [None]*len(positions) if types in (None,'infer') else [types.get(headers[p]) for p in positions]
+            cols = [_typedcol(t,()) if isinstance(t,str) else [] for t in totypes]
+            converters = [None if t in (None,'category') else functools.partial(_convertcol,totype=t) for t in totypes]
+            _extendcols(cols, reader, len(headers), positions, chunksize, converters=converters)
+        tab = cls._fromcols(OrderedDict((headers[p],col) for p,col in zip(positions,cols)))
+        if types == 'infer':
+            tab.infer_types()
+        return tab
+    
+    def save(self, directory, codec=None):
+        """save the table into directory (created if necessary) in a columnar format
+        that can be memory-mapped by open(). Each column is stored in its own file;
+        typed columns and columns of ints or floats as raw binary values, columns of
+        strings as utf-8 bytes plus an array of offsets and any other columns as json.
+        CompressedColumns are stored compressed, CategoricalColumns as their codes
+        with the categories (json scalars or tuples of them) in the file
+        header.json, which describes the columns.
+        
+        codec - if 'zlib' or 'lzma' then all the columns are stored compressed and
+                open() returns them as CompressedColumns, see compress()"""
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        columns = []
+        for i,(name,col) in enumerate(self.cols.items()):
+            if codec is not None and not isinstance(col,CompressedColumn):
+                col = CompressedColumn.compress(col,codec)
+            entry = _savecol(directory,'col%d' %i,col)
+            entry['name'] = name
+            columns.append(entry)
+        header = {'version':1, 'title':self.title, 'length':len(self), 'byteorder':sys.byteorder, 'columns':columns}
+        with _replacing(os.path.join(directory,'header.json'),'w') as f:
+            json.dump(header,f)
+    
+    @classmethod
+    def open(cls, directory, mmap=True):
+        """open a table saved by save().
+        
+        mmap - if True, the typed and string columns are memory-mapped read-only
+               (MappedColumn and MappedStrings) so that opening the table is near
+               instant and only the parts of the files which are used are read.
+               The columns are copied into memory if the table is changed. Columns
+               which were lists of ints or floats are always read into lists."""
+        with open(os.path.join(directory,'header.json')) as f:
+            header = json.load(f)
+        cols = OrderedDict()
+        for entry in header['columns']:
+            name = tuple(entry['name']) if isinstance(entry['name'],list) else entry['name']
+            cols[name] = _loadcol(directory,entry,header['byteorder'],mmap)
+        tab = cls._fromcols(cols,header['title'])
+        if len(tab) != header['length']: raise ValueError('saved table is not the expected length')
+        tab.validate()
+        return tab
+    
+    @classmethod
+    def _fromcols(cls, cols, title='unnamed'):
+        """create a table which takes ownership of cols (an OrderedDict of columns) 
+        without copying or validating them (unless ColTable.debug is set)."""
+        tab = cls.__new__(cls)
+        tab.title = title
+        tab.cols = cols
+        tab._indexes = {}
+        if cls.debug:
+            tab.validate()
+        return tab
+    
+    @property
+    def cols(self):
+        """OrderedDict of the columns"""
+        return self._cols
+    
+    @cols.setter
+    def cols(self, cols):
+        self._cols = cols
+        self._names = None
+    
+    def _colnames(self):
+        """returns the list of column names, which is cached for positional access.
+        Adding or deleting columns through the table updates it but changes made
+        directly to cols which keep its length (a column deleted then another
+        added) are not noticed."""
+        names = self._names
+        if names is None or len(names) != len(self._cols):
+            names = self._names = list(self._cols)
+        return names
     
     @property
     def headers(self):
@@ -56,12 +218,111 @@ class ColTable(object):
             self.cols = OrderedDict((k,[]) for k in newheaders)
         elif len(newheaders) != width: raise ValueError('new header is not the correct length for dataset')
         else:
+            names = list(self.cols)
+            self._indexes = dict((newheaders[names.index(k)],index) for k,index in self._indexes.items())
             self.cols = OrderedDict((k,v) for k,v in zip(newheaders,self.cols.values()))
     
     @property
     def width(self):
         return len(self.cols)
     
+    @property
+    def dtypes(self):
+        """OrderedDict of the array typecode of each column (None for untyped columns)"""
+        return OrderedDict((k,getattr(v,'typecode',None)) for k,v in self.cols.items())
+    
+    def settypes(self, dtypes, executor=None):
+        """change the storage of columns.
+        
+        dtypes - mapping of column names to array.array typecodes (or 'category'
+                 for a CategoricalColumn), a typecode of None converts the column
+                 back into a list.
+        executor - optional concurrent.futures executor which converts the columns
+                   in parallel, see map_columns()"""
+        if executor is None:
+            for key,typecode in dtypes.items():
+                self.cols[key] = _typedcol(typecode,self.cols[key])
+        else:
+            futures = [(key,_submit(executor,functools.partial(_typedcol,typecode),self.cols[key])) for key,typecode in dtypes.items()]
+            for key,future in futures:
+                self.cols[key] = future.result()
+    
+    def compress(self, columns=None, codec='zlib', encoding=None):
+        """replace columns by CompressedColumns which are decompressed (and cached)
+        when they are next used, see simplecolumns.CompressedColumn. Compressed
+        columns are replaced by decompressed copies if the table is changed.
+        
+        columns - iterable of the columns to compress (default all)
+        codec - 'zlib', 'lzma' or None (only encode the values)
+        encoding - None, 'rle' (run-length encoding, for columns with runs of
+                   repeated values) or 'delta' (for sorted integer columns)"""
+        for key in list(self.cols) if columns is None else columns:
+            col = self.cols[key]
+            if not isinstance(col,CompressedColumn):
+                self.cols[key] = CompressedColumn.compress(col,codec,encoding)
+    
+    def setblocks(self, columns=None, blocksize=4096):
+        """store columns as BlockLists (see simplecolumns.BlockList), keeping their
+        typecodes, so that inserting and deleting rows in the middle of the table
+        doesn't move the rest of each column. A blocksize around the square root
+        of the number of rows is best.
+        
+        columns - iterable of the columns to convert (default all)"""
+        self._own()
+        for key in list(self.cols) if columns is None else columns:
+            col = self.cols[key]
+            typecode = getattr(col,'typecode',None)
+            if typecode is not None and (len(typecode) != 1 or typecode not in array.typecodes):
+                raise ValueError('column %s can not be stored as a BlockList' %str(key))
+            self.cols[key] = BlockList(col,typecode,blocksize)
+    
+    def astype(self, types):
+        """convert the values of columns.
+        
+        types - mapping of column names to bool, int, float or str, giving a list
+                in which missing values (None or empty strings) become None, to
+                an array.array typecode, giving a typed array, or to 'category',
+                giving a CategoricalColumn.
+        Raises ValueError if a value can't be converted, the column is then unchanged."""
+        for key,totype in types.items():
+            self[key] = _convertcol(self.cols[key],totype)
+    
+    def infer_types(self, sample=1000, typed=False):
+        """convert columns of strings (such as read from csv files) to the narrowest of
+        bool, int and float that their values can be converted to, a column which
+        doesn't fit any of these is left alone. The type is guessed from a sample
+        of the values and the whole column is converted at once. Returns an
+        OrderedDict of the converted columns and their new types.
+        
+        sample - number of values in each column used to guess its type
+        typed - store int and float columns without missing values as typed arrays
+                ('q' and 'd') rather than lists"""
+        converted = OrderedDict()
+        for key in list(self.cols):
+            totype, col = _infercol(self.cols[key],sample,typed)
+            if totype is not None:
+                self[key] = col
+                converted[key] = totype
+        return converted
+    
+    def map_columns(self, func, columns=None, executor=None):
+        """call func(column) for each column, returning an OrderedDict of the results
+        (which can be passed to ColTable() if they are columns).
+        
+        columns - iterable of the columns to process (default all)
+        executor - optional concurrent.futures executor (ThreadPoolExecutor or
+                   ProcessPoolExecutor) which processes the columns in parallel.
+                   A process pool is sent array.array columns through shared
+                   memory rather than pickling them, func must be picklable.
+        
+        func is given array.array columns as read-only MappedColumns of their
+        values (with or without an executor), its result must not keep them."""
+        columns = list(self.cols) if columns is None else list(columns)
+        if executor is None:
+            return OrderedDict((key,_readonlycall(func,self.cols[key])) for key in columns)
+        futures = [_submit(executor,func,self.cols[key]) for key in columns]
+        return OrderedDict((key,future.result()) for key,future in zip(columns,futures))
+    
     def __repr__(self):
         #return 'ColTable(%r)' %(self.cols)
         contents = ', '.join('(%r, %r)' %(k,v) for k,v in self.cols.items())
@@ -89,9 +350,12 @@ class ColTable(object):
 
     def __getitem__(self, key):
         if isinstance(key, int): 
-            return OrderedDict((name,col[key]) for name,col in self.cols.items())
+            length = len(self)
+            if key < 0: key += length
+            if not 0 <= key < length: raise IndexError('row index out of range')
+            return RowView(self,key)
         elif isinstance(key, slice): #return another instance of class
-            return ColTable((name,col[key]) for name,col in self.cols.items())
+            return self._fromcols(OrderedDict((name,_slicecol(col,key)) for name,col in self.cols.items()))
         else:
             try:
                 return self.cols[key]
@@ -100,26 +364,41 @@ class ColTable(object):
     
     def __setitem__(self, key, value):
         if isinstance(key, int):
+            self._own()
             if isinstance(value,Mapping):
-                for name,col in self.cols.items():
-                    col[key] = value[name]
+                value = [value[name] for name in self.cols]
             else: #not a mappable so try sequence-type code.
                 #value = list(value) #handles case where value is an generator
                 if len(value) != len(self.cols): raise ValueError('row update does not have enough columns')
+            old = [col[key] for col in self.cols.values()]
+            pos = key + len(self) if key < 0 else key
+            if self._indexes: self._indexcheck(value,pos)
+            try:
                 for col,v in zip(self.cols.values(),value):
                     col[key] = v  
+            except (TypeError, OverflowError): #typed columns can reject a value, restore the row
+                for col,v in zip(self.cols.values(),old):
+                    col[key] = v
+                raise
+            if self._indexes:
+                self._indexremove(old,pos)
+                self._indexadd(value,pos)
         elif isinstance(key, slice): #value might be an iterable in this case
             #value = list(value) #handles case where value is an generator
+            self._own()
             if isinstance(value[0],Mapping):
                 for (name,col) in self.cols.items():
-                    col[key] = (row[name] for row in value)               
+                    col[key] = _likecol(col,(row[name] for row in value))
             else: #not a mappable so try sequence-type code.
                 width = len(self.cols)
                 if not all(len(row) == width for row in value): raise ValueError('(some of) rows update do not have correct number of columns')
                 for i,(name,col) in enumerate(self.cols.items()):
-                    col[key] = (row[i] for row in value)
+                    col[key] = _likecol(col,(row[i] for row in value))
+            self._indexstale()
         else:
             if len(value) != len(self): raise ValueError('column update does not have enough columns')
+            if key in self._indexes:
+                self._indexes[key].build(value)
             self.cols[key] = value
             #self.validate()
     
@@ -129,19 +408,33 @@ class ColTable(object):
                 del self.cols[key]
             except ValueError:
                 raise KeyError('column does not exist')
+            self._names = None
+            self._indexes.pop(key,None)
+        elif self._indexes and isinstance(key, int):
+            self.pop(key)
         else:
+            self._own()
             for h,col in self.cols.items():
                 del col[key]
                 self.cols[h] = col
+            self._indexstale()
     
     def __iter__(self):
         """iterate over the rows rather than the columns (can always access the cols
-        attribute directly)."""
-        #return (dict((name,col[i]) for name,col in self.cols.items())  for i in range(len(self)))
-        #return (tuple(col[i] for col in self.cols.values())  for i in range(len(self)))
-        #namedtuple? 
-        #return (list(col[i] for col in self.cols.values())  for i in range(len(self)))
-        return (OrderedDict((name,col[i]) for name,col in self.cols.items())  for i in range(len(self)))
+        attribute directly). Rows are returned as RowViews, see itertuples() for
+        a faster way of scanning the whole table."""
+        return (RowView(self,i) for i in range(len(self)))
+    
+    def itertuples(self, named=False, name='Row'):
+        """iterate over the rows as tuples, built directly from the columns.
+        
+        named - return namedtuples instead of plain tuples. Column names which
+                aren't valid identifiers are replaced by positional names.
+        name - typename of the namedtuples"""
+        rows = zip(*self.cols.values())
+        if named:
+            return map(namedtuple(name,self.cols,rename=True)._make, rows)
+        return rows
         
     def __len__(self):
         """number of rows in the dataset"""
@@ -161,12 +454,129 @@ class ColTable(object):
     def __ne__(self,other):
         return not self.__eq__(other)
     
-    def select(self,headers):
+    def mask(self, column, op, value=None):
+        """evaluate a comparison over a whole column, returning a sequence of booleans
+        (a numpy array if the column is typed and numpy is available)
+        
+        column - name of the column
+        op - one of '<', '<=', '==', '!=', '>', '>=' or a function taking a single
+             value and returning True/False (value is then ignored)
+        value - right hand side of the comparison"""
+        col = self.cols[column]
+        if not callable(op):
+            try:
+                op = _comparisons[op]
+            except KeyError:
+                raise ValueError('unknown comparison %r' %(op,))
+            if isinstance(col,CategoricalColumn): #compare each category once
+                return _categorymask(col,[op(c,value) for c in col.categories])
+        elif isinstance(col,CategoricalColumn):
+            return _categorymask(col,list(map(op,col.categories)))
+        else:
+            return list(map(op,col))
+        arr = _asnumpy(col)
+        if arr is not None:
+            return op(arr,value)
+        return list(map(op,col,itertools.repeat(value,len(col))))
+    
+    def where(self, mask):
+        """retrieve the rows where mask is True as another ColTable. Each column
+        is gathered in a single operation.
+        
+        mask - sequence of booleans, one for each row (see mask())"""
+        if len(mask) != len(self): raise ValueError('mask is not the same length as the dataset')
+        if numpy is not None and any(_asnumpy(col) is not None for col in self.cols.values() if not isinstance(col,BlockList)):
+            npmask = numpy.asarray(mask,dtype=bool)
+        cols = OrderedDict()
+        for name,col in self.cols.items():
+            arr = None if isinstance(col,(CategoricalColumn,BlockList)) else _asnumpy(col)
+            if isinstance(col,(CategoricalColumn,BlockList)):
+                cols[name] = col.compress(mask)
+            elif arr is None:
+                cols[name] = _likecol(col,itertools.compress(col,mask))
+            elif getattr(col,'typecode',None):
+                cols[name] = array.array(col.typecode,arr[npmask].tobytes())
+            else:
+                cols[name] = col[npmask]
+        return self._fromcols(cols,self.title)
+    
+    def filter(self, column, op, value=None):
+        """retrieve the rows where the comparison (see mask()) is True as another ColTable"""
+        return self.where(self.mask(column,op,value))
+    
+    def join(self, other, on, how='inner', suffix='_right'):
+        """join with another table (ColTable or Table) on key column(s) using a hash
+        join. Returns a new ColTable of the columns of this table followed by
+        the columns of other (except the key columns).
+        
+        on - column name or list of column names present in both tables
+        how - 'inner', 'left' (keep all rows of this table) or 'outer' (keep all
+              rows of both tables). Missing values are filled with None.
+        suffix - appended to the names of other's columns which clash with this table's
+        
+        Rows come in the order of this table (each with its matches in the order
+        of other), an outer join then adds the unmatched rows of other in order.
+        The hash table is built on the smaller table."""
+        return _join(self,other,on,how,suffix)
+    
+    def sort_by(self, *columns, **kwargs):
+        """stable sort of the rows *IN PLACE* by one or more columns. A single
+        permutation is computed from the key columns and then each column is
+        gathered once.
+        
+        reverse - keyword, True/False for all columns or a sequence with an entry
+                  for each column"""
+        directions = _directions(columns,kwargs.pop('reverse',False))
+        if not columns: return #nothing to sort by, as for Table
+        perm = _argsort([self.cols[c] for c in columns],directions)
+        self.cols = OrderedDict((name,_take(col,perm)) for name,col in self.cols.items())
+        self._indexstale()
+    
+    def groupby(self, keys):
+        """group the rows by the values of key column(s) for aggregation, see GroupBy
+        
+        keys - column name or list of column names"""
+        return GroupBy(self,keys)
+    
+    def to_table(self):
+        """returns the data as a simpletable.Table, each row is built once straight
+        from the columns"""
+        import simpletable
+        return simpletable.Table(map(list,zip(*self.cols.values())),headers=list(self.cols),title=self.title,validate=False)
+    
+    def select(self,headers,view=False):
         """retrieve only selected columns from the dataset. Data is returned as another
         ColTable class.
         
-        headers - iterable of columns to return, requested ordering is preserved"""
-        return ColTable((key,self.col[key]) for key in headers)        
+        headers - iterable of columns to return, requested ordering is preserved
+        view - share the columns' storage rather than copying them, see view()"""
+        if view:
+            return self.view(headers=headers)
+        return self._fromcols(OrderedDict((key,_copycol(self.cols[key])) for key in headers))
+    
+    def view(self,rows=slice(None),headers=None):
+        """returns a ColTable which shares this table's storage, costing O(width)
+        rather than O(rows*width). The view's columns are read-only ColumnViews
+        which are copied when the view is changed, but the view reflects changes
+        made to this table.
+        
+        rows - slice of the rows to view (default all)
+        headers - iterable of columns to view (default all), ordering is preserved"""
+        rows = range(len(self))[rows]
+        headers = list(self.cols) if headers is None else headers
+        return self._fromcols(OrderedDict((key,ColumnView(self.cols[key],rows)) for key in headers),self.title)
+    
+    def _own(self):
+        """replaces read-only columns (such as views) with mutable copies, called
+        before the table's columns are changed."""
+        for name,col in self.cols.items():
+            if type(col) not in _mutabletypes and isinstance(col,ReadOnlyColumn):
+                break
+        else:
+            return
+        for name,col in list(self.cols.items()):
+            if isinstance(col,ReadOnlyColumn):
+                self.cols[name] = col.copy()
         
     def insertcol(self,index,key,value):
         """inserted a column of data before index"""
@@ -177,72 +587,910 @@ class ColTable(object):
         newdict = OrderedDict((h,self[h]) for h in headers)
         self.cols = newdict #replace current cols OrderedDict with new one.
     
+    def drop_columns(self, keys):
+        """delete several columns"""
+        keys = list(keys)
+        for key in keys:
+            if key not in self.cols: raise KeyError('column does not exist')
+        for key in keys:
+            del self[key]
+    
+    def reorder_columns(self, keys):
+        """rearrange the columns into the order of keys (which must name each
+        column once)"""
+        keys = list(keys)
+        if len(keys) != len(self.cols) or set(keys) != set(self.cols):
+            raise ValueError('new column order must contain each column exactly once')
+        self.cols = OrderedDict((k,self.cols[k]) for k in keys)
+    
+    def add_columns(self, columns):
+        """add several columns, see Table.add_columns()"""
+        columns = OrderedDict(columns)
+        for key,value in columns.items():
+            if len(value) != len(self): raise ValueError('column update does not have enough columns')
+        indexes = dict((key,type(self._indexes[key])(value,self._indexes[key].unique))
+                       for key,value in columns.items() if key in self._indexes)
+        for key,value in columns.items():
+            self.cols[key] = value
+        self._indexes.update(indexes)
+    
     def insert(self, index, row):
         """insert row before index"""
         if isinstance(row,Mapping):
-            for key,col in self.cols.items():
-                #Add code here to handle row types other than list
-                col.insert(index,row[key])
-                #self.cols[key] = col 
+            row = [row[key] for key in self.cols]
         else: #not a mappable so try sequence-type code.
             #row = list(row) #handles case where value is an generator
             if len(row) != len(self.cols): raise ValueError('appended row does not have correct number of columns')
-            for (key,col),v in zip(self.cols.items(),row):
-                #Add code here to handle row types other than list
+        length = len(self)
+        if self._indexes: self._indexcheck(row)
+        self._own()
+        done = []
+        try:
+            for col,v in zip(self.cols.values(),row):
                 col.insert(index,v)
-                #self.cols[key] = col
+                done.append(col)
+        except (TypeError, OverflowError): #typed columns can reject a value, remove the partial row
+            pos = min(max(index + length if index < 0 else index, 0), length)
+            for col in done:
+                del col[pos]
+            raise
+        if self._indexes:
+            self._indexinsert(row,min(max(index + length if index < 0 else index, 0), length))
             
     def append(self, row):
         """append a row to the table"""
         if isinstance(row,Mapping):
-            for key,col in self.cols.items():
-                #Add code here to handle row types other than list
-                col.append(row[key])
-                #self.cols[key] = col 
+            row = [row[key] for key in self.cols]
         else: #not a mappable so try sequence-type code.
             #row = list(row) #handles case where value is an generator
             if len(row) != len(self.cols): raise ValueError('appended row does not have correct number of columns')
-            for (key,col),v in zip(self.cols.items(),row):
-                #Add code here to handle row types other than list
+        if self._indexes: self._indexcheck(row)
+        self._own()
+        done = []
+        try:
+            for col,v in zip(self.cols.values(),row):
                 col.append(v)
-                #self.cols[key] = col
+                done.append(col)
+        except (TypeError, OverflowError): #typed columns can reject a value, remove the partial row
+            for col in done:
+                del col[-1]
+            raise
+        if self._indexes: self._indexadd(row,len(self)-1)
                 
     def pop(self,index=-1):
         """remove and return row at index (default last).
         Raises IndexError if table is empty or index is out of range."""
-        return OrderedDict((name,col.pop(index)) for name,col in self.cols.items())
-
-"""    
-    def extend(self, iterable):
-        ""extend table by appending rows from the iterable""
-        widths = (len(row) for row in iterable) #using up iterable!!!
-        width = next(widths)
-        if not all(w == width for w in widths): raise ValueError('not all rows have the same number of columns') 
-        if width != len(self.cols): raise ValueError('row insert does not have enough columns')
-        if isinstance(iterable,Mappable):
-            for key,col in self.cols.items():
-                #Add code here to handle row types other than list
-                col.extend(row[key] for row in iterable)
-                #self.cols[key] = col            
-        else:            
-            for i,(key,col) in enumerate(self.cols.items()):
-                #Add code here to handle row types other than list
-                col.extend([row[i] for row in iterable])
-                #self.cols[key] = col
-"""
+        self._own()
+        row = OrderedDict((name,col.pop(index)) for name,col in self.cols.items())
+        if self._indexes:
+            self._indexdelete(list(row.values()),index + len(self) + 1 if index < 0 else index)
+        return row
+    
+    def extend(self, rows, chunksize=10000):
+        """extend the table by appending rows from an iterable (which can be a generator)
+        of sequences or mappings. The rows are checked and added to the columns in
+        chunks, one extend() per column per chunk. If a row is bad, the rows already
+        added are removed before the exception is raised.
+        
+        chunksize - number of rows held in memory at once"""
+        self._own()
+        length = len(self)
+        names = list(self.cols)
+        cols = list(self.cols.values())
+        for column in self._indexes:
+            if self._indexes[column].unique: self._freshindex(column)
+        try:
+            _extendcols(cols,rows,len(cols),range(len(cols)),chunksize,names)
+            for pos in range(length,len(self)) if self._indexes else ():
+                self._indexadd([col[pos] for col in cols],pos)
+        except Exception:
+            for col in cols:
+                del col[length:]
+            self._indexstale()
+            raise
+    
+    def create_index(self,column,unique=False,kind='hash'):
+        """build an index of column so that lookup() and between() don't need to
+        scan the table. The index is kept up to date as the table changes.
+        
+        unique - raises ValueError if the column holds (or is given) duplicate values
+        kind - 'hash' for a dictionary based index or 'sorted' for an index which
+               also supports range queries with between()"""
+        try:
+            indextype = simpleindex.kinds[kind]
+        except KeyError:
+            raise ValueError('unknown kind of index %r' %(kind,))
+        self._indexes[column] = indextype(self.cols[column],unique)
+    
+    def drop_index(self,column):
+        """remove the index of column"""
+        del self._indexes[column]
+    
+    def lookup(self,column,value):
+        """returns a list of the rows (as RowViews) where column equals value. Uses
+        the column's index if it has one, otherwise the column is scanned."""
+        if column in self._indexes:
+            positions = self._freshindex(column).positions(value)
+        else:
+            positions = [i for i,v in enumerate(self.cols[column]) if v == value]
+        return [RowView(self,i) for i in positions]
+    
+    def between(self,column,lo=None,hi=None,inclusive=(True,True)):
+        """returns a list of the rows (as RowViews) where lo <= column <= hi, ordered by the
+        column's value. A bound of None is unlimited so, for instance, column < x
+        is between(column,hi=x,inclusive=(True,False)). Uses the column's index if
+        it is a sorted index, otherwise the column is scanned and sorted.
+        
+        inclusive - whether the rows equal to lo and hi respectively are included"""
+        index = self._indexes.get(column)
+        if isinstance(index,simpleindex.SortedIndex):
+            positions = self._freshindex(column).between(lo,hi,inclusive)
+        else:
+            col = self.cols[column]
+            positions = simpleindex.SortedIndex(col).between(lo,hi,inclusive)
+        return [RowView(self,i) for i in positions]
+    
+    def _freshindex(self,column):
+        """returns the index of column, rebuilding it if it is stale"""
+        index = self._indexes[column]
+        if index.stale:
+            index.build(self.cols[column])
+        return index
+    
+    def _indexed(self,row):
+        """returns (column, index, value) for each index given a sequence row"""
+        names = list(self.cols)
+        return [(column,index,row[names.index(column)]) for column,index in self._indexes.items()]
+    
+    def _indexcheck(self,row,pos=None):
+        """checks that row can be stored at pos without breaking a unique index"""
+        for column,index,value in self._indexed(row):
+            if index.unique:
+                self._freshindex(column).check(value,pos)
+    
+    def _indexadd(self,row,pos):
+        for column,index,value in self._indexed(row):
+            if not index.stale:
+                index.add(value,pos)
+    
+    def _indexremove(self,row,pos):
+        for column,index,value in self._indexed(row):
+            if not index.stale:
+                index.discard(value,pos)
+    
+    def _indexinsert(self,row,pos):
+        """records row inserted at pos, moving the positions of the later rows"""
+        if pos == len(self) - 1:
+            self._indexadd(row,pos)
+            return
+        for column,index,value in self._indexed(row):
+            if not index.stale:
+                index.insert(value,pos)
+    
+    def _indexdelete(self,row,pos):
+        """forgets row deleted from pos, moving the positions of the later rows"""
+        if pos == len(self):
+            self._indexremove(row,pos)
+            return
+        for column,index,value in self._indexed(row):
+            if not index.stale:
+                index.remove(value,pos)
+    
+    def _indexstale(self):
+        """marks all indexes for rebuilding, used when many row positions change"""
+        for index in self._indexes.values():
+            index.stale = True
+
+
+
+class RowView(Mapping):
+    """A lightweight read-only view of a single row of a ColTable.
+    
+    The view only stores the table and the row index, values are looked up in
+    the columns when requested. It acts as a mapping of column names to values
+    (iteration gives the column names like a dict) and integer indices access
+    the values by position. Since it is a view, it reflects later changes
+    to the table; use asdict() or astuple() to take a copy of the row.
+    """
+    __slots__ = ('_table','_index')
+    
+    def __init__(self, table, index):
+        self._table = table
+        self._index = index
+    
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            try:
+                name = self._table._colnames()[key]
+            except IndexError:
+                raise IndexError('column position out of range')
+            return self._table._cols[name][self._index]
+        return self._table._cols[key][self._index]
+    
+    def __contains__(self, key):
+        return key in self._table.cols
+    
+    def __iter__(self):
+        return iter(self._table.cols)
+    
+    def __len__(self):
+        return len(self._table.cols)
+    
+    def __repr__(self):
+        return 'RowView(%r)' %(list(self.items()),)
+    
+    def astuple(self):
+        """returns the row's values as a tuple"""
+        i = self._index
+        return tuple(col[i] for col in self._table.cols.values())
+    
+    def asdict(self):
+        """returns the row as an OrderedDict"""
+        i = self._index
+        return OrderedDict((name,col[i]) for name,col in self._table.cols.items())
+
+_comparisons = {'<':operator.lt, '<=':operator.le, '==':operator.eq,
+                '!=':operator.ne, '>':operator.gt, '>=':operator.ge}
+
+def _asnumpy(col):
+    """returns a numpy array sharing the data of col (or None if numpy is not
+    available or col is not a numpy array or array.array). An array.array can't
+    be resized while the numpy array exists so it shouldn't be kept."""
+    if numpy is None:
+        return None
+    if isinstance(col,numpy.ndarray):
+        return col
+    if isinstance(col,array.array) and col.typecode != 'u':
+        return numpy.frombuffer(col,dtype=col.typecode) if len(col) else numpy.array([],dtype=col.typecode)
+    if isinstance(col,ColumnView):
+        arr = _asnumpy(col.base)
+        return None if arr is None else arr[col.slice]
+    if isinstance(col,MappedColumn):
+        return numpy.asarray(col.buffer)
+    if isinstance(col,(CompressedColumn,BlockList)) and col.typecode is not None:
+        return _asnumpy(col.values())
+    return None
+
+class GroupBy(object):
+    """The rows of a table (ColTable or Table) grouped by the values of key column(s).
+    
+    The key columns are hashed once on construction, giving each row the number
+    of its group. agg() then computes each aggregation in a single pass over its
+    column without creating tables for the groups. Groups are ordered by their
+    first appearance in the table.
+    """
+    def __init__(self, table, keys):
+        self.table = table
+        self.keys = keys if isinstance(keys,list) else [keys]
+        keycols = [_columnof(table,k) for k in self.keys]
+        #categorical columns are grouped by their codes
+        encoded = [col.codes if isinstance(col,CategoricalColumn) else col for col in keycols]
+        groups = {}
+        keyvalues = encoded[0] if len(encoded) == 1 else zip(*encoded)
+        self.groupids = [groups.setdefault(k,len(groups)) for k in keyvalues]
+        self.groups = list(groups)
+        decoders = [col.categories.__getitem__ if isinstance(col,CategoricalColumn) else None for col in keycols]
+        if len(decoders) == 1 and decoders[0]:
+            self.groups = list(map(decoders[0],self.groups))
+        elif any(decoders):
+            self.groups = [tuple(v if d is None else d(v) for d,v in zip(decoders,k)) for k in self.groups]
+    
+    def __len__(self):
+        """number of groups"""
+        return len(self.groups)
+    
+    def agg(self, spec, executor=None):
+        """aggregate columns within each group, returning a ColTable of the key columns
+        followed by the aggregated columns.
+        
+        spec - mapping of column names to an aggregation or list of aggregations
+               from 'sum', 'count', 'mean', 'min', 'max', 'first' and 'last'. A single
+               aggregation keeps the column's name, a list of aggregations gives
+               columns named column_aggregation. ValueError is raised if a name
+               clashes with a key column. The aggregations of a column are
+               computed together in a single pass.
+        executor - optional concurrent.futures executor which computes the
+                   aggregations in parallel, see ColTable.map_columns()"""
+        cols = OrderedDict()
+        if len(self.keys) == 1:
+            cols[self.keys[0]] = _likecol(_columnof(self.table,self.keys[0]),self.groups)
+        else:
+            for k,values in zip(self.keys,zip(*self.groups) if self.groups else [()]*len(self.keys)):
+                cols[k] = list(values)
+        tasks = [] #the aggregations of each column are computed together
+        names = []
+        for column,funcs in spec.items():
+            listed = isinstance(funcs,list)
+            funcs = funcs if listed else [funcs]
+            for func in funcs:
+                if func not in _aggregations: raise ValueError('unknown aggregation %r' %(func,))
+                name = '%s_%s' %(column,func) if listed else column
+                if name in cols or name in names: raise ValueError('aggregated column %r clashes with another column' %(name,))
+                names.append(name)
+            tasks.append((funcs,_columnof(self.table,column)))
+        groupids = shared = None
+        if executor is None:
+            results = [_aggregate(funcs,self.groupids,len(self.groups),values) for funcs,values in tasks]
+        else:
+            groupids = self.groupids
+            if _sharing(executor) and groupids: #sent to the workers once rather than with each task
+                groupids = shared = _SharedArray(memoryview(array.array('q',groupids)))
+            try:
+                futures = [_submit(executor,functools.partial(_aggregate,funcs,groupids,len(self.groups)),values) for funcs,values in tasks]
+                results = [future.result() for future in futures]
+            finally:
+                if shared is not None:
+                    shared.release()
+        for name,result in zip(names,itertools.chain.from_iterable(results)):
+            cols[name] = result
+        return ColTable._fromcols(cols)
+
+def _aggregate(funcs, groupids, ngroups, values):
+    """returns a list of the aggregations of values by each of funcs within each
+    group. groupids can be a _SharedArray."""
+    if isinstance(groupids,_SharedArray):
+        with groupids.attach() as ids:
+            return _aggregate(funcs,ids,ngroups,values)
+    arr = _asnumpy(values)
+    if arr is not None:
+        ids = _asnumpy(groupids)
+        ids = numpy.asarray(groupids if ids is None else ids,dtype=numpy.intp)
+        results = [_npaggregate(func,ids,arr,ngroups) for func in funcs]
+        if isinstance(values,numpy.ndarray):
+            return results
+        return [array.array(result.dtype.char,result.tobytes()) for result in results]
+    return _aggcolumn(funcs,groupids,values,ngroups)
+
+_aggregations = ('sum','count','mean','min','max','first','last')
+_unset = object() #no value seen yet for a group
+
+def _aggcolumn(funcs, groupids, values, ngroups):
+    """computes each of funcs for every group in a single pass over the values"""
+    needed = set(funcs)
+    totals = [0]*ngroups if needed & set(['sum','mean']) else None
+    counts = [0]*ngroups if needed & set(['count','mean']) else None
+    firsts = [_unset]*ngroups if 'first' in needed else None
+    lasts = [None]*ngroups if 'last' in needed else None
+    mins = [_unset]*ngroups if 'min' in needed else None
+    maxs = [_unset]*ngroups if 'max' in needed else None
+    for g,v in zip(groupids,values):
+        if totals is not None: totals[g] += v
+        if counts is not None: counts[g] += 1
+        if firsts is not None and firsts[g] is _unset: firsts[g] = v
+        if lasts is not None: lasts[g] = v
+        if mins is not None:
+            m = mins[g]
+            if m is _unset or v < m: mins[g] = v
+        if maxs is not None:
+            m = maxs[g]
+            if m is _unset or v > m: maxs[g] = v
+    results = {'sum':totals, 'count':counts, 'first':firsts, 'last':lasts, 'min':mins, 'max':maxs}
+    if 'mean' in needed:
+        results['mean'] = [float(total)/n for total,n in zip(totals,counts)]
+    return [results[func] for func in funcs]
+
+def _npaggregate(func, groupids, arr, ngroups):
+    """numpy version of the aggregations for typed columns"""
+    if func == 'count':
+        return numpy.bincount(groupids,minlength=ngroups)
+    if func == 'mean':
+        return numpy.bincount(groupids,weights=arr,minlength=ngroups) / numpy.bincount(groupids,minlength=ngroups)
+    if func == 'first':
+        return arr[numpy.unique(groupids,return_index=True)[1]]
+    if func == 'last':
+        return arr[len(arr) - 1 - numpy.unique(groupids[::-1],return_index=True)[1]]
+    if func == 'sum':
+        acc = numpy.zeros(ngroups,dtype=arr.dtype)
+        numpy.add.at(acc,groupids,arr)
+        return acc
+    #min and max start from the extremes of the dtype so that each is a single pass
+    if arr.dtype.kind == 'f':
+        lowest, highest = -numpy.inf, numpy.inf
+    else:
+        info = numpy.iinfo(arr.dtype)
+        lowest, highest = info.min, info.max
+    acc = numpy.full(ngroups,highest if func == 'min' else lowest,dtype=arr.dtype)
+    (numpy.minimum if func == 'min' else numpy.maximum).at(acc,groupids,arr)
+    return acc
+
+def _directions(columns, reverse):
+    """returns a list of the sort direction of each of columns"""
+    if isinstance(reverse,bool):
+        return [reverse]*len(columns)
+    reverse = list(reverse)
+    if len(reverse) != len(columns): raise ValueError('reverse should have an entry for each column')
+    return reverse
+
+def _argsort(keycols, reverse):
+    """returns the list of positions which stably sorts the key columns (most
+    significant first), each sorted in the direction given by reverse"""
+    length = len(keycols[0]) if keycols else 0
+    arrays = [_asnumpy(col) for col in keycols]
+    if keycols and all(arr is not None for arr in arrays):
+        perm = numpy.arange(length)
+        for arr,rev in reversed(list(zip(arrays,reverse))):
+            values = arr[perm]
+            if rev: #descending but with ties left in their original order
+                order = length - 1 - numpy.argsort(values[::-1],kind='stable')[::-1]
+            else:
+                order = numpy.argsort(values,kind='stable')
+            perm = perm[order]
+        return perm.tolist()
+    perm = list(range(length))
+    for col,rev in reversed(list(zip(keycols,reverse))):
+        perm.sort(key=col.__getitem__,reverse=rev)
+    return perm
+
+def _take(col, positions):
+    """gathers col[i] for each of positions into the same kind of container as col.
+    A position of None gives a value of None (and a list)."""
+    if None in positions:
+        return [col[i] if i is not None else None for i in positions]
+    if isinstance(col,(CategoricalColumn,BlockList)):
+        return col.take(positions)
+    arr = _asnumpy(col)
+    if arr is None:
+        return _likecol(col,map(col.__getitem__,positions))
+    taken = arr[numpy.asarray(positions,dtype=numpy.intp)]
+    if getattr(col,'typecode',None):
+        return array.array(col.typecode,taken.tobytes())
+    return taken
+
+def _joinpositions(left, right, how):
+    """hash join two sequences of keys, returning lists of the matching positions
+    in left and right (None where a row has no match). The hash table is built on
+    the smaller side but the pairs always come in the order of left, then for an
+    outer join the unmatched positions of right in order."""
+    lpos, rpos = [], []
+    keep = how != 'inner'
+    unmatched = [] #of right
+    if len(left) < len(right):
+        table = {}
+        for i,k in enumerate(left):
+            table.setdefault(k,[]).append(i)
+        matches = {} #left position: matching right positions
+        for j,k in enumerate(right):
+            found = table.get(k)
+            if found is not None:
+                for i in found:
+                    matches.setdefault(i,[]).append(j)
+            elif how == 'outer':
+                unmatched.append(j)
+        for i in range(len(left)):
+            found = matches.get(i)
+            if found:
+                lpos.extend([i]*len(found))
+                rpos.extend(found)
+            elif keep:
+                lpos.append(i)
+                rpos.append(None)
+    else:
+        table = {}
+        for j,k in enumerate(right):
+            table.setdefault(k,[]).append(j)
+        matched = set()
+        for i,k in enumerate(left):
+            found = table.get(k)
+            if found:
+                lpos.extend([i]*len(found))
+                rpos.extend(found)
+                matched.add(k)
+            elif keep:
+                lpos.append(i)
+                rpos.append(None)
+        if how == 'outer':
+            unmatched = [j for j,k in enumerate(right) if k not in matched]
+    lpos.extend([None]*len(unmatched))
+    rpos.extend(unmatched)
+    return lpos, rpos
+
+def _columnof(table, key):
+    """returns a column of a ColTable or Table"""
+    cols = getattr(table,'cols',None)
+    return table[key] if cols is None else cols[key]
+
+def _join(left, right, on, how='inner', suffix='_right'):
+    """hash join two tables (ColTable or Table) returning a ColTable, see ColTable.join()"""
+    if how not in ('inner','left','outer'): raise ValueError('unknown join type %r' %(how,))
+    keys = on if isinstance(on,list) else [on]
+    if len(keys) == 1:
+        lkeys, rkeys = _columnof(left,keys[0]), _columnof(right,keys[0])
+        if isinstance(lkeys,CategoricalColumn) and isinstance(rkeys,CategoricalColumn):
+            #join on the codes, giving right's categories missing from left distinct negative codes
+            translated = [lkeys.code(v) for v in rkeys.categories]
+            translated = [-1-i if c is None else c for i,c in enumerate(translated)]
+            lkeys, rkeys = lkeys.codes, list(map(translated.__getitem__,rkeys.codes))
+    else:
+        lkeys = list(zip(*[_columnof(left,k) for k in keys]))
+        rkeys = list(zip(*[_columnof(right,k) for k in keys]))
+    names = list(left.headers) #names of the joined columns, checked before joining
+    for name in right.headers:
+        if name in keys: continue
+        if name in names:
+            if name + suffix in names: raise ValueError('column %s%s already exists, use another suffix' %(name,suffix))
+            name += suffix
+        names.append(name)
+    lpos, rpos = _joinpositions(lkeys,rkeys,how)
+    cols = OrderedDict()
+    for name in left.headers:
+        cols[name] = _take(_columnof(left,name),lpos)
+    if how == 'outer': #key values of the unmatched rows of right
+        start = lpos.index(None) if None in lpos else len(lpos)
+        for k in keys:
+            col, rcol = cols[k], _columnof(right,k)
+            for i in range(start,len(lpos)):
+                col[i] = rcol[rpos[i]]
+    for name,newname in zip([h for h in right.headers if h not in keys],names[len(cols):]):
+        cols[newname] = _take(_columnof(right,name),rpos)
+    return ColTable._fromcols(cols)
 
+def _typedcol(typecode, values):
+    """returns values as an array.array of typecode (or a list if typecode is None
+    or a CategoricalColumn if typecode is 'category')"""
+    if typecode is None:
+        return list(values)
+    if typecode == 'category':
+        return CategoricalColumn(values)
+    if isinstance(values,MappedColumn) and values.typecode == typecode:
+        return values.copy() #copies the bytes rather than each value
+    return array.array(typecode, values)
 
-def rows2cols(iterable):
+_mutabletypes = (list, array.array, CategoricalColumn, BlockList)
+
+def _copycol(col):
+    """returns a shallow copy of a column, read-only columns are copied into mutable ones"""
+    if isinstance(col,ReadOnlyColumn) or (numpy is not None and isinstance(col,numpy.ndarray)):
+        return col.copy()
+    return copy.copy(col)
+
+def _slicecol(col, key):
+    """returns a copy of a slice of a column"""
+    part = col[key]
+    if isinstance(part,ReadOnlyColumn) or (numpy is not None and isinstance(part,numpy.ndarray)):
+        return part.copy() #these are views rather than copies
+    return part
+
+def _likecol(col, values):
+    """returns values in the same kind of container as col (list, array.array or BlockList)"""
+    if isinstance(col,BlockList):
+        return BlockList(values,col.typecode,col.blocksize)
+    return _typedcol(getattr(col,'typecode',None), values)
+
+@contextlib.contextmanager
+def _replacing(path, mode='wb'):
+    """open a temporary file to be written in place of path, which it replaces once
+    written. The old file isn't truncated, so a table memory-mapped from it (even
+    the table being saved) still reads its old contents."""
+    temp = path + '.tmp'
+    try:
+        with open(temp,mode) as f:
+            yield f
+        os.replace(temp,path)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+
+def _savecol(directory, stem, col):
+    """write a column to files in directory whose names start with stem, returns
+    a dict describing the column for the header"""
+    if isinstance(col,BlockList): #saved as a plain column
+        col = col.values()
+    typecode = getattr(col,'typecode',None)
+    if typecode is None and numpy is not None and isinstance(col,numpy.ndarray) and col.dtype.char in 'bBhHiIlLqQfd':
+        typecode = col.dtype.char
+    storage = None
+    if isinstance(col,CompressedColumn):
+        with _replacing(os.path.join(directory,stem + '.bin'),'wb') as f:
+            f.write(col.data)
+        return {'kind':'compressed', 'typecode':col.typecode, 'length':len(col), 'codec':col.codec,
+                'encoding':col.encoding, 'file':stem + '.bin'}
+    if typecode == 'category':
+        col = col if isinstance(col,CategoricalColumn) else col.copy() #a view
+        if not all(map(_jsonkey,col.categories)):
+            raise TypeError('categories must be json scalars or tuples of them to be saved')
+        with _replacing(os.path.join(directory,stem + '.bin'),'wb') as f:
+            col.codes.tofile(f)
+        return {'kind':'category', 'typecode':col.codes.typecode, 'itemsize':col.codes.itemsize,
+                'categories':col.categories, 'file':stem + '.bin'}
+    if typecode is None: #guess a storage for a list
+        kinds = set(map(type,col))
+        if kinds == set([str]):
+            encoded = [v.encode('utf-8') for v in col]
+            offsets = array.array('q',[0])
+            offsets.extend(itertools.accumulate(map(len,encoded)))
+            with _replacing(os.path.join(directory,stem + '.offsets'),'wb') as f:
+                offsets.tofile(f)
+            with _replacing(os.path.join(directory,stem + '.bytes'),'wb') as f:
+                f.write(b''.join(encoded))
+            return {'kind':'str', 'offsets':stem + '.offsets', 'data':stem + '.bytes'}
+        if kinds in (set([int]),set([float])):
+            try:
+                values = array.array('q' if int in kinds else 'd',col)
+                storage = 'list'
+            except OverflowError:
+                pass
+    elif typecode != 'u':
+        if isinstance(col,array.array):
+            values = col
+        elif isinstance(col,ReadOnlyColumn):
+            values = col.copy()
+        else: #a numpy array
+            values = array.array(typecode,col.tobytes())
+    if storage is None and typecode in (None,'u'):
+        try:
+            with _replacing(os.path.join(directory,stem + '.json'),'w') as f:
+                json.dump(list(col),f)
+        except TypeError:
+            raise TypeError('column values must be json serializable to be saved')
+        return {'kind':'json', 'file':stem + '.json'}
+    with _replacing(os.path.join(directory,stem + '.bin'),'wb') as f:
+        values.tofile(f)
+    return {'kind':'array', 'typecode':values.typecode, 'itemsize':values.itemsize,
+            'storage':storage, 'file':stem + '.bin'}
+
+def _jsonkey(value):
+    """True if value survives a json round trip (with _tuples())"""
+    if isinstance(value,tuple):
+        return all(map(_jsonkey,value))
+    return value is None or isinstance(value,(str,int,float))
+
+def _tuples(value):
+    """returns a category read from json with its lists (saved tuples) as tuples"""
+    return tuple(map(_tuples,value)) if isinstance(value,list) else value
+
+def _mapfile(path):
+    """returns a read-only memoryview of a memory-mapped file"""
+    with open(path,'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            return memoryview(b'')
+        return memoryview(mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ))
+
+def _readfile(path):
+    with open(path,'rb') as f:
+        return f.read()
+
+def _loadcol(directory, entry, byteorder, mapped):
+    """read a column saved by _savecol()"""
+    kind = entry['kind']
+    swap = byteorder != sys.byteorder
+    if kind == 'json':
+        with open(os.path.join(directory,entry['file'])) as f:
+            return json.load(f)
+    if kind == 'str':
+        offpath = os.path.join(directory,entry['offsets'])
+        datapath = os.path.join(directory,entry['data'])
+        if mapped and not swap:
+            return MappedStrings(_mapfile(offpath).cast('q'),_mapfile(datapath))
+        offsets = array.array('q',_readfile(offpath))
+        if swap: offsets.byteswap()
+        data = _readfile(datapath)
+        return [data[a:b].decode('utf-8') for a,b in zip(offsets,offsets[1:])]
+    if kind == 'compressed':
+        path = os.path.join(directory,entry['file'])
+        col = CompressedColumn(_mapfile(path) if mapped else _readfile(path),entry['length'],
+                               entry['typecode'],entry['codec'],entry['encoding'])
+        if swap and col.typecode is not None:
+            return col.copy(byteswap=True) #the encoding headers are swapped too
+        return col
+    if kind not in ('array','category'): raise ValueError('unknown column kind %r' %(kind,))
+    typecode = entry['typecode']
+    if array.array(typecode).itemsize != entry['itemsize']:
+        raise ValueError('typecode %r has a different size on this platform' %(typecode,))
+    path = os.path.join(directory,entry['file'])
+    if kind == 'category': #the codes are small, they are read rather than mapped
+        codes = array.array(typecode,_readfile(path))
+        if swap: codes.byteswap()
+        return CategoricalColumn.fromcodes(codes,[_tuples(c) for c in entry['categories']])
+    if entry.get('storage') == 'list': #a list of ints or floats, restored as a list whether mapped or not
+        values = array.array(typecode,_readfile(path))
+        if swap: values.byteswap()
+        return values.tolist()
+    if mapped and not swap:
+        return MappedColumn(_mapfile(path).cast(typecode))
+    values = array.array(typecode,_readfile(path))
+    if swap: values.byteswap()
+    return values
+
+def _categorymask(col, results):
+    """returns a mask of a CategoricalColumn given the result for each category"""
+    if numpy is not None and len(col.codes):
+        return numpy.asarray(results,dtype=bool)[numpy.frombuffer(col.codes,dtype=col.codes.typecode)]
+    return list(map(results.__getitem__,col.codes))
+
+def _parsebool(value):
+    if isinstance(value,str):
+        lowered = value.strip().lower()
+        #only explicit words, so that columns of codes such as 'y', 'n' or 't' stay strings
+        if lowered == 'true': return True
+        if lowered == 'false': return False
+        raise ValueError('could not convert string to bool: %r' %(value,))
+    return bool(value)
+
+#types that can be inferred, in order of preference
+_parsers = OrderedDict([(bool,_parsebool),(int,int),(float,float),(str,str)])
+_inferredtypecodes = {int:'q', float:'d'}
+
+def _convertcol(col, totype):
+    """returns the values of col converted to totype, a type in _parsers (giving a list
+    in which None and, unless totype is str, empty strings become None) or an
+    array.array typecode (giving an array)"""
+    if totype == 'category':
+        return CategoricalColumn(col)
+    if isinstance(totype,str):
+        return array.array(totype,map(float if totype in 'fd' else int,col))
+    parse = _parsers[totype]
+    if totype is str:
+        return [None if v is None else parse(v) for v in col]
+    return [None if v is None or v == '' else parse(v) for v in col]
+
+def _infertype(col, sample=1000, typed=False):
+    """returns the first type of _parsers that a sample of the values of col (ignoring
+    missing values) can be converted to, or None if the sample is empty or the
+    values have already been converted (unless typed and they are numbers)"""
+    if getattr(col,'typecode',None) is not None:
+        return None
+    values = list(itertools.islice((v for v in col if v is not None and v != ''),sample))
+    if not values:
+        return None
+    kinds = set(map(type,values))
+    if kinds != set([str]): #values have already been converted
+        if typed and kinds <= set([int,float]): return kinds.pop() if len(kinds) == 1 else float
+        return None
+    for pytype,parse in _parsers.items():
+        try:
+            for v in values:
+                parse(v)
+        except ValueError:
+            continue
+        return pytype
+
+def _infercol(col, sample=1000, typed=False):
+    """returns (type, converted column) for the narrowest type that all of the values
+    of col can be converted to, the type is guessed from a sample of the values and
+    widened if the conversion fails. Returns (None, col) if col should be left alone.
+    
+    typed - columns without missing values are converted to typed arrays if possible"""
+    pytype = _infertype(col,sample,typed)
+    if pytype is None:
+        return None, col
+    strings = any(isinstance(v,str) for v in itertools.islice(col,sample))
+    candidates = list(_parsers)
+    for pytype in candidates[candidates.index(pytype):-1]: #not str
+        for totype in ([_inferredtypecodes[pytype]] if typed and pytype in _inferredtypecodes else []) + ([pytype] if strings else []):
+            try:
+                return totype, _convertcol(col,totype)
+            except (ValueError, TypeError, OverflowError):
+                pass
+    return None, col
+
+def _sharing(executor):
+    """True if columns are sent to executor through shared memory"""
+    return shared_memory is not None and isinstance(executor,concurrent.futures.ProcessPoolExecutor)
+
+class _SharedArray(object):
+    """An array column copied into shared memory, which is pickled as a reference
+    to the memory so that worker processes can use the values without copying
+    them (see attach()). release() frees the memory when it is no longer used.
+    
+    buf - contiguous buffer of the values (such as a memoryview of an array.array)"""
+    def __init__(self, buf):
+        self.typecode = buf.format
+        self.nbytes = buf.nbytes
+        self._shm = shared_memory.SharedMemory(create=True,size=max(buf.nbytes,1))
+        self._shm.buf[:buf.nbytes] = buf.cast('B')
+        self.name = self._shm.name
+    
+    def __getstate__(self):
+        return (self.name,self.typecode,self.nbytes)
+    
+    def __setstate__(self, state):
+        self.name, self.typecode, self.nbytes = state
+        self._shm = None
+    
+    def release(self):
+        """close and free the shared memory (in the process which created it)"""
+        self._shm.close()
+        self._shm.unlink()
+    
+    @contextlib.contextmanager
+    def attach(self):
+        """yields the values as a read-only MappedColumn of the shared memory (in
+        a worker process). Nothing may keep a reference to its buffer afterwards."""
+        shm = shared_memory.SharedMemory(name=self.name)
+        view = shm.buf[:self.nbytes]
+        col = MappedColumn(view.cast(self.typecode))
+        try:
+            yield col
+        finally:
+            col.buffer.release()
+            view.release()
+            shm.close()
+
+def _submit(executor, func, col):
+    """submits func(col) to executor. Array columns are given to func as read-only
+    MappedColumns whatever the executor, see _readonlycall(). Process pools are
+    sent them through shared memory, which is released when the call finishes,
+    rather than pickled. func's result must not share the column's memory."""
+    if _sharing(executor):
+        buf = _arraybuffer(col)
+        if buf is not None and buf.contiguous and buf.nbytes:
+            shared = _SharedArray(buf)
+            try:
+                future = executor.submit(_sharedcall,func,shared)
+            except BaseException:
+                shared.release()
+                raise
+            future.add_done_callback(lambda future: shared.release())
+            return future
+    return executor.submit(_readonlycall,func,col)
+
+def _arraybuffer(col):
+    """returns a memoryview of the values of an array column (or MappedColumn), or None
+    for other columns"""
+    if isinstance(col,array.array) and col.typecode != 'u': #memoryviews can't read 'u'
+        return memoryview(col)
+    if isinstance(col,MappedColumn):
+        return col.buffer
+    return None
+
+def _readonlycall(func, col):
+    """calls func on col, an array column is given as a read-only MappedColumn of its
+    values so that func sees the same type as it would in a process pool"""
+    if not isinstance(col,array.array):
+        return func(col)
+    buf = _arraybuffer(col)
+    if buf is None:
+        return func(col)
+    try:
+        return func(MappedColumn(buf))
+    finally:
+        buf.release() #otherwise the column couldn't be resized
+
+def _sharedcall(func, shared):
+    """calls func on an array column held in shared memory (in a worker process)"""
+    with shared.attach() as col:
+        return func(col)
+
+def _extendcols(cols, rows, width, positions, chunksize=10000, names=None, converters=None):
+    """transposes an iterable of rows onto the end of the column lists in a single pass.
+    
+    cols - lists to extend, one for each entry of positions
+    rows - iterable of row sequences, each must have length width
+    positions - the row position feeding each of cols
+    chunksize - number of rows held in memory at once
+    names - if given, rows can also be mappings of these keys
+    converters - if given, functions (or None) applied to each chunk of each column"""
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, chunksize))
+        if not chunk: break
+        if names is not None:
+            chunk = [row if type(row) in (list,tuple) or not isinstance(row,Mapping) else [row[k] for k in names] for row in chunk]
+        if not all(len(row) == width for row in chunk): raise ValueError('not all rows have the same number of columns')
+        transposed = list(zip(*chunk))
+        if converters is None:
+            for col,p in zip(cols,positions):
+                col.extend(transposed[p])
+        else:
+            for col,p,convert in zip(cols,positions,converters):
+                col.extend(transposed[p] if convert is None else convert(transposed[p]))
+
+def rows2cols(iterable, typecodes=None):
     """takes an iterable of row sequences and returns a list of lists of
-    columnar data."""
-    #checks
-    widths = (len(row) for row in iterable)
-    try: width = next(widths)
+    columnar data. The rows are read once so the iterable can be a generator.
+    
+    typecodes - optional sequence of array.array typecodes (or None for a list)
+                for each column, these columns are returned as typed arrays."""
+    rows = iter(iterable)
+    try: first = next(rows)
     except StopIteration as e:
         raise ValueError('function received zero length input')
-    if not all(w == width for w in widths): raise ValueError('not all rows have the same number of columns')
-    #
-    result = [[row[i] for row in iterable] for i in range(width)]
+    width = len(first)
+    if typecodes is None: typecodes = [None]*width
+    if len(typecodes) != width: raise ValueError('typecodes and dataset are not the same width')
+    result = [_typedcol(tc,()) for tc in typecodes]
+    _extendcols(result,itertools.chain([first],rows),width,range(width))
     return result
 
 def cols2dict(headers,iterable):
@@ -254,22 +1502,24 @@ def cols2dict(headers,iterable):
     if len(headers) != len(iterable): raise ValueError('headers amd iterable sequences are not of equal length')
     return OrderedDict(zip(headers,iterable))
 
-def rows2dict(headers,iterable):
-    """creates an ordered dictionary from sequences of column names and rows of data
+def rows2dict(headers,iterable,dtypes=None):
+    """creates an ordered dictionary from sequences of column names and rows of data.
+    The rows are read once so the iterable can be a generator.
     
     headers - a sequence of hashable items
-    iterable - a sequence of rows (checked to be all of the same length)
+    iterable - an iterable of rows (checked to be all of the same length)
+    dtypes - optional mapping of column names to array.array typecodes, these
+             columns are stored as typed arrays.
     """
-    #checks
-    widths = (len(row) for row in iterable)
-    try: width = next(widths)
+    headers = list(headers)
+    rows = iter(iterable)
+    try: first = next(rows)
     except StopIteration as e:
         raise ValueError('function received zero length input')
-    if not all(w == width for w in widths): raise ValueError('not all rows have the same number of columns')
-    if len(headers) != width: raise ValueError('headers amd dataset are not the same width')
-    #
-    result = OrderedDict((key,[row[i] for row in iterable]) for i,key in enumerate(headers))
-    return result
+    if len(headers) != len(first): raise ValueError('headers amd dataset are not the same width')
+    dtypes = dtypes or {}
+    cols = rows2cols(itertools.chain([first],rows),[dtypes.get(key) for key in headers])
+    return OrderedDict(zip(headers,cols))
 
 
 if __name__ == "__main__":
@@ -288,3 +1538,5 @@ if __name__ == "__main__":
     
     data2 = rows2dict(header,data)
     tab  = ColTable(data2)
+    
+    tab2 = ColTable.from_csv(os.path.join(os.path.dirname(__file__),'countries.csv'))
@@ -0,0 +1,576 @@
+#!/usr/bin/env python
+"""Alternative column types for ColTable.
+
+Columns are normally lists (or array.arrays for typed data). The read-only
+column types here share or defer their storage. When a ColTable is about to
+modify one of its columns, it first replaces any read-only column with a
+mutable copy (copy-on-write), see ReadOnlyColumn. CategoricalColumn is a
+mutable column which stores repetitive values compactly, CompressedColumn
+a read-only column which is decompressed when it is first used and BlockList
+a mutable column which is cheap to insert into and delete from in the middle.
+
+Copyright (C) 2016 Robert Steed
+"""
+try:
+    from collections.abc import Sequence, MutableSequence
+except ImportError:
+    from collections import Sequence, MutableSequence
+import abc
+import array
+import bisect
+import itertools
+import json
+import lzma
+import operator
+import zlib
+
+
+class ReadOnlyColumn(Sequence):
+    """Base class of columns which can't be modified in place. Subclasses provide
+    __len__, __getitem__ and copy(), which returns the data as a list or
+    array.array so that the table can take ownership of it before a change.
+    """
+    __slots__ = ()
+    typecode = None
+    
+    @abc.abstractmethod
+    def copy(self):
+        """returns the values as a new list or array.array"""
+    
+    def __eq__(self, other):
+        try:
+            if len(self) != len(other): return False
+        except TypeError:
+            return NotImplemented
+        return all(a == b for a,b in zip(self,other))
+    
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+    
+    __hash__ = None
+    
+    def __repr__(self):
+        return '%s(%r)' %(type(self).__name__,list(self))
+
+
+class ColumnView(ReadOnlyColumn):
+    """A view of a range of the rows of a column which shares the column's storage,
+    so creating it costs O(1) whatever the length of the column.
+    
+    base - the viewed column (list, array.array, numpy array ...)
+    rows - range object of the viewed rows of base (default all of them)
+    
+    The view sees values changed in place in the viewed rows of the base column
+    but its rows are fixed when it is created, so rows inserted into or deleted
+    from the base column shift (or truncate) what it shows. Slicing a view gives
+    another view of the same base column.
+    """
+    __slots__ = ('base','rows')
+    
+    def __init__(self, base, rows=None):
+        if isinstance(base,ColumnView): #view the base column directly
+            if rows is not None:
+                outer = base.rows
+                start, step = outer.start + rows.start*outer.step, outer.step*rows.step
+                rows = range(start,start + len(rows)*step,step)
+            else:
+                rows = base.rows
+            base = base.base
+        self.base = base
+        self.rows = range(len(base)) if rows is None else rows
+    
+    @property
+    def typecode(self):
+        return getattr(self.base,'typecode',None)
+    
+    @property
+    def slice(self):
+        """the slice of the base column which is viewed"""
+        rows = self.rows
+        return slice(rows.start,rows.stop if rows.stop >= 0 else None,rows.step)
+    
+    def __len__(self):
+        return len(self.rows)
+    
+    def __getitem__(self, key):
+        if isinstance(key,slice):
+            return ColumnView(self.base,self.rows[key])
+        return self.base[self.rows[key]]
+    
+    def __iter__(self):
+        return map(self.base.__getitem__,self.rows)
+    
+    def copy(self):
+        part = self.base[self.slice]
+        return part.copy() if hasattr(part,'copy') and not isinstance(part,list) else part
+
+
+class MappedColumn(ReadOnlyColumn):
+    """A column of fixed width values held in a buffer, such as a memory-mapped
+    file, so that only the parts of the column which are used are read.
+    
+    buffer - memoryview cast to typecode
+    """
+    __slots__ = ('buffer',)
+    
+    def __init__(self, buffer):
+        self.buffer = buffer
+    
+    @property
+    def typecode(self):
+        return self.buffer.format
+    
+    def __len__(self):
+        return len(self.buffer)
+    
+    def __getitem__(self, key):
+        if isinstance(key,slice):
+            return MappedColumn(self.buffer[key])
+        return self.buffer[key]
+    
+    def __iter__(self):
+        return iter(self.buffer)
+    
+    def copy(self):
+        """returns the data as an array.array"""
+        result = array.array(self.typecode)
+        result.frombytes(self.buffer.tobytes())
+        return result
+
+
+class MappedStrings(ReadOnlyColumn):
+    """A column of strings held in buffers, such as memory-mapped files. String
+    i is the utf-8 encoded bytes data[offsets[i]:offsets[i+1]], which are only
+    decoded when that string is accessed.
+    
+    offsets - memoryview of integers, one longer than the column
+    data - memoryview of bytes
+    """
+    __slots__ = ('offsets','data')
+    
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+    
+    def __len__(self):
+        return len(self.offsets) - 1
+    
+    def __getitem__(self, key):
+        if isinstance(key,slice):
+            return [self[i] for i in range(len(self))[key]]
+        if key < 0: key += len(self)
+        if not 0 <= key < len(self): raise IndexError('column index out of range')
+        return self.data[self.offsets[key]:self.offsets[key+1]].tobytes().decode('utf-8')
+    
+    def copy(self):
+        """returns the data as a list"""
+        return [self[i] for i in range(len(self))]
+
+
+#typecodes used for codes, and the number of categories that they can hold
+_codetypes = [('B',1 << 8),('H',1 << 16),('I',1 << 32),('Q',1 << 64)]
+
+class CategoricalColumn(MutableSequence):
+    """A column of hashable values stored as a dictionary of the distinct values
+    (categories) and an array of small integer codes, one per row. Suited to
+    columns which repeat a few values (such as country codes) and decoded on
+    access. Categories are never removed, the array of codes is widened as the
+    number of categories grows.
+    
+    values - initial values of the column
+    """
+    __slots__ = ('codes','categories','_lookup')
+    typecode = 'category' #reported by ColTable.dtypes
+    
+    def __init__(self, values=()):
+        self.codes = array.array('B')
+        self.categories = []
+        self._lookup = {}
+        self.extend(values)
+    
+    @classmethod
+    def fromcodes(cls, codes, categories):
+        """create a column from an array of codes and a list of categories (not copied)"""
+        col = cls.__new__(cls)
+        col.codes = codes
+        col.categories = categories
+        col._lookup = dict((v,i) for i,v in enumerate(categories))
+        return col
+    
+    def code(self, value):
+        """returns the code of value or None if it is not a category"""
+        return self._lookup.get(value)
+    
+    def _encode(self, values):
+        """returns the codes of values, adding new categories"""
+        lookup = self._lookup
+        known = len(lookup)
+        try:
+            codes = [lookup.setdefault(v,len(lookup)) for v in values]
+        except TypeError: #an unhashable value, forget the categories added so far
+            for v in list(itertools.islice(lookup,known,None)):
+                del lookup[v]
+            raise
+        if len(lookup) > known:
+            self.categories.extend(itertools.islice(lookup,known,None))
+            for typecode,limit in _codetypes:
+                if len(lookup) <= limit: break
+            if typecode != self.codes.typecode:
+                self.codes = array.array(typecode,self.codes)
+        return codes
+    
+    def __len__(self):
+        return len(self.codes)
+    
+    def __getitem__(self, key):
+        if isinstance(key,slice):
+            return self.fromcodes(self.codes[key],list(self.categories))
+        return self.categories[self.codes[key]]
+    
+    def __iter__(self):
+        return map(self.categories.__getitem__,self.codes)
+    
+    def __setitem__(self, key, value):
+        if isinstance(key,slice):
+            value = self._encode(value)
+            self.codes[key] = array.array(self.codes.typecode,value)
+        else:
+            code, = self._encode([value])
+            self.codes[key] = code
+    
+    def __delitem__(self, key):
+        del self.codes[key]
+    
+    def insert(self, index, value):
+        code, = self._encode([value])
+        self.codes.insert(index,code)
+    
+    def append(self, value):
+        code, = self._encode([value])
+        self.codes.append(code)
+    
+    def extend(self, values):
+        codes = self._encode(values) #may widen self.codes
+        self.codes.extend(codes)
+    
+    def pop(self, index=-1):
+        return self.categories[self.codes.pop(index)]
+    
+    def take(self, positions):
+        """returns a new column of the values at positions"""
+        return self.fromcodes(array.array(self.codes.typecode,map(self.codes.__getitem__,positions)),list(self.categories))
+    
+    def compress(self, mask):
+        """returns a new column of the values where mask is True"""
+        return self.fromcodes(array.array(self.codes.typecode,itertools.compress(self.codes,mask)),list(self.categories))
+    
+    def copy(self):
+        return self.fromcodes(array.array(self.codes.typecode,self.codes),list(self.categories))
+    
+    __copy__ = copy
+    
+    def __eq__(self, other):
+        if isinstance(other,CategoricalColumn) and other.categories == self.categories:
+            return self.codes == other.codes
+        try:
+            if len(self) != len(other): return False
+        except TypeError:
+            return NotImplemented
+        return all(a == b for a,b in zip(self,other))
+    
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+    
+    __hash__ = None
+    
+    def __repr__(self):
+        return '%s(%r)' %(type(self).__name__,list(self))
+
+
+_codecs = {None:(bytes,bytes), 'zlib':(zlib.compress,zlib.decompress), 'lzma':(lzma.compress,lzma.decompress)}
+_encodings = (None,'rle','delta')
+
+class CompressedColumn(ReadOnlyColumn):
+    """A column held as compressed bytes which are decompressed the first time
+    the column is used, the values are then cached until release() is called.
+    Suited to columns which are rarely read.
+    
+    data - the compressed bytes (or any buffer such as a memory-mapped file)
+    length - number of values
+    typecode - array.array typecode of the values, or None for a list of json
+               serializable values
+    codec - None, 'zlib' or 'lzma'
+    encoding - applied before compression: None, 'rle' (run-length encoding, for
+               columns with runs of repeated values) or 'delta' (differences
+               between successive values, for sorted integer columns)
+    
+    see compress() to create one from a column.
+    """
+    __slots__ = ('data','length','typecode','codec','encoding','_cache')
+    
+    def __init__(self, data, length, typecode=None, codec='zlib', encoding=None):
+        if codec not in _codecs: raise ValueError('unknown codec %r' %(codec,))
+        if encoding not in _encodings: raise ValueError('unknown encoding %r' %(encoding,))
+        self.data = data
+        self.length = length
+        self.typecode = typecode
+        self.codec = codec
+        self.encoding = encoding
+        self._cache = None
+    
+    @classmethod
+    def compress(cls, col, codec='zlib', encoding=None):
+        """returns a CompressedColumn of the values of col. Columns with a typecode
+        (array.arrays) are stored as raw values, other columns as json."""
+        if codec not in _codecs: raise ValueError('unknown codec %r' %(codec,))
+        if encoding not in _encodings: raise ValueError('unknown encoding %r' %(encoding,))
+        typecode = getattr(col,'typecode',None)
+        if typecode is not None and (len(typecode) != 1 or typecode not in array.typecodes):
+            typecode = None #such as a CategoricalColumn
+        if encoding == 'delta' and (typecode is None or typecode in 'fdu'):
+            raise ValueError('delta encoding needs a column of integers (with a typecode)')
+        if encoding == 'rle':
+            runs = [(k,len(list(g))) for k,g in itertools.groupby(col)]
+            values = [k for k,n in runs]
+            lengths = array.array('q',[n for k,n in runs])
+            if typecode is None:
+                payload = json.dumps([values,list(lengths)]).encode('utf-8')
+            else:
+                payload = array.array('q',[len(runs)]).tobytes() + lengths.tobytes() + array.array(typecode,values).tobytes()
+        elif encoding == 'delta':
+            payload = array.array('q',map(operator.sub,col,itertools.chain([0],col))).tobytes()
+        elif typecode is None:
+            payload = json.dumps(list(col)).encode('utf-8')
+        else:
+            payload = (col if isinstance(col,array.array) else array.array(typecode,col)).tobytes()
+        return cls(_codecs[codec][0](payload),len(col),typecode,codec,encoding)
+    
+    def values(self):
+        """returns the decompressed column (a list or array.array), which is cached.
+        It must not be modified."""
+        if self._cache is None:
+            self._cache = self._decompress()
+        return self._cache
+    
+    def release(self):
+        """forget the decompressed values"""
+        self._cache = None
+    
+    def _decompress(self, byteswap=False):
+        payload = _codecs[self.codec][1](self.data)
+        typecode = self.typecode
+        if typecode is None:
+            byteswap = False #json
+        if self.encoding == 'rle':
+            if typecode is None:
+                values, lengths = json.loads(payload.decode('utf-8'))
+            else:
+                header = _swapped(array.array('q',payload[:8]),byteswap)
+                runs = header[0]
+                lengths = _swapped(array.array('q',payload[8:8 + 8*runs]),byteswap)
+                values = _swapped(array.array(typecode,payload[8 + 8*runs:]),byteswap)
+            decoded = itertools.chain.from_iterable(map(itertools.repeat,values,lengths))
+            return list(decoded) if typecode is None else array.array(typecode,decoded)
+        if self.encoding == 'delta':
+            return array.array(typecode,itertools.accumulate(_swapped(array.array('q',payload),byteswap)))
+        if typecode is None:
+            return json.loads(payload.decode('utf-8'))
+        return _swapped(array.array(typecode,payload),byteswap)
+    
+    def __len__(self):
+        return self.length
+    
+    def __getitem__(self, key):
+        return self.values()[key]
+    
+    def __iter__(self):
+        return iter(self.values())
+    
+    def copy(self, byteswap=False):
+        """returns the values as a new list or array.array
+        
+        byteswap - if True, data was written on a machine of the other byteorder"""
+        values = self._cache
+        if values is None or byteswap:
+            return self._decompress(byteswap)
+        return list(values) if self.typecode is None else array.array(self.typecode,values)
+
+def _swapped(values, byteswap):
+    """returns the array values, byteswapped in place if byteswap is True"""
+    if byteswap:
+        values.byteswap()
+    return values
+
+
+class BlockList(MutableSequence):
+    """A list stored as a list of blocks of about blocksize values. Inserting or
+    deleting a value in the middle only moves the values of its block and
+    updates the offsets of the later blocks, rather than moving all of the
+    following values, and indexing finds the block with a binary search. Blocks
+    are split when they grow to twice blocksize, so with blocksize around the
+    square root of the length inserts and deletes cost about O(sqrt n).
+    
+    values - initial values
+    typecode - optional array.array typecode, the blocks are then typed arrays
+    blocksize - number of values in each block as the list is extended
+    """
+    __slots__ = ('blocks','offsets','typecode','blocksize','_length')
+    
+    def __init__(self, values=(), typecode=None, blocksize=4096):
+        if blocksize < 1: raise ValueError('blocksize must be at least 1')
+        self.typecode = typecode
+        self.blocksize = blocksize
+        self.blocks = []
+        self.offsets = [] #position of the first value of each block
+        self._length = 0
+        self.extend(values)
+    
+    def _newblock(self, values=()):
+        return list(values) if self.typecode is None else array.array(self.typecode,values)
+    
+    def _like(self, values):
+        return BlockList(values,self.typecode,self.blocksize)
+    
+    def _locate(self, index):
+        """returns the block number of index and its position in that block"""
+        if index < 0: index += self._length
+        if not 0 <= index < self._length: raise IndexError('BlockList index out of range')
+        b = bisect.bisect_right(self.offsets,index) - 1
+        return b, index - self.offsets[b]
+    
+    def _shift(self, b, n):
+        """move the offsets of block b onwards by n"""
+        if b < len(self.offsets):
+            self.offsets[b:] = [offset + n for offset in itertools.islice(self.offsets,b,None)]
+    
+    def _rebuild(self, values):
+        self.blocks = []
+        self.offsets = []
+        self._length = 0
+        self.extend(values)
+    
+    def values(self):
+        """returns the values as a single list (or array.array)"""
+        values = self._newblock()
+        for block in self.blocks:
+            values.extend(block)
+        return values
+    
+    def __len__(self):
+        return self._length
+    
+    def __iter__(self):
+        return itertools.chain.from_iterable(self.blocks)
+    
+    def __getitem__(self, key):
+        if isinstance(key,slice):
+            start, stop, step = key.indices(self._length)
+            if step == 1 and start < stop:
+                b, i = self._locate(start)
+                return self._like(itertools.islice(itertools.chain.from_iterable(itertools.islice(self.blocks,b,None)),i,i + stop - start))
+            return self._like(map(self.__getitem__,range(start,stop,step)))
+        b, i = self._locate(key)
+        return self.blocks[b][i]
+    
+    def __setitem__(self, key, value):
+        if isinstance(key,slice):
+            values = self.values()
+            values[key] = self._newblock(value)
+            self._rebuild(values)
+        else:
+            b, i = self._locate(key)
+            self.blocks[b][i] = value
+    
+    def __delitem__(self, key):
+        if isinstance(key,slice):
+            values = self.values()
+            del values[key]
+            self._rebuild(values)
+            return
+        b, i = self._locate(key)
+        block = self.blocks[b]
+        del block[i]
+        self._length -= 1
+        if block:
+            self._shift(b + 1,-1)
+        else:
+            del self.blocks[b]
+            del self.offsets[b]
+            self._shift(b,-1)
+    
+    def insert(self, index, value):
+        length = self._length
+        if index < 0: index = max(index + length,0)
+        if not self.blocks:
+            self.blocks.append(self._newblock())
+            self.offsets.append(0)
+        if index >= length:
+            b = len(self.blocks) - 1
+            i = len(self.blocks[b])
+        else:
+            b, i = self._locate(index)
+        block = self.blocks[b]
+        block.insert(i,value)
+        self._length += 1
+        self._shift(b + 1,1)
+        if len(block) >= 2*self.blocksize: #split the block in two
+            half = len(block)//2
+            self.blocks[b:b + 1] = [block[:half],block[half:]]
+            self.offsets.insert(b + 1,self.offsets[b] + half)
+    
+    def append(self, value):
+        if not self.blocks or len(self.blocks[-1]) >= self.blocksize:
+            self.blocks.append(self._newblock())
+            self.offsets.append(self._length)
+        self.blocks[-1].append(value)
+        self._length += 1
+    
+    def extend(self, values):
+        if values is self:
+            values = self.values()
+        values = iter(values)
+        if self.blocks and len(self.blocks[-1]) < self.blocksize: #fill up the last block
+            last = self.blocks[-1]
+            before = len(last)
+            last.extend(itertools.islice(values,self.blocksize - before))
+            self._length += len(last) - before
+        while True:
+            block = self._newblock(itertools.islice(values,self.blocksize))
+            if not block: break
+            self.blocks.append(block)
+            self.offsets.append(self._length)
+            self._length += len(block)
+    
+    def clear(self):
+        self._rebuild(())
+    
+    def take(self, positions):
+        """returns a new BlockList of the values at positions"""
+        return self._like(map(self.values().__getitem__,positions))
+    
+    def compress(self, mask):
+        """returns a new BlockList of the values where mask is True"""
+        return self._like(itertools.compress(self,mask))
+    
+    def copy(self):
+        return self._like(self)
+    
+    __copy__ = copy
+    
+    def __eq__(self, other):
+        try:
+            if len(self) != len(other): return False
+        except TypeError:
+            return NotImplemented
+        return all(a == b for a,b in zip(self,other))
+    
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+    
+    __hash__ = None
+    
+    def __repr__(self):
+        return '%s(%r)' %(type(self).__name__,list(self))
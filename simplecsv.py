@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+"""Helpers shared by the csv loaders of the table classes (Table.from_csv(),
+ColTable.from_csv() and ChunkedColTable.from_csv()).
+
+Copyright (C) 2016 Robert Steed
+"""
+import contextlib
+
+
+@contextlib.contextmanager
+def csvsource(path_or_file):
+    """yields an open file for csv reading, files are only closed if we opened them"""
+    if hasattr(path_or_file, 'read'):
+        yield path_or_file
+    else:
+        with open(path_or_file, newline='') as csvfile:
+            yield csvfile
+
+def positions(headers, columns=None):
+    """returns the positions of columns within headers (all positions if columns is None)"""
+    if columns is None:
+        return list(range(len(headers)))
+    try:
+        return [headers.index(key) for key in columns]
+    except ValueError:
+        raise KeyError('column does not exist')
+
+def checkedrows(rows, width):
+    """yields the rows, raising ValueError when one doesn't have width values"""
+    for row in rows:
+        if len(row) != width: raise ValueError('not all rows have the same number of columns')
+        yield row
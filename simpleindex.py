@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+"""Indexes for the table classes. An index maps the values of one column to
+the positions of the rows holding them so that rows can be found without
+scanning the whole column.
+
+The tables keep their indexes up to date as rows are added, changed and
+removed; inserting or deleting a single row moves the positions of the later
+rows held by the index. Changes which reorder or replace many rows (sorting,
+slice assignment) only mark an index as stale; it is rebuilt the next time
+that it is used.
+
+Copyright (C) 2016 Robert Steed
+"""
+import bisect
+
+
+class HashIndex(object):
+    """Dictionary based index of a column supporting equality lookups.
+    
+    unique - if True, the index refuses to hold the same value twice.
+    """
+    def __init__(self, values=(), unique=False):
+        self.unique = unique
+        self.build(values)
+    
+    def build(self, values):
+        """(re)build the index from a sequence of column values"""
+        mapping = {}
+        if self.unique:
+            for pos,v in enumerate(values):
+                if mapping.setdefault(v,pos) != pos: raise ValueError('duplicate value %r in unique index' %(v,))
+        else:
+            for pos,v in enumerate(values):
+                mapping.setdefault(v,[]).append(pos)
+        self._map = mapping
+        self.stale = False
+    
+    def __contains__(self, value):
+        return value in self._map
+    
+    def positions(self, value):
+        """returns a list of the positions of the rows holding value"""
+        try:
+            pos = self._map[value]
+        except KeyError:
+            return []
+        return [pos] if self.unique else list(pos)
+    
+    def check(self, value, pos=None):
+        """raises ValueError if value can't be stored at row pos"""
+        if self.unique and self._map.get(value,pos) != pos:
+            raise ValueError('duplicate value %r in unique index' %(value,))
+    
+    def add(self, value, pos):
+        """record value at row pos, which must be after all existing rows"""
+        if self.unique:
+            self.check(value)
+            self._map[value] = pos
+        else:
+            self._map.setdefault(value,[]).append(pos)
+    
+    def discard(self, value, pos):
+        """forget value at row pos"""
+        if self.unique:
+            if self._map.get(value) == pos:
+                del self._map[value]
+        else:
+            positions = self._map.get(value,[])
+            if pos in positions:
+                positions.remove(pos)
+                if not positions:
+                    del self._map[value]
+    
+    def insert(self, value, pos):
+        """record value at row pos, which is inserted before the rows from pos onwards"""
+        self.check(value)
+        self._shift(pos,1)
+        if self.unique:
+            self._map[value] = pos
+        else:
+            bisect.insort(self._map.setdefault(value,[]),pos)
+    
+    def remove(self, value, pos):
+        """forget value at row pos, which is deleted from before the later rows"""
+        self.discard(value,pos)
+        self._shift(pos,-1)
+    
+    def _shift(self, pos, n):
+        """move the positions from pos onwards by n"""
+        mapping = self._map
+        if self.unique:
+            for value,p in mapping.items():
+                if p >= pos: mapping[value] = p + n
+        else:
+            for positions in mapping.values():
+                if positions[-1] >= pos:
+                    positions[:] = [p + n if p >= pos else p for p in positions]
+
+
+class SortedIndex(object):
+    """Index of a column which keeps the values in sorted order (using bisect)
+    supporting equality lookups and range queries in O(log n + k). The column's
+    values must all be comparable with each other.
+    
+    unique - if True, the index refuses to hold the same value twice.
+    """
+    def __init__(self, values=(), unique=False):
+        self.unique = unique
+        self.build(values)
+    
+    def build(self, values):
+        """(re)build the index from a sequence of column values"""
+        order = sorted(range(len(values)), key=values.__getitem__)
+        keys = [values[pos] for pos in order]
+        if self.unique:
+            for a,b in zip(keys,keys[1:]):
+                if a == b: raise ValueError('duplicate value %r in unique index' %(a,))
+        self._keys = keys
+        self._pos = order
+        self.stale = False
+    
+    def __contains__(self, value):
+        i = bisect.bisect_left(self._keys,value)
+        return i < len(self._keys) and self._keys[i] == value
+    
+    def positions(self, value):
+        """returns a list of the positions of the rows holding value"""
+        return self.between(value,value)
+    
+    def between(self, lo=None, hi=None, inclusive=(True,True)):
+        """returns a list of the positions of the rows with values between lo and hi,
+        ordered by value. A bound of None is unlimited.
+        
+        inclusive - whether the rows equal to lo and hi respectively are included"""
+        keys = self._keys
+        if lo is None:
+            start = 0
+        else:
+            start = (bisect.bisect_left if inclusive[0] else bisect.bisect_right)(keys,lo)
+        if hi is None:
+            stop = len(keys)
+        else:
+            stop = (bisect.bisect_right if inclusive[1] else bisect.bisect_left)(keys,hi)
+        return self._pos[start:stop]
+    
+    def check(self, value, pos=None):
+        """raises ValueError if value can't be stored at row pos"""
+        if self.unique:
+            existing = self.positions(value)
+            if existing and existing != [pos]:
+                raise ValueError('duplicate value %r in unique index' %(value,))
+    
+    def add(self, value, pos):
+        """record value at row pos, which must be after all existing rows"""
+        self.check(value)
+        i = bisect.bisect_right(self._keys,value)
+        self._keys.insert(i,value)
+        self._pos.insert(i,pos)
+    
+    def discard(self, value, pos):
+        """forget value at row pos"""
+        start = bisect.bisect_left(self._keys,value)
+        stop = bisect.bisect_right(self._keys,value)
+        try:
+            i = self._pos.index(pos,start,stop)
+        except ValueError:
+            return
+        del self._keys[i]
+        del self._pos[i]
+    
+    def insert(self, value, pos):
+        """record value at row pos, which is inserted before the rows from pos onwards"""
+        self.check(value)
+        self._pos = [p + 1 if p >= pos else p for p in self._pos]
+        #equal values are kept in order of position
+        i = bisect.bisect_left(self._pos,pos,bisect.bisect_left(self._keys,value),bisect.bisect_right(self._keys,value))
+        self._keys.insert(i,value)
+        self._pos.insert(i,pos)
+    
+    def remove(self, value, pos):
+        """forget value at row pos, which is deleted from before the later rows"""
+        self.discard(value,pos)
+        self._pos = [p - 1 if p > pos else p for p in self._pos]
+
+
+#index classes by the names used in create_index()
+kinds = {'hash':HashIndex, 'sorted':SortedIndex}
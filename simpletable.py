@@ -8,6 +8,14 @@ normal operations and can export and import data to many formats.
 
 Copyright (C) 2016 Robert Steed
 """
+from collections import OrderedDict
+import csv
+import operator
+import sys
+
+import simplecsv
+import simpleindex
+import simplecoltable
 
 # TO DO
 # __setitem__, __setslice__ and insertcol won't work with generators
@@ -23,7 +31,9 @@ class Table(list):
     a list class except that all entries will be checked to have the same
     length. It is possible to mutate a row entry to corrupt the data structure;
     the method validate() checks that the rows and the header all have the
-    same lengths.
+    same lengths. Tables can be created with validate=False to skip the check
+    (as slices are) and setting Table.debug = True validates every table on
+    construction regardless.
         
     Warning: The Table class doesn't coerce the type of the row entries given 
     to it to lists. Hence if immutable row entries are inserted then it won't
@@ -32,59 +42,155 @@ class Table(list):
     the class more flexible for users. Row entries just need to have a length
     and be indexable by integer in order for the class to mostly work.
     
-    Note: The list method extend() is not currently validated.
+    Columns can be indexed with create_index() so that lookup() finds rows
+    without scanning the table.
+    
+    With cache=True, a column is built once when it is first read and the same
+    list is returned afterwards (so it shouldn't be modified). The cached columns
+    are updated by the table's methods and the attributes cache_hits and
+    cache_misses count the column reads.
+    
+    With compact=True, rows are stored as tuples, which have no spare capacity,
+    and the table converts the rows given to it. Changes to a column rebuild
+    the rows. memory_usage() reports the memory used by the rows.
     """
+    debug = False
+    
     def __init__(self, *args, **kwargs):
         """Takes an iterable. 
         headers - iterable of column labels
         title - optional label for datastructure (mostly unused).
+        cache - optional, if True then columns are cached when they are first
+                read (see clear_cache())
+        compact - optional, if True then the rows are stored as tuples
+        validate - optional, if False then the rows aren't checked until the
+                   next call of validate() (default True)
         set the column headers and the keyword   
         """        
-        super(Table,self).__init__(*args)
+        self.compact = kwargs.pop('compact',False)
+        check = kwargs.pop('validate',True)
+        if self.compact and args:
+            super(Table,self).__init__(map(tuple,args[0]))
+        else:
+            super(Table,self).__init__(*args)
         self.title = kwargs.pop('title',None)
         self._headers = list(kwargs.pop('headers',[]))
+        self._reindex()
+        self._indexes = {}
+        self._cache = {} if kwargs.pop('cache',False) else None
+        self.cache_hits = self.cache_misses = 0
         
-        if len(set(self._headers)) != len(self._headers): 
+        if len(self._colindex) != len(self._headers): 
             raise ValueError("Class doesn't handle columns with duplicate names")
         
-        self.validate()
+        if check or self.debug:
+            self.validate()
+
+    @classmethod
+    def from_csv(cls, path_or_file, columns=None, headers=None, title=None, types=None, compact=False, **fmtparams):
+        """create a table from csv data, the rows are streamed straight into the table.
+        
+        path_or_file - filename or open file object
+        columns - optional iterable of columns to keep, requested ordering is preserved
+        headers - column names, if not given then they are read from the first row
+        title - optional label for datastructure
+        types - optional mapping of column names to types which are converted after
+                loading (see astype()) or 'infer' to call infer_types() on the
+                loaded table
+        compact - store the rows as tuples, see Table
+        fmtparams - passed on to csv.reader"""
+        with simplecsv.csvsource(path_or_file) as csvfile:
+            rows = csv.reader(csvfile, **fmtparams)
+            if headers is None:
+                headers = next(rows, [])
+            headers = list(headers)
+            rows = simplecsv.checkedrows(rows, len(headers))
+            if columns is not None:
+                positions = simplecsv.positions(headers, columns)
+                headers = [headers[p] for p in positions]
+                rows = ([row[p] for p in positions] for row in rows)
+            tab = cls(rows, headers=headers, title=title, compact=compact, validate=False)
+        if types == 'infer':
+            tab.infer_types()
+        elif types:
+            tab.astype(types)
+        return tab
         
     def __getitem__(self, key):
         if isinstance(key, int):
             #could also return the row as an OrderedDict or namedtuple?
             return super(Table,self).__getitem__(key)
         elif isinstance(key, slice): #return a new table instance
-            return Table(super(Table,self).__getitem__(key),headers=self.headers,title=self.title)
-        else:
+            return Table(super(Table,self).__getitem__(key),headers=self.headers,title=self.title,compact=self.compact,validate=False)
+        elif self._cache is not None:
             try:
-                pos = self._headers.index(key) # get 'key' index from each data
-                return [row[pos] for row in self]
-            except ValueError as e:
-                raise KeyError('column does not exist')
+                col = self._cache[key]
+            except KeyError:
+                pos = self._colpos(key)
+                self.cache_misses += 1
+                col = self._cache[key] = [row[pos] for row in self]
+            else:
+                self.cache_hits += 1
+            return col
+        else:
+            pos = self._colpos(key) # get 'key' index from each data
+            return [row[pos] for row in self]
     
     def __getslice__(self,i,j):
-        return Table(super(Table,self).__getslice__(i,j),headers=self.headers,title=self.title)
+        return Table(super(Table,self).__getslice__(i,j),headers=self.headers,title=self.title,compact=self.compact,validate=False)
         
     def __setitem__(self, key, value):
         if isinstance(key, int): 
             if len(value) != self.width: raise ValueError('new row is not the correct width for the dataset')
-            super(Table,self).__setitem__(key,value)        
+            if self.compact: value = tuple(value)
+            if self._indexes:
+                pos = key + len(self) if key < 0 else key
+                old = super(Table,self).__getitem__(key)
+                self._indexcheck(value,pos)
+                super(Table,self).__setitem__(key,value)
+                if value is old: #changed in place, its old values are unknown
+                    self._indexstale()
+                else:
+                    self._indexremove(old,pos)
+                    self._indexadd(value,pos)
+            else:
+                super(Table,self).__setitem__(key,value)        
+            if self._cache:
+                for name,col in self._cache.items():
+                    col[key] = value[self._colpos(name)]
         elif isinstance(key, slice):
             width = self.width
             #value = list(value) #handles case where value is an generator
             if not all(len(row) == width for row in value): raise ValueError('(some of) rows update do not have correct number of columns')
+            if self.compact: value = [tuple(row) for row in value]
             super(Table,self).__setitem__(key,value)
+            self._indexstale()
+            if self._cache:
+                for name,col in self._cache.items():
+                    pos = self._colpos(name)
+                    col[key] = [row[pos] for row in value]
         else:
             #value = list(value) #handles case where value is an generator
             if len(value) != len(self):
                 raise ValueError('new column %s is not the correct length for dataset' %str(key))
-            if key in self._headers:
-                pos = self._headers.index(key)
-                for i,(row,val) in enumerate(zip(self,value)):
-                    row[pos] = val
-                    #super(Table,self).__setitem__(i,row)
+            if key in self._indexes:
+                self._indexes[key].build(value)
+            if self._cache:
+                self._cache.pop(key,None)
+            if self._hascol(key):
+                pos = self._colpos(key)
+                if self.compact:
+                    self._setrows(row[:pos] + (val,) + row[pos+1:] for row,val in zip(self,value))
+                else:
+                    for i,(row,val) in enumerate(zip(self,value)):
+                        row[pos] = val
+                        #super(Table,self).__setitem__(i,row)
             else:
                 self._headers.append(key)
+                self._colindex[key] = len(self._headers) - 1
+                if self.compact:
+                    self._setrows(row + (val,) for row,val in zip(self,value))
+                    return
                 for i,(row,val) in enumerate(zip(self,value)):
                     row += [val]
                     #row.append(val)
@@ -94,20 +200,29 @@ class Table(list):
         #values = list(values) #handles case where values is an generator
         width = self.width
         if not all(len(row) == width for row in values): raise ValueError('(some of) rows update do not have correct number of columns')
+        if self.compact: values = [tuple(row) for row in values]
         super(Table,self).__setslice__(i,j,values)
+        self._indexstale()
+        if self._cache:
+            for name,col in self._cache.items():
+                pos = self._colpos(name)
+                col[i:j] = [row[pos] for row in values]
     
     def __delitem__(self, key):
         if not (isinstance(key, int) or isinstance(key, slice)):
-            try:
-                pos = self.headers.index(key)
-                del self.headers[pos]
-                for i, row in enumerate(self):
-                    del row[pos]
-                    self[i] = row
-            except ValueError as e:
-                raise KeyError('column does not exist')
+            self.drop_columns([key])
+            return
+        elif self._indexes and isinstance(key, int):
+            pos = key + len(self) if key < 0 else key
+            row = super(Table,self).__getitem__(key)
+            super(Table,self).__delitem__(key)
+            self._indexdelete(row,pos)
         else:
             super(Table,self).__delitem__(key)
+            self._indexstale()
+        if self._cache:
+            for col in self._cache.values():
+                del col[key]
             
     def insertcol(self,index,key,value):
         """inserted a column of data before index"""
@@ -115,12 +230,132 @@ class Table(list):
         if len(value) != len(self):
             raise ValueError('new column %s is not the correct length for dataset' %str(key))
         self._headers.insert(index,key)
+        self._reindex()
+        if self._cache:
+            self._cache.pop(key,None)
+        if self.compact:
+            self._setrows(row[:index] + (val,) + row[index:] for row,val in zip(self,value))
+            return
         for i,(row,val) in enumerate(zip(self,value)):
             row.insert(index,val)
             #row.append(val)
             #super(Table,self).__setitem__(i,row)
         #self.validate()
 
+    def drop_columns(self,keys):
+        """delete several columns, rewriting each row only once"""
+        drop = set(self._colpos(key) for key in keys)
+        order = [i for i in range(len(self._headers)) if i not in drop]
+        self._rewrite(order)
+    
+    def reorder_columns(self,keys):
+        """rearrange the columns into the order of keys (which must name each
+        column once), rewriting each row only once"""
+        keys = list(keys)
+        if len(keys) != len(self._headers) or set(keys) != set(self._headers):
+            raise ValueError('new column order must contain each column exactly once')
+        self._rewrite([self._colpos(key) for key in keys])
+    
+    def add_columns(self,columns):
+        """add several columns, rewriting each row only once.
+        
+        columns - mapping (or iterable of pairs) of column names to sequences of
+                  values. New columns are appended in order, existing columns are
+                  replaced."""
+        columns = OrderedDict(columns)
+        for key,value in columns.items():
+            if len(value) != len(self):
+                raise ValueError('new column %s is not the correct length for dataset' %str(key))
+        #new indexes are built before the rows change, so a duplicate leaves the table as it was
+        indexes = dict((key,type(self._indexes[key])(value,self._indexes[key].unique))
+                       for key,value in columns.items() if key in self._indexes)
+        width = len(self._headers)
+        order = list(range(width))
+        headers = list(self._headers)
+        for i,key in enumerate(columns):
+            if self._hascol(key):
+                order[self._colpos(key)] = width + i
+            else:
+                order.append(width + i)
+                headers.append(key)
+        self._rewrite(order,headers,list(columns.values()))
+        self._indexes.update(indexes)
+    
+    def _rewrite(self,order,headers=None,values=None):
+        """rebuild every row in a single pass.
+        
+        order - the position in the old row of each new column, positions from
+                the old width onwards take the values of the new columns
+        headers - the new headers, if None they are taken from the old headers
+        values - list of new columns"""
+        if headers is None:
+            headers = [self._headers[i] for i in order]
+        width = len(self._headers)
+        if values and order[:width] == list(range(width)): #columns are only appended
+            if self.compact:
+                self._setrows(row + vals for row,vals in zip(self,zip(*values)))
+            else:
+                for row,vals in zip(self,zip(*values)):
+                    row.extend(vals)
+        elif not (values or self.compact) and order == sorted(order): #columns are only deleted
+            drop = sorted(set(range(width)) - set(order),reverse=True)
+            for row in self:
+                for pos in drop:
+                    del row[pos]
+        else:
+            if len(order) == 1:
+                pick = lambda row, pos=order[0]: (row[pos],)
+            else:
+                pick = operator.itemgetter(*order) if order else lambda row: ()
+            if values:
+                rows = zip(self,zip(*values))
+            else:
+                rows = ((row,()) for row in self)
+            if self.compact:
+                self._setrows(pick(row + vals) if vals else pick(row) for row,vals in rows)
+            else:
+                for row,vals in rows:
+                    row[:] = pick(row + list(vals)) if vals else pick(row)
+        for key in set(self._headers) - set(headers):
+            self._indexes.pop(key,None)
+        if self._cache:
+            for key,pos in zip(headers,order):
+                if pos >= width: #replaced or new column
+                    self._cache.pop(key,None)
+            for key in set(self._cache) - set(headers):
+                del self._cache[key]
+        self._headers[:] = headers
+        self._reindex()
+    
+    def _setrows(self, rows):
+        """replace all of the rows (in the same order, so indexes stay valid)"""
+        super(Table,self).__setitem__(slice(None),list(rows))
+    
+    def memory_usage(self, deep=False):
+        """returns the number of bytes used by the table's list and its rows (as
+        reported by sys.getsizeof, so including any spare capacity of the lists).
+        
+        deep - also count the values, values shared between rows are counted once"""
+        total = sys.getsizeof(self) + sum(map(sys.getsizeof,self))
+        if deep:
+            seen = set()
+            for row in self:
+                for v in row:
+                    if id(v) not in seen:
+                        seen.add(id(v))
+                        total += sys.getsizeof(v)
+        return total
+    
+    def __reduce_ex__(self, protocol):
+        """copies and pickles are rebuilt from the rows with their own indexes (and
+        an empty cache if the cache is enabled)"""
+        indexes = [(column,type(index),index.unique) for column,index in self._indexes.items()]
+        return (_rebuildtable, (type(self), list(self), self._headers, self.title, self.compact, self._cache is not None, indexes))
+    
+    def __copy__(self):
+        """a new table of the same row objects"""
+        return _rebuildtable(*self.__reduce_ex__(2)[1])
+    
     def __repr__(self):
         return 'Table(%r,title = %r,headers = %r)' %(list(self),self.title,self.headers)
         
@@ -131,7 +366,7 @@ class Table(list):
             
     @property
     def width(self):
-        return len(self[0]) if len(self) else len(self.headers)
+        return len(super(Table,self).__getitem__(0)) if len(self) else len(self.headers)
     
     @property
     def headers(self):
@@ -143,19 +378,310 @@ class Table(list):
         newheaders = list(newheaders) #cast to list
         width = self.width
         if width and len(newheaders) != width: raise ValueError('new header is not the correct length for dataset')
+        self._indexes = dict((newheaders[self._colpos(k)],index) for k,index in self._indexes.items())
         self._headers = newheaders
+        self._reindex()
+        self.clear_cache()
+    
+    def clear_cache(self):
+        """forget the cached columns (when the cache is enabled). The cache is kept up
+        to date by the table's methods but not if the rows are changed directly."""
+        if self._cache:
+            self._cache.clear()
+    
+    def _reindex(self):
+        """rebuild the mapping of column names to positions"""
+        self._colindex = dict((h,i) for i,h in enumerate(self._headers))
+    
+    def _colpos(self, key):
+        """returns the position of column key in constant time.
+        The headers list is mutable so the mapping is checked and rebuilt if stale."""
+        pos = self._colindex.get(key)
+        if pos is None or pos >= len(self._headers) or self._headers[pos] != key:
+            self._reindex()
+            pos = self._colindex.get(key)
+            if pos is None: raise KeyError('column does not exist')
+        return pos
+    
+    def _hascol(self, key):
+        try:
+            self._colpos(key)
+        except KeyError:
+            return False
+        return True
         
     def append(self,obj):
         """L.append(object) -- append row to end"""
         width = self.width
         if width and len(obj) != width: raise ValueError('new row is not the correct length for dataset: %r' %(obj,))
-        super(Table,self).append(obj)
+        if self.compact: obj = tuple(obj)
+        if self._indexes:
+            self._indexcheck(obj)
+            super(Table,self).append(obj)
+            self._indexadd(obj,len(self)-1)
+        else:
+            super(Table,self).append(obj)
+        if self._cache:
+            for name,col in self._cache.items():
+                col.append(obj[self._colpos(name)])
         
     def insert(self,index,obj):
         """L.append(object) -- append row to end"""
         width = self.width
         if width and len(obj) != width: raise ValueError('new row is not the correct length for dataset: %r' %(obj,))
-        super(Table,self).insert(index,obj)
+        if self.compact: obj = tuple(obj)
+        if self._indexes:
+            self._indexcheck(obj)
+            length = len(self)
+            super(Table,self).insert(index,obj)
+            self._indexinsert(obj,min(max(index + length if index < 0 else index, 0), length))
+        else:
+            super(Table,self).insert(index,obj)
+        if self._cache:
+            for name,col in self._cache.items():
+                col.insert(index,obj[self._colpos(name)])
+    
+    def pop(self,index=-1):
+        """L.pop([index]) -> item -- remove and return item at index (default last)."""
+        row = super(Table,self).pop(index)
+        if self._indexes:
+            self._indexdelete(row,index + len(self) + 1 if index < 0 else index)
+        if self._cache:
+            for col in self._cache.values():
+                col.pop(index)
+        return row
+    
+    def extend(self,iterable):
+        """L.extend(iterable) -- extend table by appending rows from the iterable
+        (which can be a generator). Each row's length is checked as it is added; if
+        a row is bad, the rows already added are removed before ValueError is raised."""
+        if iterable is self: #extending the list while iterating over it would never end
+            iterable = list(iterable)
+        length = len(self)
+        width = self.width if (length or self._headers) else None
+        def checked(rows, width):
+            for row in rows:
+                if width is None: width = len(row)
+                if len(row) != width: raise ValueError('new row is not the correct length for dataset: %r' %(row,))
+                yield row
+        if self.compact:
+            iterable = map(tuple,iterable)
+        for column in self._indexes:
+            if self._indexes[column].unique: self._freshindex(column)
+        try:
+            super(Table,self).extend(checked(iterable,width))
+            for pos in range(length,len(self)) if self._indexes else ():
+                self._indexadd(super(Table,self).__getitem__(pos),pos)
+        except Exception:
+            super(Table,self).__delitem__(slice(length,None))
+            self._indexstale()
+            raise
+        if self._cache:
+            added = super(Table,self).__getitem__(slice(length,None))
+            for name,col in self._cache.items():
+                pos = self._colpos(name)
+                col.extend([row[pos] for row in added])
+    
+    def __iadd__(self,iterable):
+        self.extend(iterable)
+        return self
+    
+    def remove(self,value):
+        """L.remove(value) -- remove first occurrence of value"""
+        del self[self.index(value)]
+    
+    def clear(self):
+        """L.clear() -- remove all rows"""
+        super(Table,self).clear()
+        for index in self._indexes.values():
+            index.build([])
+        if self._cache:
+            for col in self._cache.values():
+                del col[:]
+    
+    def __imul__(self,n):
+        if n > 1 and len(self) and any(index.unique for index in self._indexes.values()):
+            raise ValueError('repeated rows would break a unique index')
+        super(Table,self).__imul__(n)
+        self._indexstale()
+        self.clear_cache()
+        return self
+    
+    def reverse(self):
+        """L.reverse() -- reverse *IN PLACE*"""
+        super(Table,self).reverse()
+        self._indexstale()
+        if self._cache:
+            for col in self._cache.values():
+                col.reverse()
+    
+    def sort(self,*args,**kwargs):
+        """L.sort(key=None, reverse=False) -- stable sort *IN PLACE*"""
+        super(Table,self).sort(*args,**kwargs)
+        self._indexstale()
+        self.clear_cache()
+    
+    def sort_by(self,*columns,**kwargs):
+        """stable sort of the rows *IN PLACE* by one or more columns.
+        
+        reverse - keyword, True/False for all columns or a sequence with an entry
+                  for each column"""
+        reverse = simplecoltable._directions(columns,kwargs.pop('reverse',False))
+        positions = [self._colpos(c) for c in columns]
+        #sort by runs of keys with the same direction, least significant run first
+        while positions:
+            n = 1
+            while n < len(positions) and reverse[-n-1] == reverse[-1]: n += 1
+            self.sort(key=operator.itemgetter(*positions[-n:]),reverse=reverse[-1])
+            del positions[-n:], reverse[-n:]
+    
+    def astype(self,types):
+        """convert the values of columns, a column at a time.
+        
+        types - mapping of column names to bool, int, float or str (missing values,
+                None or empty strings, become None). array.array typecodes are
+                accepted and treated as int or float.
+        Raises ValueError if a value can't be converted, the column is then unchanged."""
+        for key,totype in types.items():
+            if isinstance(totype,str):
+                totype = float if totype in 'fd' else int
+            self[key] = simplecoltable._convertcol(self[key],totype)
+    
+    def infer_types(self,sample=1000):
+        """convert columns of strings (such as read from csv files) to the narrowest of
+        bool, int and float that their values can be converted to, see
+        ColTable.infer_types(). Returns an OrderedDict of the converted columns
+        and their new types."""
+        converted = OrderedDict()
+        for key in self.headers:
+            totype, col = simplecoltable._infercol(self[key],sample)
+            if totype is not None:
+                self[key] = col
+                converted[key] = totype
+        return converted
+    
+    def create_index(self,column,unique=False,kind='hash'):
+        """build an index of column so that lookup() and between() don't need to
+        scan the table. The index is kept up to date as the table changes.
+        
+        unique - raises ValueError if the column holds (or is given) duplicate values
+        kind - 'hash' for a dictionary based index or 'sorted' for an index which
+               also supports range queries with between()"""
+        try:
+            indextype = simpleindex.kinds[kind]
+        except KeyError:
+            raise ValueError('unknown kind of index %r' %(kind,))
+        self._indexes[column] = indextype(self[column],unique)
+    
+    def drop_index(self,column):
+        """remove the index of column"""
+        del self._indexes[column]
+    
+    def lookup(self,column,value):
+        """returns a list of the rows where column equals value. Uses the column's
+        index if it has one, otherwise the column is scanned."""
+        if column in self._indexes:
+            positions = self._freshindex(column).positions(value)
+        else:
+            pos = self._colpos(column)
+            positions = [i for i,row in enumerate(self) if row[pos] == value]
+        return [super(Table,self).__getitem__(i) for i in positions]
+    
+    def between(self,column,lo=None,hi=None,inclusive=(True,True)):
+        """returns a list of the rows where lo <= column <= hi, ordered by the
+        column's value. A bound of None is unlimited so, for instance, column < x
+        is between(column,hi=x,inclusive=(True,False)). Uses the column's index if
+        it is a sorted index, otherwise the column is scanned and sorted.
+        
+        inclusive - whether the rows equal to lo and hi respectively are included"""
+        index = self._indexes.get(column)
+        if isinstance(index,simpleindex.SortedIndex):
+            positions = self._freshindex(column).between(lo,hi,inclusive)
+        else:
+            pos = self._colpos(column)
+            col = [row[pos] for row in self]
+            positions = simpleindex.SortedIndex(col).between(lo,hi,inclusive)
+        return [super(Table,self).__getitem__(i) for i in positions]
+    
+    def join(self,other,on,how='inner',suffix='_right'):
+        """join with another table (Table or ColTable) on key column(s) using a hash
+        join. Returns a ColTable of the columns of this table followed by the
+        columns of other (except the key columns).
+        
+        on - column name or list of column names present in both tables
+        how - 'inner', 'left' (keep all rows of this table) or 'outer' (keep all
+              rows of both tables). Missing values are filled with None.
+        suffix - appended to the names of other's columns which clash with this table's
+        
+        Rows come in the order of this table (each with its matches in the order
+        of other), an outer join then adds the unmatched rows of other in order.
+        The hash table is built on the smaller table."""
+        return simplecoltable._join(self,other,on,how,suffix)
+    
+    def groupby(self,keys):
+        """group the rows by the values of key column(s) for aggregation, returns a
+        simplecoltable.GroupBy whose agg() method returns a ColTable.
+        
+        keys - column name or list of column names"""
+        return simplecoltable.GroupBy(self,keys)
+    
+    def to_coltable(self,dtypes=None):
+        """returns the data as a simplecoltable.ColTable. The rows are transposed in a
+        single pass and the new columns are handed to the ColTable without another copy.
+        
+        dtypes - optional mapping of column names to array.array typecodes, these
+                 columns are stored as typed arrays"""
+        dtypes = dtypes or {}
+        cols = [simplecoltable._typedcol(dtypes.get(h),()) for h in self._headers]
+        simplecoltable._extendcols(cols,self,self.width,range(self.width))
+        title = 'unnamed' if self.title is None else self.title
+        return simplecoltable.ColTable._fromcols(OrderedDict(zip(self._headers,cols)),title)
+    
+    def _freshindex(self,column):
+        """returns the index of column, rebuilding it if it is stale"""
+        index = self._indexes[column]
+        if index.stale:
+            index.build(self[column])
+        return index
+    
+    def _indexcheck(self,row,pos=None):
+        """checks that row can be stored at pos without breaking a unique index"""
+        for column,index in self._indexes.items():
+            if index.unique:
+                self._freshindex(column).check(row[self._colpos(column)],pos)
+    
+    def _indexadd(self,row,pos):
+        for column,index in self._indexes.items():
+            if not index.stale:
+                index.add(row[self._colpos(column)],pos)
+    
+    def _indexremove(self,row,pos):
+        for column,index in self._indexes.items():
+            if not index.stale:
+                index.discard(row[self._colpos(column)],pos)
+    
+    def _indexinsert(self,row,pos):
+        """records row inserted at pos, moving the positions of the later rows"""
+        if pos == len(self) - 1:
+            self._indexadd(row,pos)
+            return
+        for column,index in self._indexes.items():
+            if not index.stale:
+                index.insert(row[self._colpos(column)],pos)
+    
+    def _indexdelete(self,row,pos):
+        """forgets row deleted from pos, moving the positions of the later rows"""
+        if pos == len(self):
+            self._indexremove(row,pos)
+            return
+        for column,index in self._indexes.items():
+            if not index.stale:
+                index.remove(row[self._colpos(column)],pos)
+    
+    def _indexstale(self):
+        """marks all indexes for rebuilding, used when many row positions change"""
+        for index in self._indexes.values():
+            index.stale = True
     
     def validate(self):
         """checks that all rows have the same length"""
@@ -166,6 +692,14 @@ class Table(list):
         return True
 
 
+def _rebuildtable(cls, rows, headers, title, compact, cache, indexes):
+    """creates a table for copy and pickle, see Table.__reduce_ex__()"""
+    tab = cls(rows, headers=headers, title=title, compact=compact, cache=cache, validate=False)
+    for column,indextype,unique in indexes:
+        tab._indexes[column] = indextype(tab[column],unique)
+    return tab
+
+
 if __name__ == "__main__":
     import csv
     import os
@@ -181,3 +715,5 @@ if __name__ == "__main__":
     header, data = get_country_data()
     
     tab  = Table(data,headers=header,title='countrycodes')
+    
+    tab2 = Table.from_csv(os.path.join(os.path.dirname(__file__),'countries.csv'),title='countrycodes')
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""unittests for simplechunkedtable
+"""
+
+import unittest2 as unittest
+import simplechunkedtable
+import simplecoltable
+import array
+import csv
+import os
+import shutil
+import tempfile
+
+def get_country_data():
+    modulepath = os.path.dirname(__file__)
+    with open(os.path.join(modulepath,'countries.csv')) as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader)
+        data = list(reader)
+    return header, data
+
+header, data = get_country_data()
+csvpath = os.path.join(os.path.dirname(__file__),'countries.csv')
+
+
+class TestChunkedTable(unittest.TestCase):
+    """test usage of ChunkedColTable class"""
+    def setUp(self):
+        self.tab = simplechunkedtable.ChunkedColTable.from_csv(csvpath,chunksize=40,resident=2)
+        self.coltab = simplecoltable.ColTable.from_csv(csvpath)
+
+    def tearDown(self):
+        self.tab.close()
+
+    def test_construction(self):
+        tab = self.tab
+        self.assertEqual(tab.headers,header)
+        self.assertEqual(len(tab),len(data))
+        self.assertEqual(len(tab._chunkdirs),len(data)//40)
+        self.assertEqual(list(tab.itertuples()),[tuple(row) for row in data])
+        part = simplechunkedtable.ChunkedColTable.from_csv(csvpath,columns=['name','iso2'],chunksize=100)
+        self.assertEqual(part.headers,['name','iso2'])
+        self.assertEqual(part[120].astuple(),(data[120][3],data[120][0]))
+        part.close()
+
+    def test_getitem(self):
+        tab = self.tab
+        self.assertEqual(tab[0].astuple(),tuple(data[0]))
+        self.assertEqual(tab[85]['name'],data[85][3])
+        self.assertEqual(tab[-1].astuple(),tuple(data[-1]))
+        self.assertRaises(IndexError,tab.__getitem__,len(data))
+        self.assertRaises(KeyError,tab.__getitem__,'missing')
+        self.assertEqual(tab[30:130:7],self.coltab[30:130:7])
+        self.assertEqual(tab[::-25],self.coltab[::-25])
+        self.assertLessEqual(len(tab._cache),2)
+
+    def test_column(self):
+        names = self.tab['name']
+        self.assertEqual(len(names),len(data))
+        self.assertEqual(names[41],data[41][3])
+        self.assertEqual(list(names),self.coltab['name'])
+        self.assertEqual(names[38:43],self.coltab['name'][38:43])
+        self.assertEqual(names.copy(),self.coltab['name'])
+
+    def test_iteration(self):
+        self.assertEqual([row.astuple() for row in self.tab],[tuple(row) for row in data])
+        self.assertEqual(sum(len(chunk) for chunk in self.tab.chunks()),len(data))
+
+    def test_select(self):
+        selected = self.tab.select(['pop','iso2'])
+        self.assertEqual(selected.headers,['pop','iso2'])
+        self.assertEqual(selected[-1].astuple(),(data[-1][4],data[-1][0]))
+        self.assertEqual(list(selected.itertuples()),[(row[4],row[0]) for row in data])
+        self.assertRaises(KeyError,self.tab.select,['missing'])
+        selected.close()
+
+    def test_select_close(self):
+        selected = self.tab.select(['pop','iso2'])
+        directory = selected.directory
+        self.tab.close() #the selection keeps the shared chunks
+        self.assertTrue(os.path.isdir(self.tab.directory))
+        self.assertEqual(list(selected.itertuples()),[(row[4],row[0]) for row in data])
+        selected.close()
+        self.assertFalse(os.path.exists(self.tab.directory))
+        self.assertFalse(os.path.exists(directory))
+        tab = simplechunkedtable.ChunkedColTable(header,chunksize=16)
+        tab.extend(data[:40])
+        directory = tab.directory
+        del tab #temporary directories are removed when the table is garbage collected
+        self.assertFalse(os.path.exists(directory))
+
+    def test_filter(self):
+        self.assertEqual(self.tab.filter('iso2','==','FR'),self.coltab.filter('iso2','==','FR'))
+        self.assertEqual(len(self.tab.filter('iso2','==','??')),0)
+
+    def test_extend(self):
+        tab = simplechunkedtable.ChunkedColTable(header,chunksize=16)
+        tab.extend(data[:100])
+        tab.append(data[100])
+        self.assertEqual(len(tab),101)
+        self.assertEqual(len(tab._chunkdirs),6)
+        self.assertEqual(list(tab.itertuples()),[tuple(row) for row in data[:101]])
+        self.assertRaises(ValueError,tab.extend,[data[0],data[0][:2]])
+        self.assertEqual(len(tab),101)
+        directory = tab.directory
+        tab.close()
+        self.assertFalse(os.path.exists(directory))
+
+    def test_typed(self):
+        directory = tempfile.mkdtemp()
+        try:
+            with simplechunkedtable.ChunkedColTable(['a','b'],directory,chunksize=10,dtypes={'b':'d'}) as tab:
+                tab.extend((i,float(i)) for i in range(25))
+                self.assertEqual(tab[12]['b'],12.0)
+                self.assertEqual(tab[5:15]['b'],array.array('d',range(5,15)))
+                self.assertEqual(list(tab.filter('b','>=',20.0)['a']),[20,21,22,23,24])
+            self.assertTrue(os.path.isdir(directory))
+        finally:
+            shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    unittest.main()
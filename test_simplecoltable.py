@@ -4,11 +4,17 @@
 
 import unittest2 as unittest
 import simplecoltable
+import simplecolumns
 #from ordereddict import OrderedDict
 from collections import OrderedDict
+import array
 import csv
 import os
 import copy
+import concurrent.futures
+import pickle
+import shutil
+import tempfile
 
 def get_country_data():
     modulepath = os.path.dirname(__file__)       
@@ -57,19 +63,84 @@ class TestTable(unittest.TestCase):
         self.assertEqual(len(tab),0)
         tab.headers = header
         tab.append(data[0])
-        #tab.extend(data[1:10]) #extend not implemented
+        tab.extend(data[1:10])
+        self.assertEqual(len(tab),10)
         tab2 = simplecoltable.ColTable((k,[]) for k in header)
         tab2.width
         tab2.validate()
         tab2.append(data[0])
-        #tab2.extend(data[1:10]) #extend not implemented      
+        tab2.extend(data[1:10])
+    
+    def test_nocopy(self):
+        cols = OrderedDict([('a',[1,2]),('b',['x','y'])])
+        tab = simplecoltable.ColTable(cols,copy=False)
+        self.assertIs(tab['a'],cols['a'])
+        self.assertIsNot(simplecoltable.ColTable(cols)['a'],cols['a'])
+        self.assertRaises(AssertionError,simplecoltable.ColTable,[('a',[1]),('b',[])],copy=False)
+        
+    def test_to_table(self):
+        tab = simplecoltable.ColTable(data2)
+        table = tab.to_table()
+        self.assertEqual(table,data)
+        self.assertEqual(table.headers,header)
+        self.assertEqual(table.title,tab.title)
+        table[0][0] = 'changed'
+        self.assertEqual(tab[0]['iso2'],data2['iso2'][0])
+        self.assertEqual(table.to_coltable()[1:],tab[1:])
+        
+    def test_from_csv(self):
+        path = os.path.join(os.path.dirname(__file__),'countries.csv')
+        tab = simplecoltable.ColTable.from_csv(path)
+        self.assertEqual(tab,simplecoltable.ColTable(data2))
+        tab2 = simplecoltable.ColTable.from_csv(path,columns=['name','iso2'],chunksize=7)
+        self.assertEqual(tab2.headers,['name','iso2'])
+        self.assertEqual(tab2['iso2'],data2['iso2'])
+        with open(path) as csvfile:
+            next(csvfile)
+            tab3 = simplecoltable.ColTable.from_csv(csvfile,headers=header)
+        self.assertEqual(tab3,tab)
+        self.assertRaises(KeyError,simplecoltable.ColTable.from_csv,path,columns=['nothere'])
+        self.assertRaises(ValueError,simplecoltable.ColTable.from_csv,path,headers=header[:-1])
     
     def test_getrowitem(self):
         expected = OrderedDict((k,v) for k,v in zip(header,data[0]))
         self.assertEqual(self.tab[0],expected)
-        self.assertIsInstance(self.tab[0],type(expected))
+        self.assertIsInstance(self.tab[0],simplecoltable.RowView)
         expected2 = OrderedDict((k,v) for k,v in zip(header,data[-1]))
         self.assertEqual(self.tab[-1],expected2)
+        self.assertRaises(IndexError,self.tab.__getitem__,len(self.tab))
+        
+    def test_rowview(self):
+        tab = simplecoltable.ColTable(data2)
+        row = tab[1]
+        self.assertEqual(row['name'],data[1][3])
+        self.assertEqual(row[3],data[1][3])
+        self.assertEqual(row[-1],data[1][-1])
+        self.assertRaises(IndexError,row.__getitem__,len(header))
+        self.assertRaises(KeyError,row.__getitem__,'nothere')
+        self.assertEqual(list(row),header)
+        self.assertEqual(row.astuple(),tuple(data[1]))
+        self.assertEqual(row.asdict(),OrderedDict(zip(header,data[1])))
+        self.assertIn('name',row)
+        tab.append(row) #rows are mappings
+        self.assertEqual(tab[-1].astuple(),tuple(data[1]))
+        tab['name'][1] = 'changed' #views reflect changes to the table
+        self.assertEqual(row['name'],'changed')
+        #positions follow changes to the columns
+        del tab['iso2']
+        tab['extra'] = list(range(len(tab)))
+        self.assertEqual(row[0],data[1][1])
+        self.assertEqual(row[-1],1)
+        tab.reorder_columns(['extra'] + header[1:])
+        self.assertEqual(row[0],1)
+        tab.headers = ['x'] + header[1:]
+        self.assertEqual(row[2],data[1][2])
+        
+    def test_itertuples(self):
+        self.assertEqual(list(simplecoltable.ColTable(data2).itertuples()),[tuple(r) for r in data])
+        rows = list(simplecoltable.ColTable(data2).itertuples(named=True))
+        self.assertEqual(rows[0].iso2,data[0][0])
+        self.assertEqual(rows[0]._fields,tuple(header))
         
     def test_getcolitem(self):
         self.assertEqual(len(self.tab[header[2]]),len(self.tab))
@@ -270,6 +341,34 @@ class TestTable(unittest.TestCase):
         tab[header[1]].pop() #shorten 2nd column - mutating a retrieved row evades checks
         self.assertRaises(AssertionError,tab.validate)
         
+    def test_column_changes(self):
+        tab = simplecoltable.ColTable(data2)
+        n = len(tab)
+        tab.add_columns({'a':list(range(n)),'pop':[0]*n})
+        tab.drop_columns(['iso3','num'])
+        tab.reorder_columns(['a','pop','name','iso2'])
+        self.assertEqual(list(tab.itertuples()),[(i,0,r[3],r[0]) for i,r in enumerate(data)])
+        self.assertRaises(KeyError,tab.drop_columns,['a','missing'])
+        self.assertIn('a',tab.headers)
+        self.assertRaises(ValueError,tab.reorder_columns,['a'])
+        self.assertRaises(ValueError,tab.add_columns,{'b':[1]})
+        tab.create_index('a',unique=True)
+        self.assertRaises(ValueError,tab.add_columns,{'pop':[1]*n,'a':[0]*n})
+        self.assertEqual(list(tab['pop']),[0]*n)
+        
+    def test_validate_deferred(self):
+        cols = [(h,list(col)) for h,col in data2.items()]
+        cols[1][1].pop()
+        tab = simplecoltable.ColTable(cols,validate=False)
+        self.assertRaises(AssertionError,tab.validate)
+        simplecoltable.ColTable.debug = True
+        try:
+            self.assertRaises(AssertionError,simplecoltable.ColTable,cols,validate=False)
+            self.assertRaises(AssertionError,simplecoltable.ColTable._fromcols,tab.cols)
+            self.assertEqual(len(self.tab[5:10]),5)
+        finally:
+            simplecoltable.ColTable.debug = False
+        
     def test_headers(self):
         h = list(header) #copy
         h.pop()
@@ -281,5 +380,685 @@ class TestTable(unittest.TestCase):
         self.tab.headers = tuple(header) #reset to original header
         self.assertEqual(self.tab.headers,header)
 
+
+class TestConverters(unittest.TestCase):
+    """test the module's conversion functions"""
+    def test_rows2cols(self):
+        cols = simplecoltable.rows2cols(data)
+        self.assertEqual(cols,[list(c) for c in zip(*data)])
+        self.assertEqual(simplecoltable.rows2cols(iter(data)),cols) #generator
+        typed = simplecoltable.rows2cols(([1,2.0],[3,4.0]),typecodes=['l','d'])
+        self.assertEqual([c.typecode for c in typed],['l','d'])
+        self.assertEqual([list(c) for c in typed],[[1,3],[2.0,4.0]])
+        self.assertRaises(ValueError,simplecoltable.rows2cols,[])
+        self.assertRaises(ValueError,simplecoltable.rows2cols,[[1,2],[1]])
+        self.assertRaises(ValueError,simplecoltable.rows2cols,[[1,2]],typecodes=['l'])
+        
+    def test_rows2dict(self):
+        self.assertEqual(simplecoltable.rows2dict(header,iter(data)),data2)
+        typed = simplecoltable.rows2dict(['a','b'],iter([[1,2.0],[3,4.0]]),dtypes={'b':'d'})
+        self.assertEqual(typed['a'],[1,3])
+        self.assertEqual(typed['b'].typecode,'d')
+        self.assertRaises(ValueError,simplecoltable.rows2dict,header[:-1],data)
+        self.assertRaises(ValueError,simplecoltable.rows2dict,header,data+[data[0][:-1]])
+
+class TestTypedColumns(unittest.TestCase):
+    """test ColTable with array.array backed columns"""
+    def setUp(self):
+        self.nums = OrderedDict([('iso2',list(data2['iso2'])),
+                                 ('num',[int(v) for v in data2['num']]),
+                                 ('pop',[float(v or 0) for v in data2['pop']])])
+        self.tab = simplecoltable.ColTable(self.nums,dtypes={'num':'l','pop':'d'})
+        
+    def test_construction(self):
+        self.assertEqual(self.tab.dtypes,OrderedDict([('iso2',None),('num','l'),('pop','d')]))
+        self.assertEqual(list(self.tab['num']),self.nums['num'])
+        self.tab.settypes({'num':None})
+        self.assertEqual(self.tab['num'],self.nums['num'])
+        self.assertEqual(self.tab.dtypes['num'],None)
+        
+    def test_rowmethods(self):
+        tab = self.tab
+        length = len(tab)
+        tab.append(['XX',1,2.5])
+        tab.insert(0,{'iso2':'YY','num':3,'pop':4.0})
+        self.assertEqual(len(tab),length+2)
+        self.assertEqual(tab[0]['num'],3)
+        self.assertEqual(tab.pop(),OrderedDict([('iso2','XX'),('num',1),('pop',2.5)]))
+        tab[1] = ['ZZ',5,6.0]
+        self.assertEqual(tab['num'][1],5)
+        del tab[0]
+        self.assertEqual(len(tab),length)
+        self.assertTrue(tab.validate())
+        
+    def test_slicing(self):
+        tab = self.tab[2:6]
+        self.assertEqual(tab.dtypes,self.tab.dtypes)
+        self.assertEqual(list(tab['pop']),self.nums['pop'][2:6])
+        self.tab[0:2] = [['AA',1,1.0],['BB',2,2.0]]
+        self.assertEqual(list(self.tab['num'][:2]),[1,2])
+        self.assertEqual(self.tab.dtypes['num'],'l')
+        
+    def test_badvalues(self):
+        tab = self.tab
+        length = len(tab)
+        row = tab[3].astuple() #a snapshot, the RowView would follow the table
+        self.assertRaises(TypeError,tab.append,['XX','one',2.5])
+        self.assertRaises(TypeError,tab.insert,1,['XX',1,'two'])
+        self.assertRaises(TypeError,tab.__setitem__,3,['XX',1,'two'])
+        self.assertEqual(len(tab),length)
+        self.assertEqual(tab[3].astuple(),row)
+        self.assertTrue(tab.validate())
+        
+    def test_infer_types(self):
+        tab = simplecoltable.ColTable(data2)
+        self.assertEqual(tab.infer_types(typed=True),{'num':'q','pop':int})
+        self.assertEqual(tab.dtypes['num'],'q')
+        self.assertEqual(list(tab['num']),self.nums['num'])
+        self.assertEqual(tab['pop'],[int(v) if v else None for v in data2['pop']])
+        self.assertEqual(tab.infer_types(typed=True),{})
+        mixed = simplecoltable.ColTable([('b',['True','false','']),('f',['1','2.5','3']),('s',['1','x','2']),('c',['y','n','t'])])
+        self.assertEqual(mixed.infer_types(sample=1),{'b':bool,'f':float})
+        self.assertEqual(mixed['b'],[True,False,None])
+        self.assertEqual(mixed['f'],[1.0,2.5,3.0])
+        self.assertEqual(mixed['s'],['1','x','2'])
+        self.assertEqual(mixed['c'],['y','n','t']) #codes rather than bools
+        
+    def test_astype(self):
+        tab = simplecoltable.ColTable(data2)
+        tab.create_index('num')
+        tab.astype({'num':'l','pop':float})
+        self.assertEqual(tab.dtypes['num'],'l')
+        self.assertEqual(tab.lookup('num',4)[0]['iso2'],'AF')
+        self.assertEqual(tab['pop'][0],float(data2['pop'][0]))
+        self.assertRaises(ValueError,tab.astype,{'name':int})
+        self.assertEqual(tab['name'],data2['name'])
+        
+    def test_from_csv(self):
+        path = os.path.join(os.path.dirname(__file__),'countries.csv')
+        tab = simplecoltable.ColTable.from_csv(path,types={'num':'l','pop':int},chunksize=7)
+        self.assertEqual(tab.dtypes['num'],'l')
+        self.assertEqual(list(tab['num']),self.nums['num'])
+        inferred = simplecoltable.ColTable.from_csv(path,types='infer')
+        self.assertEqual(inferred['pop'],tab['pop'])
+        self.assertEqual(inferred['num'],self.nums['num'])
+
+
+class TestFiltering(unittest.TestCase):
+    """test column-at-a-time filtering of ColTable"""
+    def setUp(self):
+        cols = OrderedDict([('iso2',list(data2['iso2'])),('pop',[int(v or 0) for v in data2['pop']])])
+        self.tab = simplecoltable.ColTable(cols)
+        self.typed = simplecoltable.ColTable(cols,dtypes={'pop':'l'})
+        self.expected = [(r[0],int(r[4] or 0)) for r in data if int(r[4] or 0) > 1000]
+    
+    def check(self, tab):
+        big = tab.filter('pop','>',1000)
+        self.assertEqual(list(big.itertuples()),self.expected)
+        self.assertEqual(big.dtypes,tab.dtypes)
+        self.assertEqual(list(tab.filter('iso2','==','FR').itertuples()),[('FR',int(data2['pop'][data2['iso2'].index('FR')]))])
+        self.assertEqual(len(tab.filter('pop',lambda v: v > 1000)),len(self.expected))
+        self.assertEqual(len(tab.where([False]*len(tab))),0)
+        self.assertRaises(ValueError,tab.where,[True])
+        self.assertRaises(ValueError,tab.mask,'pop','=~',1)
+        
+    def test_lists(self):
+        self.check(self.tab)
+        
+    def test_typed(self):
+        self.check(self.typed)
+        
+    def test_typed_without_numpy(self):
+        numpy, simplecoltable.numpy = simplecoltable.numpy, None
+        try:
+            self.check(self.typed)
+        finally:
+            simplecoltable.numpy = numpy
+
+
+class TestIndex(unittest.TestCase):
+    """test hash indexes on ColTable"""
+    def setUp(self):
+        self.tab = simplecoltable.ColTable(data2)
+        self.tab.create_index('iso2',unique=True)
+        self.tab.create_index('pop')
+        
+    def test_lookup(self):
+        france = data2['iso2'].index('FR')
+        self.assertEqual(self.tab.lookup('iso2','FR'),[self.tab[france]])
+        self.assertEqual(self.tab.lookup('iso2','??'),[])
+        self.assertEqual(self.tab.lookup('name','FRANCE'),self.tab.lookup('iso2','FR')) #unindexed scan
+        self.assertEqual(len(self.tab.lookup('pop','')),data2['pop'].count(''))
+        
+    def test_rowchanges(self):
+        tab = self.tab
+        self.assertRaises(ValueError,tab.append,['FR','X','0','X','0'])
+        self.assertEqual(len(tab),len(data))
+        self.assertTrue(tab.validate())
+        tab.append(['XA','XAA','0','X','0'])
+        self.assertEqual(tab.lookup('iso2','XA'),[tab[-1]])
+        tab.insert(0,{'iso2':'XB','iso3':'XBB','num':'0','name':'X','pop':'0'})
+        self.assertEqual(tab.lookup('iso2','XB'),[tab[0]])
+        self.assertEqual(tab.lookup('iso2','XA'),[tab[-1]])
+        self.assertRaises(ValueError,tab.insert,5,['XB','XBB','0','X','0'])
+        tab[1] = ['XC','XCC','0','X','0']
+        self.assertEqual(tab.lookup('iso2',data[0][0]),[])
+        self.assertEqual(tab.lookup('iso2','XC'),[tab[1]])
+        self.assertRaises(ValueError,tab.__setitem__,2,['XC','XCC','0','X','0'])
+        tab[1] = ['XC','XCC','1','X','1'] #same key for same row is fine
+        self.assertEqual(tab.pop()['iso2'],'XA')
+        self.assertEqual(tab.lookup('iso2','XA'),[])
+        del tab[-1]
+        self.assertEqual(tab.lookup('iso2',data[-1][0]),[])
+        del tab[0]
+        self.assertEqual(tab.lookup('iso2','XB'),[])
+        self.assertEqual(tab.lookup('iso2','XC'),[tab[0]])
+        
+    def test_shift(self):
+        tab = self.tab
+        tab.insert(3,['XA','XAA','0','X','0'])
+        del tab[0]
+        tab.pop(4)
+        self.assertFalse(tab._indexes['iso2'].stale) #positions were moved rather than rebuilt
+        for row in tab:
+            self.assertEqual(tab.lookup('iso2',row['iso2']),[row])
+        self.assertEqual(len(tab.lookup('pop','0')),list(tab['pop']).count('0'))
+        
+    def test_colchanges(self):
+        tab = self.tab
+        self.assertRaises(ValueError,tab.__setitem__,'iso2',['A']*len(tab))
+        tab['iso2'] = [str(i) for i in range(len(tab))]
+        self.assertEqual(tab.lookup('iso2','3'),[tab[3]])
+        tab.headers = [h.upper() for h in header]
+        self.assertEqual(tab.lookup('ISO2','3'),[tab[3]])
+        del tab['ISO2']
+        self.assertRaises(KeyError,tab.drop_index,'ISO2')
+        
+    def test_between(self):
+        tab = simplecoltable.ColTable([('iso2',data2['iso2']),('pop',[int(v or 0) for v in data2['pop']])],dtypes={'pop':'l'})
+        expected = sorted((r.astuple() for r in tab if 1000 <= r['pop'] <= 5000),key=lambda r: r[1])
+        self.assertEqual([r.astuple() for r in tab.between('pop',1000,5000)],expected) #scan
+        tab.create_index('pop',kind='sorted')
+        self.assertEqual([r.astuple() for r in tab.between('pop',1000,5000)],expected)
+        self.assertTrue(all(r['pop'] < 1000 for r in tab.between('pop',hi=1000,inclusive=(True,False))))
+        tab.append(['XA',2000])
+        tab.insert(0,['XB',3000])
+        del tab[5]
+        expected = sorted((r.astuple() for r in tab if 1000 <= r['pop'] <= 5000),key=lambda r: r[1])
+        self.assertEqual([r.astuple() for r in tab.between('pop',1000,5000)],expected)
+
+
+class TestJoin(unittest.TestCase):
+    """test hash joins of ColTables"""
+    def setUp(self):
+        self.left = simplecoltable.ColTable([('k',[1,2,3,3]),('v',['a','b','c','d'])])
+        self.right = simplecoltable.ColTable([('k',[3,4,1]),('v',['x','y','z']),('n',[1.5,2.5,3.5])],dtypes={'n':'d'})
+        
+    def test_inner(self):
+        tab = self.left.join(self.right,'k')
+        self.assertEqual(tab.headers,['k','v','v_right','n'])
+        self.assertEqual(list(tab.itertuples()),[(1,'a','z',3.5),(3,'c','x',1.5),(3,'d','x',1.5)])
+        self.assertEqual(tab.dtypes['n'],'d')
+        #building on the smaller table keeps the order of the left table
+        tab2 = self.right.join(self.left,'k',suffix='_l')
+        self.assertEqual(list(tab2.itertuples()),[(3,'x',1.5,'c'),(3,'x',1.5,'d'),(1,'z',3.5,'a')])
+        
+    def test_order(self):
+        small = simplecoltable.ColTable([('k',[3,1,9]),('s',['p','q','r'])])
+        big = simplecoltable.ColTable([('k',[1,3,5,1,7,3]),('b',list(range(6)))])
+        for how in ('inner','left','outer'):
+            for left,right in ((small,big),(big,small)):
+                #a join of the larger table on the smaller builds on the other side
+                expected = []
+                for lrow in left.itertuples():
+                    found = [rrow[1:] for rrow in right.itertuples() if rrow[0] == lrow[0]]
+                    expected.extend(lrow + r for r in found)
+                    if not found and how != 'inner': expected.append(lrow + (None,))
+                if how == 'outer':
+                    keys = set(left['k'])
+                    expected.extend((r[0],None) + r[1:] for r in right.itertuples() if r[0] not in keys)
+                self.assertEqual(list(left.join(right,'k',how=how).itertuples()),expected)
+        
+    def test_leftouter(self):
+        tab = self.left.join(self.right,'k',how='left')
+        self.assertEqual(list(tab.itertuples()),[(1,'a','z',3.5),(2,'b',None,None),(3,'c','x',1.5),(3,'d','x',1.5)])
+        tab = self.left.join(self.right,'k',how='outer')
+        self.assertEqual(list(tab.itertuples())[-1],(4,None,'y',2.5))
+        self.assertEqual(len(tab),5)
+        self.assertRaises(ValueError,self.left.join,self.right,'k',how='cross')
+        
+    def test_suffixclash(self):
+        left = simplecoltable.ColTable([('k',[1,2]),('v',['a','b']),('v_right',['c','d'])])
+        self.assertRaises(ValueError,left.join,self.right,'k')
+        right = simplecoltable.ColTable([('k',[1]),('v_right',['x']),('v',['y'])])
+        self.assertRaises(ValueError,self.left.join,right,'k')
+        tab = left.join(self.right,'k',suffix='_2')
+        self.assertEqual(tab.headers,['k','v','v_right','v_2','n'])
+        self.assertEqual(list(tab.itertuples()),[(1,'a','c','z',3.5)])
+        
+    def test_multikey(self):
+        tab = self.left.join(self.right,['k','v'],how='outer')
+        self.assertEqual(tab.headers,['k','v','n'])
+        self.assertEqual(len(tab),7)
+        self.assertTrue(tab.validate())
+        
+    def test_countries(self):
+        tab = simplecoltable.ColTable(data2)
+        codes = simplecoltable.ColTable([('iso2',['FR','GB','ZZ']),('capital',['Paris','London','?'])])
+        joined = tab.select(['iso2','name']).join(codes,'iso2')
+        self.assertEqual(list(joined.itertuples()),[('FR','FRANCE','Paris'),('GB','UNITED KINGDOM','London')])
+
+
+class TestViews(unittest.TestCase):
+    """test ColTables sharing storage"""
+    def setUp(self):
+        self.tab = simplecoltable.ColTable(data2)
+        
+    def test_view(self):
+        tab = self.tab
+        page = tab.view(slice(10,20))
+        self.assertEqual(len(page),10)
+        self.assertEqual(page,tab[10:20])
+        self.assertIs(page['name'].base,tab['name'])
+        subpage = page.view(slice(2,4),headers=['name'])
+        self.assertIs(subpage['name'].base,tab['name'])
+        self.assertEqual(list(subpage['name']),tab['name'][12:14])
+        
+    def test_copyonwrite(self):
+        tab = self.tab
+        length = len(tab)
+        page = tab.view(slice(0,5))
+        page.append(data[-1])
+        page[0] = data[-1]
+        del page[1]
+        self.assertEqual(len(page),5)
+        self.assertIsInstance(page['name'],list)
+        self.assertEqual(len(tab),length)
+        self.assertEqual(tab[0].astuple(),tuple(data[0]))
+        selected = tab.select(['iso2','name'],view=True)
+        selected['iso2'] = ['X']*length
+        self.assertEqual(tab['iso2'],data2['iso2'])
+        
+    def test_typedview(self):
+        tab = simplecoltable.ColTable([('a',list(range(10))),('b',[float(i) for i in range(10)])],dtypes={'b':'d'})
+        page = tab.view(slice(2,8))
+        self.assertEqual(page.dtypes,tab.dtypes)
+        self.assertEqual(list(page.filter('b','>',5.0)['a']),[6,7])
+        page.sort_by('b',reverse=True)
+        self.assertEqual(page['b'],array.array('d',[7.0,6.0,5.0,4.0,3.0,2.0]))
+        self.assertEqual(list(tab['b']),[float(i) for i in range(10)])
+        
+    def test_slicecopies(self):
+        tab = self.tab
+        part = tab[0:5]
+        self.assertIsInstance(part['name'],list)
+        part['name'][0] = 'changed'
+        self.assertEqual(tab['name'][0],data2['name'][0])
+        selected = tab.select(['name'])
+        selected['name'][0] = 'changed'
+        self.assertEqual(tab['name'][0],data2['name'][0])
+
+class TestSave(unittest.TestCase):
+    """test saving and opening ColTables"""
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.tab = simplecoltable.ColTable(data2)
+        self.tab['num'] = [int(v or 0) for v in data2['num']]
+        self.tab['pop'] = [float(v or 0) for v in data2['pop']]
+        self.tab['rank'] = array.array('l',range(len(self.tab)))
+        self.tab['other'] = [None]*len(self.tab)
+        
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        
+    def test_roundtrip(self):
+        tab = self.tab
+        tab.save(self.dir)
+        for mmap in (True,False):
+            opened = simplecoltable.ColTable.open(self.dir,mmap=mmap)
+            self.assertEqual(opened.headers,tab.headers)
+            self.assertEqual(opened,tab)
+            self.assertEqual(opened.dtypes,tab.dtypes)
+            self.assertIsInstance(opened['num'],list)
+            self.assertIsInstance(opened['pop'],list)
+        self.assertIsInstance(opened['rank'],array.array)
+        
+    def test_mapped(self):
+        self.tab.save(self.dir)
+        tab = simplecoltable.ColTable.open(self.dir)
+        self.assertIsInstance(tab['name'],simplecolumns.MappedStrings)
+        self.assertIsInstance(tab['rank'],simplecolumns.MappedColumn)
+        self.assertEqual(list(tab.filter('rank','<',3)['name']),data2['name'][:3])
+        self.assertEqual(tab.lookup('iso2','FR')[0]['name'],'FRANCE')
+        tab.append(data[0][:2] + [4,data[0][3],1.5,0,None])
+        self.assertIsInstance(tab['name'],list)
+        self.assertIsInstance(tab['rank'],array.array)
+        self.assertEqual(len(simplecoltable.ColTable.open(self.dir)),len(self.tab))
+        
+    def test_empty(self):
+        empty = simplecoltable.ColTable([('a',[]),('b',array.array('d'))])
+        empty.save(self.dir)
+        opened = simplecoltable.ColTable.open(self.dir)
+        self.assertEqual(len(opened),0)
+        self.assertEqual(opened.headers,['a','b'])
+        
+    def test_compressed(self):
+        tab = self.tab
+        tab.save(self.dir,codec='zlib')
+        for mmap in (True,False):
+            opened = simplecoltable.ColTable.open(self.dir,mmap=mmap)
+            self.assertIsInstance(opened['name'],simplecolumns.CompressedColumn)
+            self.assertEqual(opened,tab)
+        opened.append(data[0][:2] + [4,data[0][3],1.5,0,None])
+        self.assertIsInstance(opened['name'],list)
+        self.assertIsInstance(opened['rank'],array.array)
+        
+    def test_resave(self):
+        for codec in (None,'zlib'):
+            self.tab.save(self.dir,codec=codec)
+            opened = simplecoltable.ColTable.open(self.dir)
+            opened.save(self.dir) #over the files it is mapped from
+            self.assertEqual(opened,self.tab)
+            self.assertEqual(simplecoltable.ColTable.open(self.dir),self.tab)
+        self.assertEqual(sorted(f for f in os.listdir(self.dir) if f.endswith('.tmp')),[])
+        
+    def test_compress(self):
+        tab = self.tab
+        original = copy.deepcopy(tab)
+        tab.compress(['rank'],encoding='delta')
+        tab.compress(['iso2','name'],codec='lzma',encoding='rle')
+        self.assertIsInstance(tab['rank'],simplecolumns.CompressedColumn)
+        self.assertEqual(tab.dtypes,original.dtypes)
+        self.assertEqual(tab,original)
+        self.assertEqual(tab.filter('rank','<',3),original.filter('rank','<',3))
+        tab.save(self.dir)
+        opened = simplecoltable.ColTable.open(self.dir)
+        self.assertEqual(opened['rank'].encoding,'delta')
+        self.assertEqual(opened,original)
+        del tab[0]
+        self.assertIsInstance(tab['rank'],array.array)
+        self.assertEqual(tab[0],original[1])
+        
+    def test_unsaveable(self):
+        tab = simplecoltable.ColTable([('a',[object()])])
+        self.assertRaises(TypeError,tab.save,self.dir)
+
+class TestExtend(unittest.TestCase):
+    """test bulk extension of ColTables"""
+    def test_extend(self):
+        tab = simplecoltable.ColTable((k,[]) for k in header)
+        tab.extend((row for row in data),chunksize=7) #generator
+        self.assertEqual(tab,simplecoltable.ColTable(data2))
+        tab.extend([OrderedDict(zip(header,data[0]))])
+        self.assertEqual(tab[-1],tab[0])
+        
+    def test_rollback(self):
+        tab = simplecoltable.ColTable(data2)
+        length = len(tab)
+        bad = list(data[:20]) + [data[0][:-1]]
+        self.assertRaises(ValueError,tab.extend,bad,chunksize=7)
+        self.assertEqual(len(tab),length)
+        self.assertTrue(tab.validate())
+        typed = simplecoltable.ColTable([('a',[1]),('b',[1.0])],dtypes={'b':'d'})
+        self.assertRaises(TypeError,typed.extend,[(2,2.0),(3,'x')])
+        self.assertEqual(list(typed.itertuples()),[(1,1.0)])
+        
+    def test_index(self):
+        tab = simplecoltable.ColTable(data2)
+        tab.create_index('iso2',unique=True)
+        length = len(tab)
+        self.assertRaises(ValueError,tab.extend,[['XA','XAA','0','X','0'],data[3]])
+        self.assertEqual(len(tab),length)
+        self.assertEqual(tab.lookup('iso2','XA'),[])
+        tab.extend([['XA','XAA','0','X','0']])
+        self.assertEqual(tab.lookup('iso2','XA'),[tab[-1]])
+
+class TestSort(unittest.TestCase):
+    """test sorting ColTables by columns"""
+    def setUp(self):
+        self.rows = [(3,'b',1.0),(1,'a',2.0),(3,'a',3.0),(2,'c',4.0),(1,'b',5.0),(3,'b',6.0)]
+        self.cols = simplecoltable.rows2dict(['a','b','c'],self.rows)
+        
+    def check(self, tab):
+        tab.sort_by('a','b',reverse=[True,False])
+        self.assertEqual(list(tab.itertuples()),sorted(sorted(self.rows,key=lambda r: r[1]),key=lambda r: r[0],reverse=True))
+        tab.sort_by('b',reverse=True)
+        self.assertEqual([r[1] for r in tab.itertuples()],['c','b','b','b','a','a'])
+        self.assertEqual([r[2] for r in tab.itertuples()][1:4],[1.0,6.0,5.0]) #stable
+        self.assertTrue(tab.validate())
+        self.assertRaises(ValueError,tab.sort_by,'a','b',reverse=[True])
+        before = list(tab.itertuples())
+        tab.sort_by()
+        self.assertEqual(list(tab.itertuples()),before)
+        
+    def test_lists(self):
+        self.check(simplecoltable.ColTable(self.cols))
+        
+    def test_typed(self):
+        self.check(simplecoltable.ColTable(self.cols,dtypes={'a':'l','c':'d'}))
+        tab = simplecoltable.ColTable(self.cols,dtypes={'a':'l','c':'d'})
+        tab.sort_by('c',reverse=True)
+        self.assertEqual(tab.dtypes['c'],'d')
+        self.assertEqual(list(tab['c']),[6.0,5.0,4.0,3.0,2.0,1.0])
+        
+    def test_index(self):
+        tab = simplecoltable.ColTable(self.cols)
+        tab.create_index('c',unique=True)
+        tab.sort_by('c',reverse=True)
+        self.assertEqual(tab.lookup('c',6.0),[tab[0]])
+
+class TestGroupBy(unittest.TestCase):
+    """test grouping and aggregation"""
+    def setUp(self):
+        self.cols = OrderedDict([('k',['a','b','a','c','b']),('k2',[1,1,1,2,2]),('v',[1,2,3,4,5])])
+        self.expected = OrderedDict([('k',['a','b','c']),('v_sum',[4,7,4]),('v_count',[2,2,1]),
+            ('v_mean',[2.0,3.5,4.0]),('v_min',[1,2,4]),('v_max',[3,5,4]),('v_first',[1,2,4]),('v_last',[3,5,4])])
+        self.funcs = ['sum','count','mean','min','max','first','last']
+        
+    def test_agg(self):
+        tab = simplecoltable.ColTable(self.cols)
+        groups = tab.groupby('k')
+        self.assertEqual(len(groups),3)
+        self.assertEqual(groups.agg({'v':self.funcs}).cols,self.expected)
+        self.assertEqual(groups.agg({'v':'sum'}).headers,['k','v'])
+        self.assertRaises(ValueError,groups.agg,{'v':'median'})
+        self.assertRaises(ValueError,groups.agg,{'k':'count'}) #would replace the key column
+        self.assertEqual(groups.agg({'k':['count']}).headers,['k','k_count'])
+        
+    def test_multikey(self):
+        tab = simplecoltable.ColTable(self.cols).groupby(['k','k2']).agg({'v':'sum'})
+        self.assertEqual(list(tab.itertuples()),[('a',1,4),('b',1,2),('c',2,4),('b',2,5)])
+        
+    def test_typed(self):
+        tab = simplecoltable.ColTable(self.cols,dtypes={'v':'l'})
+        for numpy in simplecoltable.numpy,None:
+            original, simplecoltable.numpy = simplecoltable.numpy, numpy
+            try:
+                result = tab.groupby('k').agg({'v':self.funcs})
+            finally:
+                simplecoltable.numpy = original
+            self.assertEqual(dict((k,list(v)) for k,v in result.cols.items()),dict(self.expected))
+            
+    def test_table(self):
+        import simpletable
+        tab = simpletable.Table(zip(*self.cols.values()),headers=self.cols)
+        self.assertEqual(tab.groupby('k').agg({'v':self.funcs}).cols,self.expected)
+        
+    def test_countries(self):
+        tab = simplecoltable.ColTable(data2)
+        result = tab.groupby('iso2').agg({'name':'count'})
+        self.assertEqual(len(result),len(tab))
+        self.assertEqual(set(result['name']),set([1]))
+
+
+class TestCategorical(unittest.TestCase):
+    """test ColTables with categorical columns"""
+    def setUp(self):
+        self.tab = simplecoltable.ColTable(data2,dtypes={'iso2':'category'})
+        
+    def test_construction(self):
+        tab = self.tab
+        self.assertEqual(tab.dtypes['iso2'],'category')
+        self.assertEqual(list(tab['iso2']),data2['iso2'])
+        self.assertEqual(tab[5]['iso2'],data2['iso2'][5])
+        tab.append(['ZZ','ZZZ','0','NOWHERE','0'])
+        tab[0] = ['YY','YYY','0','SOMEWHERE','0']
+        self.assertEqual(tab['iso2'][-1],'ZZ')
+        self.assertEqual(tab['iso2'][0],'YY')
+        self.assertEqual(tab[1:3]['iso2'],data2['iso2'][1:3])
+        self.assertRaises(TypeError,tab.append,[['unhashable'],'ZZZ','0','NOWHERE','0'])
+        tab.append(['QQ','QQQ','0','NOWHERE','0'])
+        self.assertEqual(tab[-1]['iso2'],'QQ')
+        self.assertEqual(list(tab['iso2'])[-2:],['ZZ','QQ'])
+        tab.settypes({'iso2':None})
+        self.assertIsInstance(tab['iso2'],list)
+        path = os.path.join(os.path.dirname(__file__),'countries.csv')
+        loaded = simplecoltable.ColTable.from_csv(path,types={'iso2':'category'})
+        self.assertEqual(loaded,simplecoltable.ColTable(data2,dtypes={'iso2':'category'}))
+        
+    def test_filter(self):
+        tab = self.tab
+        plain = simplecoltable.ColTable(data2)
+        for numpy in simplecoltable.numpy,None:
+            original, simplecoltable.numpy = simplecoltable.numpy, numpy
+            try:
+                self.assertEqual(list(tab.mask('iso2','==','FR')),plain.mask('iso2','==','FR'))
+                self.assertEqual(list(tab.mask('iso2','>=','X')),plain.mask('iso2','>=','X'))
+                self.assertEqual(list(tab.mask('iso2',lambda v: v[0] == 'A')),plain.mask('iso2',lambda v: v[0] == 'A'))
+                self.assertEqual(list(tab.filter('iso2','==','??')),[])
+            finally:
+                simplecoltable.numpy = original
+        selected = tab.filter('iso2','!=','FR')
+        self.assertIsInstance(selected['iso2'],simplecolumns.CategoricalColumn)
+        self.assertEqual(list(selected['iso2']),[v for v in data2['iso2'] if v != 'FR'])
+        
+    def test_groupby(self):
+        tab = simplecoltable.ColTable([('k',['a','b','a','c']),('k2',[1,1,1,2]),('v',[1,2,3,4])],dtypes={'k':'category'})
+        result = tab.groupby('k').agg({'v':'sum'})
+        self.assertIsInstance(result['k'],simplecolumns.CategoricalColumn)
+        self.assertEqual(list(result.itertuples()),[('a',4),('b',2),('c',4)])
+        result = tab.groupby(['k2','k']).agg({'v':'count'})
+        self.assertEqual(list(result.itertuples()),[(1,'a',2),(1,'b',1),(2,'c',1)])
+        
+    def test_join(self):
+        codes = simplecoltable.ColTable([('iso2',['FR','GB','ZZ']),('capital',['Paris','London','?'])],dtypes={'iso2':'category'})
+        tab = self.tab.select(['iso2','name'])
+        expected = simplecoltable.ColTable(data2).select(['iso2','name'])
+        for how in ('inner','left','outer'):
+            joined = tab.join(codes,'iso2',how=how)
+            self.assertEqual(list(joined.itertuples()),list(expected.join(codes.select(['iso2','capital']),'iso2',how=how).itertuples()))
+        
+    def test_save(self):
+        directory = tempfile.mkdtemp()
+        try:
+            self.tab.save(directory)
+            opened = simplecoltable.ColTable.open(directory)
+            self.assertIsInstance(opened['iso2'],simplecolumns.CategoricalColumn)
+            self.assertEqual(opened,self.tab)
+            pairs = simplecoltable.ColTable([('k',[('a',1),('b',(2,None)),('a',1)])],dtypes={'k':'category'})
+            pairs.save(directory)
+            opened = simplecoltable.ColTable.open(directory)
+            self.assertEqual(list(opened['k']),[('a',1),('b',(2,None)),('a',1)])
+            self.assertEqual(opened['k'].code(('b',(2,None))),1) #hashable again
+            odd = simplecoltable.ColTable([('k',[frozenset([1])])],dtypes={'k':'category'})
+            self.assertRaises(TypeError,odd.save,directory)
+        finally:
+            shutil.rmtree(directory)
+
+class TestBlocks(unittest.TestCase):
+    """test ColTables with BlockList columns"""
+    def setUp(self):
+        self.plain = simplecoltable.ColTable(data2)
+        self.plain.astype({'num':'q'})
+        self.tab = simplecoltable.ColTable(self.plain.cols)
+        self.tab.setblocks(blocksize=16)
+        
+    def test_mutation(self):
+        tab, plain = self.tab, self.plain
+        self.assertIsInstance(tab['name'],simplecolumns.BlockList)
+        self.assertEqual(tab.dtypes,plain.dtypes)
+        self.assertEqual(tab,plain)
+        for t in tab,plain:
+            t.insert(3,['ZZ','ZZZ',0,'NOWHERE','0'])
+            t.insert(-7,['YY','YYY',1,'SOMEWHERE','1'])
+            del t[10]
+            t.pop(0)
+            t[5] = ['XX','XXX',2,'ELSEWHERE','2']
+        self.assertEqual(list(tab.itertuples()),list(plain.itertuples()))
+        self.assertRaises(TypeError,tab.insert,0,['WW','WWW','x','NOWHERE','0'])
+        self.assertEqual(len(tab['iso2']),len(plain))
+        tab.sort_by('num')
+        plain.sort_by('num')
+        self.assertIsInstance(tab['num'],simplecolumns.BlockList)
+        self.assertEqual(list(tab.itertuples()),list(plain.itertuples()))
+        self.assertRaises(ValueError,simplecoltable.ColTable(data2,dtypes={'iso2':'category'}).setblocks)
+        
+    def test_selection(self):
+        tab, plain = self.tab, self.plain
+        for numpy in simplecoltable.numpy,None:
+            original, simplecoltable.numpy = simplecoltable.numpy, numpy
+            try:
+                self.assertEqual(list(tab.mask('num','>',500)),list(plain.mask('num','>',500)))
+                part = tab.filter('num','>',500)
+                self.assertIsInstance(part['iso2'],simplecolumns.BlockList)
+                self.assertEqual(part,plain.filter('num','>',500))
+            finally:
+                simplecoltable.numpy = original
+        self.assertEqual(tab[10:20],plain[10:20])
+        self.assertEqual(tab.join(plain.select(['iso2','pop']),'iso2',suffix='_2')['pop_2'],plain['pop'])
+        directory = tempfile.mkdtemp()
+        try:
+            tab.save(directory)
+            self.assertEqual(simplecoltable.ColTable.open(directory),plain)
+        finally:
+            shutil.rmtree(directory)
+        
+
+def coltype(col):
+    return type(col).__name__
+
+class TestParallel(unittest.TestCase):
+    """test column operations run by an executor"""
+    def setUp(self):
+        self.tab = simplecoltable.ColTable([('k',[i%3 for i in range(30)]),('v',list(range(30)))],dtypes={'v':'d'})
+        
+    def check(self, executor):
+        tab = self.tab
+        #the same types whatever the executor
+        self.assertEqual(tab.map_columns(coltype,executor=executor),OrderedDict([('k','list'),('v','MappedColumn')]))
+        tab['v'].append(30.0) #not held by the view
+        tab['v'].pop()
+        self.assertEqual(tab.map_columns(sum,executor=executor),OrderedDict([('k',30),('v',435.0)]))
+        self.assertEqual(tab.map_columns(len,['v'],executor=executor),OrderedDict([('v',30)]))
+        groups = tab.groupby('k')
+        spec = {'v':['sum','max','first']}
+        self.assertEqual(groups.agg(spec,executor=executor),groups.agg(spec))
+        tab.settypes({'k':'b','v':None},executor=executor)
+        self.assertEqual(tab.dtypes,OrderedDict([('k','b'),('v',None)]))
+        self.assertEqual(tab['v'],[float(i) for i in range(30)])
+        
+    def test_serial(self):
+        self.check(None)
+        
+    def test_threads(self):
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            self.check(executor)
+            
+    def test_processes(self):
+        with concurrent.futures.ProcessPoolExecutor(2) as executor:
+            self.check(executor)
+            self.tab.settypes({'v':'d'})
+            self.assertEqual(self.tab.map_columns(coltype,executor=executor),OrderedDict([('k','MappedColumn'),('v','MappedColumn')]))
+            
+    def test_shared(self):
+        if simplecoltable.shared_memory is None: self.skipTest('no shared memory')
+        shared = simplecoltable._SharedArray(memoryview(array.array('q',range(10000))))
+        try:
+            self.assertLess(len(pickle.dumps(shared)),200)
+            with pickle.loads(pickle.dumps(shared)).attach() as col:
+                self.assertEqual(list(col),list(range(10000)))
+        finally:
+            shared.release()
+
 if __name__ == '__main__':
     unittest.main()
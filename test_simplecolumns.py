@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+"""unittests for simplecolumns
+"""
+
+import unittest2 as unittest
+import simplecolumns
+import array
+
+
+class TestColumnView(unittest.TestCase):
+    """test basic usage of ColumnView class"""
+    def setUp(self):
+        self.base = list(range(10))
+        
+    def test_indexing(self):
+        view = simplecolumns.ColumnView(self.base,range(2,8))
+        self.assertEqual(len(view),6)
+        self.assertEqual(view[0],2)
+        self.assertEqual(view[-1],7)
+        self.assertEqual(list(view),self.base[2:8])
+        self.assertEqual(view,self.base[2:8])
+        self.assertNotEqual(view,self.base)
+        self.assertRaises(IndexError,view.__getitem__,6)
+        def assign(): view[0] = 1
+        self.assertRaises(TypeError,assign)
+        
+    def test_slicing(self):
+        view = simplecolumns.ColumnView(self.base)[1:9][::2]
+        self.assertIs(view.base,self.base)
+        self.assertEqual(list(view),self.base[1:9][::2])
+        backwards = simplecolumns.ColumnView(self.base)[::-1][2:]
+        self.assertEqual(list(backwards),self.base[::-1][2:])
+        self.assertEqual(backwards.copy(),self.base[::-1][2:])
+        #views of views share the original column
+        nested = simplecolumns.ColumnView(view,range(1,3))
+        self.assertIs(nested.base,self.base)
+        self.assertEqual(list(nested),self.base[1:9][::2][1:3])
+        
+    def test_copy(self):
+        view = simplecolumns.ColumnView(array.array('d',self.base))[3:5]
+        self.assertEqual(view.typecode,'d')
+        copied = view.copy()
+        self.assertEqual(copied,array.array('d',[3.0,4.0]))
+        self.assertEqual(simplecolumns.ColumnView(self.base)[3:5].copy(),[3,4])
+        
+    def test_reflects_base(self):
+        view = simplecolumns.ColumnView(self.base)[0:3]
+        self.base[1] = 'changed'
+        self.assertEqual(view[1],'changed')
+        self.base.insert(0,'new') #the rows are fixed, so the values shift
+        self.assertEqual(list(view),['new',0,'changed'])
+        
+    def test_abstract(self):
+        class NoCopy(simplecolumns.ReadOnlyColumn):
+            def __len__(self): return 0
+            def __getitem__(self, key): raise IndexError(key)
+        self.assertRaises(TypeError,NoCopy)
+
+
+class TestMapped(unittest.TestCase):
+    """test columns held in buffers"""
+    def test_mappedcolumn(self):
+        values = array.array('d',[0.5,1.5,2.5,3.5])
+        col = simplecolumns.MappedColumn(memoryview(values.tobytes()).cast('d'))
+        self.assertEqual(col.typecode,'d')
+        self.assertEqual(len(col),4)
+        self.assertEqual(col[-1],3.5)
+        self.assertEqual(col,list(values))
+        self.assertIsInstance(col[1:3],simplecolumns.MappedColumn)
+        self.assertEqual(list(col[::2]),[0.5,2.5])
+        self.assertEqual(col.copy(),values)
+        self.assertEqual(col[::-1].copy(),array.array('d',[3.5,2.5,1.5,0.5]))
+        
+    def test_mappedstrings(self):
+        words = ['a','','caf\xe9','xyz']
+        encoded = [w.encode('utf-8') for w in words]
+        offsets = array.array('q',[0,1,1,6,9])
+        col = simplecolumns.MappedStrings(memoryview(offsets),memoryview(b''.join(encoded)))
+        self.assertEqual(len(col),4)
+        self.assertEqual(col[2],'caf\xe9')
+        self.assertEqual(col[-1],'xyz')
+        self.assertEqual(list(col),words)
+        self.assertEqual(col[1:3],words[1:3])
+        self.assertEqual(col.copy(),words)
+        self.assertRaises(IndexError,col.__getitem__,4)
+
+
+class TestCategorical(unittest.TestCase):
+    """test dictionary encoded columns"""
+    def test_encoding(self):
+        col = simplecolumns.CategoricalColumn(['a','b','a','c'])
+        self.assertEqual(col.categories,['a','b','c'])
+        self.assertEqual(list(col.codes),[0,1,0,2])
+        self.assertEqual(col,['a','b','a','c'])
+        self.assertEqual(col[-1],'c')
+        self.assertEqual(col.code('b'),1)
+        self.assertIsNone(col.code('z'))
+        
+    def test_mutation(self):
+        col = simplecolumns.CategoricalColumn(['a','b'])
+        col.append('c')
+        col.insert(0,'b')
+        col[1] = 'd'
+        col[2:3] = ['a','a']
+        self.assertEqual(list(col),['b','d','a','a','c'])
+        self.assertEqual(col.pop(),'c')
+        del col[0]
+        self.assertEqual(list(col),['d','a','a'])
+        copied = col.copy()
+        copied.append('e')
+        self.assertEqual(len(col),3)
+        self.assertEqual(col.categories,['a','b','c','d'])
+        
+    def test_unhashable(self):
+        col = simplecolumns.CategoricalColumn(['a','b'])
+        self.assertRaises(TypeError,col.extend,['c','d',[1]])
+        self.assertRaises(TypeError,col.append,[1])
+        self.assertEqual(list(col),['a','b'])
+        col.extend(['e','c'])
+        self.assertEqual(list(col),['a','b','e','c'])
+        self.assertEqual(col.categories,['a','b','e','c'])
+        self.assertEqual(col.code('c'),3)
+        
+    def test_widening(self):
+        col = simplecolumns.CategoricalColumn(range(200))
+        self.assertEqual(col.codes.typecode,'B')
+        col.extend(range(100,400))
+        self.assertEqual(col.codes.typecode,'H')
+        self.assertEqual(list(col),list(range(200)) + list(range(100,400)))
+        
+    def test_selection(self):
+        col = simplecolumns.CategoricalColumn(['x','y','z','y'])
+        self.assertEqual(col[1:3],['y','z'])
+        self.assertIsInstance(col[1:3],simplecolumns.CategoricalColumn)
+        self.assertEqual(col.take([3,0]),['y','x'])
+        self.assertEqual(col.compress([True,False,False,True]),['x','y'])
+
+
+class TestCompressed(unittest.TestCase):
+    """test compressed columns"""
+    def test_roundtrip(self):
+        ints = array.array('l',[i//5 for i in range(200)])
+        strings = ['a']*20 + ['b',None,'c']
+        for codec in (None,'zlib','lzma'):
+            for encoding in (None,'rle','delta'):
+                col = simplecolumns.CompressedColumn.compress(ints,codec,encoding)
+                self.assertEqual(col.typecode,'l')
+                self.assertEqual(len(col),200)
+                self.assertEqual(col.copy(),ints)
+                if encoding != 'delta':
+                    col = simplecolumns.CompressedColumn.compress(strings,codec,encoding)
+                    self.assertEqual(col.copy(),strings)
+        self.assertRaises(ValueError,simplecolumns.CompressedColumn.compress,strings,'zlib','delta')
+        self.assertRaises(ValueError,simplecolumns.CompressedColumn.compress,strings,'gzip')
+        
+    def test_lazy(self):
+        values = array.array('d',[1.0]*100 + [2.0]*100)
+        col = simplecolumns.CompressedColumn.compress(values,'zlib','rle')
+        self.assertLess(len(col.data),values.itemsize*len(values))
+        self.assertIsNone(col._cache)
+        self.assertEqual(col[150],2.0)
+        self.assertEqual(col.values(),values)
+        self.assertIs(col.values(),col.values())
+        copied = col.copy()
+        copied[0] = 5.0
+        self.assertEqual(col[0],1.0)
+        col.release()
+        self.assertIsNone(col._cache)
+        self.assertEqual(list(col[99:101]),[1.0,2.0])
+        
+    def test_byteswap(self):
+        ints = array.array('q',[i//5 for i in range(50)])
+        for encoding in (None,'rle','delta'):
+            col = simplecolumns.CompressedColumn.compress(ints,None,encoding)
+            payload = array.array('q',col.data) #every part is 8 byte values
+            payload.byteswap()
+            swapped = simplecolumns.CompressedColumn(payload.tobytes(),len(col),'q',None,encoding)
+            self.assertEqual(swapped.copy(byteswap=True),ints)
+
+class TestBlockList(unittest.TestCase):
+    """test usage of BlockList class"""
+    def check(self, col, model):
+        self.assertEqual(list(col),model)
+        self.assertEqual(len(col),len(model))
+        self.assertEqual(col.offsets,[sum(map(len,col.blocks[:b])) for b in range(len(col.blocks))])
+        self.assertTrue(all(col.blocks))
+        
+    def test_mutation(self):
+        for typecode in None,'q':
+            model = list(range(20))
+            col = simplecolumns.BlockList(model,typecode,blocksize=4)
+            self.assertEqual(len(col.blocks),5)
+            self.check(col,model)
+            for i in (0,5,-3,100,-100,7,7,7,7,7,7,7,7,7):
+                col.insert(i,i)
+                model.insert(i,i)
+                self.check(col,model)
+            for i in (0,-1,10,10,10,10,10,5):
+                del col[i]
+                del model[i]
+                self.check(col,model)
+            self.assertEqual(col.pop(3),model.pop(3))
+            col[4] = model[4] = 99
+            col.extend(range(9))
+            model.extend(range(9))
+            col.append(-1)
+            model.append(-1)
+            self.check(col,model)
+            self.assertEqual([col[i] for i in range(-len(model),len(model))],model + model)
+            self.assertRaises(IndexError,col.__getitem__,len(model))
+            col[2:6] = [0,0]
+            model[2:6] = [0,0]
+            del col[::3]
+            del model[::3]
+            self.check(col,model)
+        self.assertRaises(TypeError,col.insert,0,'x')
+    
+    def test_slicing(self):
+        model = list(range(50))
+        col = simplecolumns.BlockList(model,'i',blocksize=8)
+        for key in (slice(3,30),slice(None,None,-1),slice(10,45,4),slice(40,10),slice(-5,None)):
+            part = col[key]
+            self.assertIsInstance(part,simplecolumns.BlockList)
+            self.assertEqual(part.typecode,'i')
+            self.assertEqual(list(part),model[key])
+        self.assertEqual(col.take([5,1,49]),[5,1,49])
+        self.assertEqual(col.compress([v % 2 == 0 for v in model]),model[::2])
+        self.assertEqual(col.values(),array.array('i',model))
+        copied = col.copy()
+        copied.append(0)
+        self.assertEqual(len(col),50)
+        
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+"""unittests for simplecsv
+"""
+
+import unittest2 as unittest
+import simplecsv
+import io
+import os
+
+
+class TestHelpers(unittest.TestCase):
+    """test the helpers of the csv loaders"""
+    def test_csvsource(self):
+        path = os.path.join(os.path.dirname(__file__),'countries.csv')
+        with simplecsv.csvsource(path) as csvfile:
+            self.assertFalse(csvfile.closed)
+        self.assertTrue(csvfile.closed)
+        given = io.StringIO('a,b\n')
+        with simplecsv.csvsource(given) as csvfile:
+            self.assertIs(csvfile,given)
+        self.assertFalse(given.closed) #only files we opened are closed
+        
+    def test_positions(self):
+        self.assertEqual(simplecsv.positions(['a','b','c']),[0,1,2])
+        self.assertEqual(simplecsv.positions(['a','b','c'],['c','a']),[2,0])
+        self.assertRaises(KeyError,simplecsv.positions,['a'],['z'])
+        
+    def test_checkedrows(self):
+        self.assertEqual(list(simplecsv.checkedrows([[1,2],[3,4]],2)),[[1,2],[3,4]])
+        self.assertRaises(ValueError,list,simplecsv.checkedrows([[1,2],[3]],2))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+"""unittests for simpleindex
+"""
+
+import unittest2 as unittest
+import simpleindex
+
+
+class TestHashIndex(unittest.TestCase):
+    """test basic usage of HashIndex class"""
+    def test_build(self):
+        idx = simpleindex.HashIndex(['a','b','a'])
+        self.assertEqual(idx.positions('a'),[0,2])
+        self.assertEqual(idx.positions('z'),[])
+        self.assertIn('b',idx)
+        self.assertFalse(idx.stale)
+        self.assertRaises(ValueError,simpleindex.HashIndex,['a','b','a'],unique=True)
+        
+    def test_unique(self):
+        idx = simpleindex.HashIndex(['a','b'],unique=True)
+        self.assertEqual(idx.positions('b'),[1])
+        self.assertRaises(ValueError,idx.add,'a',2)
+        self.assertRaises(ValueError,idx.check,'a',1)
+        idx.check('a',0) #replacing a value with itself
+        idx.add('c',2)
+        self.assertEqual(idx.positions('c'),[2])
+        
+    def test_discard(self):
+        for unique in False,True:
+            idx = simpleindex.HashIndex(['a','b','c'],unique=unique)
+            idx.discard('b',1)
+            self.assertEqual(idx.positions('b'),[])
+            idx.discard('c',0) #wrong position is ignored
+            self.assertEqual(idx.positions('c'),[2])
+            idx.add('b',3)
+            self.assertEqual(idx.positions('b'),[3])
+            
+    def test_insert(self):
+        idx = simpleindex.HashIndex(['a','b','a'])
+        idx.insert('a',1)
+        self.assertEqual(idx.positions('a'),[0,1,3])
+        self.assertEqual(idx.positions('b'),[2])
+        idx.remove('a',0)
+        self.assertEqual(idx.positions('a'),[0,2])
+        self.assertEqual(idx.positions('b'),[1])
+        uidx = simpleindex.HashIndex(['a','b'],unique=True)
+        self.assertRaises(ValueError,uidx.insert,'b',0)
+        uidx.insert('c',0)
+        self.assertEqual([uidx.positions(v) for v in 'abc'],[[1],[2],[0]])
+        uidx.remove('a',1)
+        self.assertEqual([uidx.positions(v) for v in 'abc'],[[],[1],[0]])
+
+
+class TestSortedIndex(unittest.TestCase):
+    """test basic usage of SortedIndex class"""
+    def setUp(self):
+        self.values = [5,3,9,3,7,1]
+        self.idx = simpleindex.SortedIndex(self.values)
+        
+    def test_build(self):
+        self.assertEqual(self.idx.positions(3),[1,3])
+        self.assertEqual(self.idx.positions(4),[])
+        self.assertIn(9,self.idx)
+        self.assertNotIn(10,self.idx)
+        self.assertRaises(ValueError,simpleindex.SortedIndex,self.values,unique=True)
+        
+    def test_between(self):
+        idx = self.idx
+        self.assertEqual(idx.between(3,7),[1,3,0,4])
+        self.assertEqual(idx.between(3,7,inclusive=(False,False)),[0])
+        self.assertEqual(idx.between(hi=3,inclusive=(True,False)),[5])
+        self.assertEqual(idx.between(lo=7),[4,2])
+        self.assertEqual(idx.between(),[5,1,3,0,4,2])
+        
+    def test_changes(self):
+        idx = self.idx
+        idx.add(3,6)
+        self.assertEqual(idx.positions(3),[1,3,6])
+        idx.discard(3,3)
+        self.assertEqual(idx.positions(3),[1,6])
+        idx.discard(3,0) #wrong position is ignored
+        self.assertEqual(idx.positions(3),[1,6])
+        uidx = simpleindex.SortedIndex([2,1],unique=True)
+        self.assertRaises(ValueError,uidx.add,1,2)
+        uidx.check(1,1)
+        self.assertRaises(ValueError,uidx.check,1,0)
+        
+    def test_insert(self):
+        idx = self.idx
+        idx.insert(3,2)
+        self.assertEqual(idx.positions(3),[1,2,4])
+        self.assertEqual(idx.between(),[6,1,2,4,0,5,3])
+        idx.remove(5,0)
+        self.assertEqual(idx.between(),[5,0,1,3,4,2])
+        self.assertEqual(idx.between(),simpleindex.SortedIndex([3,3,9,3,7,1]).between())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,6 +7,7 @@ import simpletable
 import csv
 import os
 import copy
+import pickle
 
 def get_country_data():
     modulepath = os.path.dirname(__file__)       
@@ -65,6 +66,18 @@ class TestTable(unittest.TestCase):
         tab2.append(data[0])
         tab2.extend(data[1:10])        
     
+    def test_from_csv(self):
+        path = os.path.join(os.path.dirname(__file__),'countries.csv')
+        tab = simpletable.Table.from_csv(path,title='countrycodes')
+        self.assertEqual(tab,data)
+        self.assertEqual(tab.headers,header)
+        tab2 = simpletable.Table.from_csv(path,columns=['name','iso2'])
+        self.assertEqual(tab2.headers,['name','iso2'])
+        self.assertEqual(tab2[0],[data[0][3],data[0][0]])
+        self.assertRaises(KeyError,simpletable.Table.from_csv,path,columns=['nothere'])
+        self.assertRaises(ValueError,simpletable.Table.from_csv,path,headers=header[:-1])
+        self.assertRaises(ValueError,simpletable.Table.from_csv,path,headers=header[:-1],columns=['name'])
+    
     def test_getrowitem(self):
         self.assertEqual(self.tab[0],data[0])
         self.assertIsInstance(self.tab[0],type(data[0]))
@@ -273,6 +286,46 @@ class TestTable(unittest.TestCase):
         tab[-2].pop() #shorten 2nd row from end - mutating a retrieved row evades checks
         self.assertRaises(AssertionError,tab.validate)
         
+    def test_validate_references(self):
+        rows = [list(row) for row in data]
+        tab = simpletable.Table(rows,headers=self.tab.headers)
+        self.assertRaises(ValueError,tab.append,data[0][:2])
+        tab.create_index('iso2')
+        for row in (rows[1],tab[0:5][4],tab.lookup('iso2','FR')[0],tab[-1]):
+            row.pop()
+            self.assertRaises(AssertionError,tab.validate)
+            row.append(None)
+            self.assertTrue(tab.validate())
+        
+    def test_validate_deferred(self):
+        rows = [list(row) for row in data]
+        rows[5].pop()
+        tab = simpletable.Table(rows,headers=self.tab.headers,validate=False)
+        self.assertRaises(AssertionError,tab.validate)
+        self.assertRaises(AssertionError,simpletable.Table,rows,headers=self.tab.headers)
+        self.assertTrue(self.tab[10:20].validate())
+        simpletable.Table.debug = True
+        try:
+            self.assertRaises(AssertionError,simpletable.Table,rows,headers=self.tab.headers,validate=False)
+        finally:
+            simpletable.Table.debug = False
+        
+    def test_columnlookup(self):
+        #column positions must track every change to the headers
+        tab = simpletable.Table((list(row) for row in data),headers=header)
+        self.assertEqual(tab['name'],[row[3] for row in data])
+        tab.insertcol(0,'first',[0]*len(tab))
+        self.assertEqual(tab['name'],[row[3] for row in data])
+        del tab['iso2']
+        self.assertEqual(tab['name'],[row[3] for row in data])
+        tab['last'] = [1]*len(tab)
+        self.assertEqual(tab['last'],[1]*len(tab))
+        tab.headers = [h.upper() for h in tab.headers]
+        self.assertEqual(tab['NAME'],[row[3] for row in data])
+        self.assertRaises(KeyError,tab.__getitem__,'name')
+        tab.headers.reverse() #mutating the headers list directly
+        self.assertEqual(tab['NAME'],[row[2] for row in data])
+        
     def test_headers(self):
         h = list(header) #copy
         h.pop()
@@ -284,5 +337,397 @@ class TestTable(unittest.TestCase):
         self.tab.headers = tuple(header) #reset to original header
         self.assertEqual(self.tab.headers,header)
 
+
+class TestIndex(unittest.TestCase):
+    """test hash indexes on Table"""
+    def setUp(self):
+        self.tab = simpletable.Table((list(row) for row in data),headers=header)
+        self.tab.create_index('iso2',unique=True)
+        self.tab.create_index('pop')
+        
+    def test_lookup(self):
+        self.assertEqual(self.tab.lookup('iso2','FR'),[data[[r[0] for r in data].index('FR')]])
+        self.assertEqual(self.tab.lookup('iso2','??'),[])
+        self.assertEqual(self.tab.lookup('name','FRANCE'),self.tab.lookup('iso2','FR')) #unindexed scan
+        self.assertEqual(len(self.tab.lookup('pop','')),sum(1 for r in data if r[4] == ''))
+        
+    def test_rowchanges(self):
+        tab = self.tab
+        self.assertRaises(ValueError,tab.append,['FR','X','0','X','0'])
+        self.assertEqual(len(tab),len(data))
+        tab.append(['XA','XAA','0','X','0'])
+        self.assertEqual(tab.lookup('iso2','XA'),[tab[-1]])
+        tab.insert(0,['XB','XBB','0','X','0'])
+        self.assertEqual(tab.lookup('iso2','XB'),[tab[0]])
+        self.assertEqual(tab.lookup('iso2','XA'),[tab[-1]])
+        self.assertRaises(ValueError,tab.insert,5,['XB','XBB','0','X','0'])
+        tab[1] = ['XC','XCC','0','X','0']
+        self.assertEqual(tab.lookup('iso2',data[0][0]),[])
+        self.assertEqual(tab.lookup('iso2','XC'),[tab[1]])
+        self.assertRaises(ValueError,tab.__setitem__,2,['XC','XCC','0','X','0'])
+        tab[1] = ['XC','XCC','1','X','1'] #same key for same row is fine
+        self.assertEqual(tab.pop(),['XA','XAA','0','X','0'])
+        self.assertEqual(tab.lookup('iso2','XA'),[])
+        del tab[-1]
+        self.assertEqual(tab.lookup('iso2',data[-1][0]),[])
+        del tab[0]
+        self.assertEqual(tab.lookup('iso2','XB'),[])
+        self.assertEqual(tab.lookup('iso2','XC'),[tab[0]])
+        
+    def test_shift(self):
+        tab = self.tab
+        index = tab._indexes['iso2']
+        tab.insert(3,['XA','XAA','0','X','0'])
+        tab.insert(-1,['XB','XBB','0','X','0'])
+        del tab[0]
+        tab.pop(4)
+        tab.remove(tab[5])
+        self.assertFalse(index.stale) #positions were moved rather than rebuilt
+        for i,row in enumerate(tab):
+            self.assertEqual(tab.lookup('iso2',row[0]),[row])
+        self.assertEqual(tab.lookup('iso2','XA'),[tab[2]])
+        self.assertEqual(len(tab.lookup('pop','0')),sum(1 for r in tab if r[4] == '0'))
+        
+    def test_inplace(self):
+        tab = self.tab
+        row = tab[3]
+        old = row[0]
+        row[0] = 'XA'
+        tab[3] = row #changed in place
+        self.assertEqual(tab.lookup('iso2',old),[])
+        self.assertEqual(tab.lookup('iso2','XA'),[tab[3]])
+        
+    def test_clear(self):
+        tab = simpletable.Table((list(row) for row in data),headers=header,cache=True)
+        tab.create_index('iso2',unique=True)
+        tab['name']
+        tab.clear()
+        self.assertEqual(tab.lookup('iso2','FR'),[])
+        self.assertEqual(tab['name'],[])
+        tab.append(['FR','FRA','0','FRANCE','0'])
+        self.assertEqual(tab.lookup('iso2','FR'),[tab[0]])
+        self.assertEqual(tab['name'],['FRANCE'])
+        self.assertRaises(ValueError,tab.__imul__,2)
+        tab.drop_index('iso2')
+        tab.create_index('name')
+        tab *= 3
+        self.assertEqual(len(tab.lookup('name','FRANCE')),3)
+        self.assertEqual(tab['name'],['FRANCE']*3)
+        tab *= 0
+        self.assertEqual(tab.lookup('name','FRANCE'),[])
+        
+    def test_colchanges(self):
+        tab = self.tab
+        self.assertRaises(ValueError,tab.__setitem__,'iso2',['A']*len(tab))
+        tab['iso2'] = [str(i) for i in range(len(tab))]
+        self.assertEqual(tab.lookup('iso2','3'),[tab[3]])
+        tab.headers = [h.upper() for h in header]
+        self.assertEqual(tab.lookup('ISO2','3'),[tab[3]])
+        del tab['ISO2']
+        self.assertRaises(KeyError,tab.drop_index,'ISO2')
+        
+    def test_between(self):
+        tab = simpletable.Table(([r[0],int(r[4] or 0)] for r in data),headers=['iso2','pop'])
+        expected = sorted((r for r in tab if 1000 <= r[1] <= 5000),key=lambda r: r[1])
+        self.assertEqual(tab.between('pop',1000,5000),expected) #scan
+        tab.create_index('pop',kind='sorted')
+        self.assertEqual(tab.between('pop',1000,5000),expected)
+        self.assertEqual(tab.lookup('pop',expected[0][1]),[r for r in tab if r[1] == expected[0][1]])
+        self.assertTrue(all(r[1] < 1000 for r in tab.between('pop',hi=1000,inclusive=(True,False))))
+        tab.append(['XA',2000])
+        tab.insert(0,['XB',3000])
+        del tab[5]
+        expected = sorted((r for r in tab if 1000 <= r[1] <= 5000),key=lambda r: r[1])
+        self.assertEqual(tab.between('pop',1000,5000),expected)
+        self.assertRaises(ValueError,tab.create_index,'pop',kind='btree')
+        
+    def test_copy(self):
+        tab = self.tab
+        zeros = len(tab.lookup('pop','0'))
+        for copied in (copy.copy(tab),pickle.loads(pickle.dumps(tab)),copy.deepcopy(tab)):
+            self.assertEqual(copied,tab)
+            self.assertEqual(copied.headers,header)
+            self.assertEqual(sorted(copied._indexes),['iso2','pop'])
+            self.assertIsNot(copied._indexes['iso2'],tab._indexes['iso2'])
+            self.assertTrue(copied._indexes['iso2'].unique)
+            copied.append(['XA','XAA','0','X','0'])
+            self.assertEqual(copied.lookup('iso2','XA'),[copied[-1]])
+            self.assertEqual(tab.lookup('iso2','XA'),[])
+            self.assertEqual(len(tab.lookup('pop','0')),zeros)
+            self.assertEqual(tab.lookup('iso2','FR'),copied.lookup('iso2','FR'))
+        self.assertIs(copy.copy(tab)[0],tab[0])
+
+
+class TestExtend(unittest.TestCase):
+    """test validated extension of Tables"""
+    def test_extend(self):
+        tab = simpletable.Table(headers=header)
+        tab.extend(row for row in data) #generator
+        self.assertEqual(list(tab),data)
+        tab += data[:2]
+        self.assertEqual(len(tab),len(data)+2)
+        
+    def test_extend_self(self):
+        tab = simpletable.Table(data[:3],headers=header)
+        tab.extend(tab)
+        self.assertEqual(list(tab),data[:3]*2)
+        tab += tab
+        self.assertEqual(list(tab),data[:3]*4)
+        
+    def test_rollback(self):
+        tab = simpletable.Table(data,headers=header)
+        bad = data[:20] + [data[0][:-1]]
+        self.assertRaises(ValueError,tab.extend,bad)
+        self.assertEqual(len(tab),len(data))
+        tab2 = simpletable.Table()
+        self.assertRaises(ValueError,tab2.extend,[[1,2],[1,2,3]])
+        self.assertEqual(len(tab2),0)
+        
+    def test_index(self):
+        tab = simpletable.Table(data,headers=header)
+        tab.create_index('iso2',unique=True)
+        self.assertRaises(ValueError,tab.extend,[['XA','XAA','0','X','0'],data[3]])
+        self.assertEqual(len(tab),len(data))
+        self.assertEqual(tab.lookup('iso2','XA'),[])
+        tab.extend([['XA','XAA','0','X','0']])
+        self.assertEqual(tab.lookup('iso2','XA'),[tab[-1]])
+
+class TestSort(unittest.TestCase):
+    """test sorting Tables by columns"""
+    def test_sort_by(self):
+        rows = [[3,'b',1.0],[1,'a',2.0],[3,'a',3.0],[2,'c',4.0],[1,'b',5.0],[3,'b',6.0]]
+        tab = simpletable.Table(rows,headers=['a','b','c'])
+        tab.sort_by('a','b',reverse=[True,False])
+        self.assertEqual(list(tab),sorted(sorted(rows,key=lambda r: r[1]),key=lambda r: r[0],reverse=True))
+        tab.sort_by('b','a',reverse=True)
+        self.assertEqual(list(tab),sorted(rows,key=lambda r: (r[1],r[0]),reverse=True))
+        self.assertEqual([r[2] for r in tab][:4],[4.0,1.0,6.0,5.0]) #stable
+        self.assertRaises(KeyError,tab.sort_by,'z')
+
+class TestCache(unittest.TestCase):
+    """test caching of Table columns"""
+    def setUp(self):
+        self.tab = simpletable.Table(copy.deepcopy(data),headers=header,cache=True)
+        
+    def check(self):
+        tab = self.tab
+        for h in tab.headers:
+            self.assertEqual(tab[h],[row[tab.headers.index(h)] for row in tab])
+            
+    def test_counters(self):
+        tab = self.tab
+        names = tab['name']
+        self.assertIs(tab['name'],names)
+        self.assertEqual((tab.cache_hits,tab.cache_misses),(1,1))
+        self.assertRaises(KeyError,tab.__getitem__,'missing')
+        uncached = simpletable.Table(data,headers=header)
+        self.assertEqual(uncached['name'],names)
+        self.assertIsNot(uncached['name'],uncached['name'])
+        self.assertEqual((uncached.cache_hits,uncached.cache_misses),(0,0))
+        
+    def test_invalidation(self):
+        tab = self.tab
+        self.check()
+        tab[0] = ['XX','XXX','0','X','0']
+        self.check()
+        tab[1:3] = [['YY','YYY','0','Y','0']]
+        self.check()
+        tab.append(['ZZ','ZZZ','0','Z','0'])
+        tab.insert(2,['WW','WWW','0','W','0'])
+        tab.extend(copy.deepcopy(data[:3]))
+        self.check()
+        tab.pop(4)
+        del tab[0]
+        del tab[5:9]
+        self.check()
+        tab['pop'] = [0]*len(tab)
+        tab.insertcol(1,'extra',list(range(len(tab))))
+        self.check()
+        del tab['iso3']
+        self.check()
+        tab.reverse()
+        self.check()
+        tab.sort_by('name')
+        self.check()
+        tab.remove(tab[3])
+        tab.headers = ['a','b','c','d','e']
+        self.check()
+        tab.clear_cache()
+        hits = tab.cache_hits
+        tab['a']
+        self.assertEqual(tab.cache_hits,hits)
+        
+    def test_copy(self):
+        tab = self.tab
+        names = tab['name']
+        for copied in (copy.copy(tab),pickle.loads(pickle.dumps(tab))):
+            self.assertEqual(copied._cache,{})
+            copied.append(['ZZ','ZZZ','0','Z','0'])
+            self.assertEqual(copied['name'],names + ['Z'])
+            self.assertIs(tab['name'],names)
+            self.assertEqual(len(names),len(tab))
+
+class TestCompact(unittest.TestCase):
+    """test Tables storing rows as tuples"""
+    def setUp(self):
+        self.tab = simpletable.Table(data,headers=header,compact=True)
+        
+    def test_rows(self):
+        tab = self.tab
+        self.assertIsInstance(tab[0],tuple)
+        self.assertEqual(list(tab),[tuple(row) for row in data])
+        self.assertEqual(tab['name'],[row[3] for row in data])
+        tab.append(list(data[0]))
+        tab.insert(0,list(data[1]))
+        tab[1] = list(data[2])
+        tab[2:4] = [list(data[3])]
+        tab.extend(row for row in data[:2])
+        self.assertTrue(all(type(row) is tuple for row in tab))
+        self.assertTrue(tab[0:2].compact)
+        self.assertTrue(tab.validate())
+        
+    def test_columns(self):
+        tab = self.tab
+        tab.create_index('iso2')
+        tab['pop'] = list(range(len(tab)))
+        self.assertEqual(tab[5],tuple(data[5][:4]) + (5,))
+        tab['new'] = ['x']*len(tab)
+        tab.insertcol(0,'first',list(range(len(tab))))
+        self.assertEqual(tab.headers,['first'] + header + ['new'])
+        self.assertEqual(tab[3],(3,) + tuple(data[3][:4]) + (3,'x'))
+        del tab['iso3']
+        self.assertEqual(tab[3],(3,data[3][0]) + tuple(data[3][2:4]) + (3,'x'))
+        self.assertEqual(tab.lookup('iso2','FR')[0][1],'FR')
+        self.assertTrue(tab.validate())
+        tab.astype({'first':str})
+        self.assertEqual(tab[2][0],'2')
+        
+    def test_memory_usage(self):
+        rows = []
+        for row in data:
+            rows.append([])
+            for v in row: rows[-1].append(v) #grown rows have spare capacity
+        tab = simpletable.Table(rows,headers=header)
+        compact = simpletable.Table(rows,headers=header,compact=True)
+        self.assertEqual(compact,[tuple(row) for row in rows])
+        self.assertLess(compact.memory_usage(),tab.memory_usage())
+        self.assertGreater(tab.memory_usage(deep=True),tab.memory_usage())
+        self.assertEqual(tab.memory_usage(deep=True) - tab.memory_usage(),compact.memory_usage(deep=True) - compact.memory_usage())
+
+class TestConversion(unittest.TestCase):
+    """test converting Tables to ColTables"""
+    def test_to_coltable(self):
+        tab = simpletable.Table(copy.deepcopy(data),headers=header,title='countries')
+        coltab = tab.to_coltable()
+        self.assertEqual(coltab.headers,header)
+        self.assertEqual(coltab.title,'countries')
+        self.assertEqual(list(coltab.itertuples()),[tuple(row) for row in data])
+        self.assertEqual(coltab.to_table(),tab)
+        self.assertEqual(coltab.to_table().headers,header)
+        coltab['iso2'][0] = 'changed'
+        self.assertEqual(tab[0][0],data[0][0])
+        typed = simpletable.Table([[1,2.0],[3,4.0]],headers=['a','b']).to_coltable(dtypes={'b':'d'})
+        self.assertEqual(typed.dtypes['b'],'d')
+        empty = simpletable.Table(headers=['a','b']).to_coltable()
+        self.assertEqual(empty.headers,['a','b'])
+        self.assertEqual(len(empty),0)
+
+class TestTypes(unittest.TestCase):
+    """test converting the types of Table columns"""
+    def test_infer_types(self):
+        tab = simpletable.Table(copy.deepcopy(data),headers=header)
+        self.assertEqual(tab.infer_types(),{'num':int,'pop':int})
+        self.assertEqual(tab[0],[data[0][0],data[0][1],int(data[0][2]),data[0][3],int(data[0][4])])
+        self.assertEqual(tab['pop'],[int(v) if v else None for v in simpletable.Table(data,headers=header)['pop']])
+        self.assertEqual(tab.infer_types(),{})
+        path = os.path.join(os.path.dirname(__file__),'countries.csv')
+        self.assertEqual(simpletable.Table.from_csv(path,types='infer'),tab)
+        
+    def test_astype(self):
+        tab = simpletable.Table([['1','TRUE',''],['2','false','3.5']],headers=['a','b','c'])
+        tab.astype({'a':'d','b':bool,'c':float})
+        self.assertEqual(list(tab),[[1.0,True,None],[2.0,False,3.5]])
+        tab.create_index('a')
+        tab.astype({'a':int})
+        self.assertEqual(tab.lookup('a',2),[[2,False,3.5]])
+        bad = simpletable.Table([['1'],['x']],headers=['a'])
+        self.assertRaises(ValueError,bad.astype,{'a':int})
+        self.assertEqual(bad['a'],['1','x'])
+
+class TestJoin(unittest.TestCase):
+    """test hash joins of Tables"""
+    def test_join(self):
+        left = simpletable.Table([[1,'a'],[2,'b'],[3,'c']],headers=['k','v'])
+        right = simpletable.Table([[3,'x'],[1,'z']],headers=['k','w'])
+        tab = left.join(right,'k',how='left')
+        self.assertEqual(tab.headers,['k','v','w'])
+        self.assertEqual(list(tab.itertuples()),[(1,'a','z'),(2,'b',None),(3,'c','x')])
+        self.assertEqual(sorted(left.join(right,'k').itertuples()),[(1,'a','z'),(3,'c','x')])
+
+
+class TestColumnChanges(unittest.TestCase):
+    """test changing several columns in a single pass"""
+    def tables(self):
+        return [simpletable.Table((list(row) for row in data),headers=header,cache=True),
+                simpletable.Table(data,headers=header,compact=True)]
+    
+    def test_drop_columns(self):
+        for tab in self.tables():
+            row = tab[7]
+            tab['iso3'] #cached
+            tab.create_index('num')
+            tab.drop_columns(['iso3','num'])
+            self.assertEqual(tab.headers,['iso2','name','pop'])
+            self.assertEqual(list(map(list,tab)),[[r[0],r[3],r[4]] for r in data])
+            self.assertEqual(tab['pop'],[r[4] for r in data])
+            self.assertRaises(KeyError,tab.__getitem__,'iso3')
+            self.assertRaises(KeyError,tab.lookup,'num','4')
+            if not tab.compact:
+                self.assertIs(tab[7],row)
+            self.assertTrue(tab.validate())
+            self.assertRaises(KeyError,tab.drop_columns,['missing'])
+            del tab['pop']
+            self.assertEqual(tab.headers,['iso2','name'])
+    
+    def test_reorder_columns(self):
+        for tab in self.tables():
+            tab.create_index('iso2',unique=True)
+            tab['name']
+            tab.reorder_columns(['pop','name','iso2','num','iso3'])
+            self.assertEqual(list(map(list,tab)),[[r[4],r[3],r[0],r[2],r[1]] for r in data])
+            self.assertEqual(tab['name'],[r[3] for r in data])
+            self.assertEqual(tab.lookup('iso2','FR'),[tab[i] for i,r in enumerate(data) if r[0] == 'FR'])
+            self.assertRaises(ValueError,tab.reorder_columns,['pop','name'])
+            self.assertRaises(ValueError,tab.reorder_columns,['pop','pop','iso2','num','iso3'])
+    
+    def test_add_columns(self):
+        for tab in self.tables():
+            tab.create_index('pop')
+            tab['pop']
+            n = len(tab)
+            tab.add_columns([('a',list(range(n))),('pop',[0]*n),('b',['x']*n)])
+            self.assertEqual(tab.headers,header + ['a','b'])
+            self.assertEqual(list(map(list,tab)),[r[:4] + [0,i,'x'] for i,r in enumerate(data)])
+            self.assertEqual(tab['pop'],[0]*n)
+            self.assertEqual(len(tab.lookup('pop',0)),n)
+            self.assertRaises(ValueError,tab.add_columns,{'c':[1]})
+            self.assertNotIn('c',tab.headers)
+            self.assertTrue(tab.validate())
+        empty = simpletable.Table(headers=['a'])
+        empty.add_columns({'b':[]})
+        self.assertEqual(empty.headers,['a','b'])
+        
+    def test_add_columns_unique(self):
+        for tab in (simpletable.Table([[1,'a'],[2,'b']],headers=['x','y']),
+                    simpletable.Table([[1,'a'],[2,'b']],headers=['x','y'],compact=True)):
+            tab.create_index('x',unique=True)
+            before = list(map(list,tab))
+            self.assertRaises(ValueError,tab.add_columns,{'x':[5,5],'z':[1,2]})
+            self.assertEqual(tab.headers,['x','y'])
+            self.assertEqual(list(map(list,tab)),before)
+            self.assertEqual(tab.lookup('x',1),[tab[0]])
+            tab.add_columns({'x':[5,6],'z':[1,2]})
+            self.assertEqual(tab.lookup('x',6),[tab[1]])
+        
 if __name__ == '__main__':
     unittest.main()